@@ -0,0 +1,133 @@
+"""Whole-resume vectors of the first 2000 characters versus chunk vectors with max-sim.
+
+    python -m benchmarks.bench_chunking --n 2000 --bullets 40 --queries 200 --k 3
+
+Every query plants one bullet built from technologies that the rest of the
+corpus never mentions into its own target resume, either as the first
+bullet ("early") or as the last ("late", past the first 2000 characters
+once resumes run to --bullets bullets), and asks for a job description
+requiring them. Retrieval is dense only and unpartitioned, so the
+comparison isolates the representation:
+
+- head: one vector per resume, embedded from text[:2000] (the layout before
+  chunking)
+- chunks: RAGEngine's chunk index, resumes ranked by their best chunk
+
+Reported per layout: how often the target resume is in the top k, split by
+where the bullet was planted; for chunks, how often the planted bullet is
+among the target's returned bullets; vector count and search latency.
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from app.services import rag_engine
+from app.services.cache import ContentCache
+from app.services.embedder import HashingEmbedder
+from app.services.executors import Executors
+from app.services.index_factory import build_index
+from app.services.index_store import IndexStore
+from app.services.parser import JobDescriptionParser, ResumeParser
+from app.utils.profiles import extract_profile
+from benchmarks.synthetic import TECHNOLOGIES, SYSTEMS, generate_corpus, generate_resume
+
+# Known to the JD keyword matcher but absent from the synthetic corpus
+RARE_TECHNOLOGIES = ['ruby', 'rails', 'laravel', 'swift', 'firebase', 'nextjs']
+HEAD_CHARS = 2000
+
+
+def _plant(rng: random.Random, resume: str, late: bool):
+    """Insert a bullet using three rare technologies as the first or last bullet"""
+    technologies = rng.sample(RARE_TECHNOLOGIES, 3)
+    bullet = f"- Built a {rng.choice(SYSTEMS)} with {technologies[0]}, {technologies[1]} and {technologies[2]}"
+    lines = resume.split('\n')
+    bullets = [i for i, line in enumerate(lines) if line.startswith('- ')]
+    position = bullets[-1] + 1 if late else bullets[0]
+    lines.insert(position, bullet)
+    return '\n'.join(lines), bullet[2:], technologies
+
+
+def _job_description(rng: random.Random, technologies) -> str:
+    required = technologies + rng.sample(TECHNOLOGIES, 3)
+    return f"Required: {', '.join(required)}.\nResponsibilities:\n- Own the {rng.choice(SYSTEMS)} end to end"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--bullets", type=int, default=40, help="bullets per reference resume")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    corpus = generate_corpus(args.n, n_bullets=args.bullets)
+    targets = rng.sample(range(args.n), args.queries)
+    planted = []
+    for query, target in enumerate(targets):
+        late = query % 2 == 1
+        corpus[target], bullet, technologies = _plant(rng, corpus[target], late)
+        planted.append((target, late, bullet, _job_description(rng, technologies)))
+    late_past_head = np.mean([corpus[target].find(bullet) >= HEAD_CHARS for target, late, bullet, _ in planted if late])
+    print(f"{args.n} resumes, mean {np.mean([len(text) for text in corpus]):.0f} chars; "
+          f"{late_past_head:.0%} of late bullets start past character {HEAD_CHARS}")
+
+    cache, executors = ContentCache(redis_url=""), Executors(0, 0)
+    embedder = HashingEmbedder()
+    with tempfile.TemporaryDirectory() as index_dir:
+        engine = rag_engine.RAGEngine(embedder, IndexStore(index_dir), cache, executors)
+    rag_engine.HYBRID_SEARCH = False
+    rag_engine.PARTITION_FIELDS = []
+    metadata = [
+        {
+            'id': f'resume_{i}',
+            'filename': f'{i}.txt',
+            'sha256': '',
+            'profile': extract_profile(text),
+            'chunk_index': engine._build_chunk_index(text)
+        }
+        for i, text in enumerate(corpus)
+    ]
+    chunk_embeddings = embedder.embed([text for resume in metadata for text in resume['chunk_index']['texts']])
+    engine.corpus = engine._build_corpus(0, chunk_embeddings, metadata)
+    engine._get_text = lambda resume: ''
+    head_index = build_index(embedder.embed([text[:HEAD_CHARS] for text in corpus]))
+
+    resume_parser, jd_parser = ResumeParser(cache, executors), JobDescriptionParser(cache, executors)
+    hits = {('head', False): [], ('head', True): [], ('chunks', False): [], ('chunks', True): []}
+    bullet_hits, latencies = [], {'head': [], 'chunks': []}
+    for target, late, bullet, job_description in planted:
+        parsed_resume = resume_parser.parse(generate_resume(rng))
+        parsed_jd = jd_parser.parse(job_description)
+        query = engine._generate_embeddings([engine._create_query_text(parsed_resume, parsed_jd)])
+
+        start = time.perf_counter()
+        _, head_rows = head_index.search(query, args.k)
+        latencies['head'].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        similar = asyncio.run(engine.find_similar_resumes(parsed_resume, parsed_jd, args.k))
+        latencies['chunks'].append(time.perf_counter() - start)
+
+        chunk_rows = [int(result['resume']['id'].split('_')[1]) for result in similar]
+        hits[('head', late)].append(target in head_rows[0])
+        hits[('chunks', late)].append(target in chunk_rows)
+        if target in chunk_rows:
+            sections = similar[chunk_rows.index(target)]['relevant_sections']
+            bullet_hits.append(bullet in sections['relevant_projects'])
+
+    print(f"{'layout':<8}{'vectors':>9}{'early@k':>9}{'late@k':>8}{'p50 ms':>9}")
+    for layout, vectors in (('head', head_index.ntotal), ('chunks', engine.corpus.index.ntotal)):
+        print(
+            f"{layout:<8}{vectors:>9}{np.mean(hits[(layout, False)]):>9.3f}{np.mean(hits[(layout, True)]):>8.3f}"
+            f"{np.percentile(np.array(latencies[layout]) * 1000, 50):>9.2f}"
+        )
+    print(f"planted bullet among the target's returned bullets: {np.mean(bullet_hits) if bullet_hits else 0:.3f}")
+    print("chunks latency is the whole find_similar_resumes call, head only the FAISS search")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Event-loop lag of the API under mixed load, with CPU-bound steps inline versus on the executors.
+
+    python -m benchmarks.bench_event_loop --duration 10 --clients 4 --output lag.json
+
+The app runs in this process behind an ASGI transport, so its handlers share
+the event loop with a probe that sleeps 5ms at a time and records how late
+it wakes up. Meanwhile ``--clients`` clients alternate between /enhance with
+large pasted resumes and JDs and /rank over ``--rank-resumes`` resumes
+(``--rank-resumes 0`` leaves /rank out), and one light client requests
+/health every 20ms, as any other connection would; its latency counts from
+when the request was due, so time spent waiting for the loop is included.
+LLM calls go to a stub server in a separate process, which would otherwise
+compete with the loop for the GIL.
+
+Each configuration runs in a fresh interpreter, since the executor settings
+are read at import:
+
+- inline: every parse, gap analysis and FAISS search on the event loop, as
+  before the executor layer (/rank was already in a thread)
+- executors: the EXECUTOR_* defaults
+
+/rank runs pure-Python scoring in a thread, which holds the GIL most of
+the time, so it adds the same lag to both configurations.
+
+Payloads are generated up front and distinct, so parses miss the cache
+unless a run outlasts ``--payloads`` requests.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from benchmarks.bench_pipeline import import_app
+from benchmarks.synthetic import generate_job_description, generate_resume
+
+CONFIGURATIONS = {
+    'inline': {
+        'EXECUTOR_PROCESSES': '0',
+        'EXECUTOR_INLINE_MAX_CHARS': str(10 ** 12),
+        'EXECUTOR_INLINE_MAX_VECTORS': str(10 ** 12)
+    },
+    'executors': {}
+}
+PROBE_INTERVAL = 0.005
+HEALTH_INTERVAL = 0.02
+
+
+def _percentiles(seconds: List[float]) -> Dict:
+    if not seconds:
+        return {'count': 0}
+    p50, p99 = np.percentile(np.array(seconds) * 1000, [50, 99])
+    return {'count': len(seconds), 'p50_ms': float(p50), 'p99_ms': float(p99), 'max_ms': max(seconds) * 1000}
+
+
+def _payloads(args) -> List[Dict]:
+    rng = random.Random(args.seed)
+    payloads = []
+    for i in range(args.payloads):
+        job_description = "\n".join(generate_job_description(rng) for _ in range(args.jd_repeat))
+        if i % 2 == 0 or not args.rank_resumes:
+            payloads.append(('/enhance', {
+                'resume_text': generate_resume(rng, args.resume_bullets),
+                'job_description': job_description
+            }))
+        else:
+            payloads.append(('/rank', {
+                'resumes': [generate_resume(rng) for _ in range(args.rank_resumes)],
+                'job_description': job_description,
+                'top_k': 10
+            }))
+    return payloads
+
+
+async def _measure(args, app) -> Dict:
+    await app.router.startup()
+    payloads = _payloads(args)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    lags, health = [], []
+    latencies = {'/enhance': [], '/rank': []}
+    errors = 0
+
+    async def probe():
+        while not stop.is_set():
+            start = loop.time()
+            await asyncio.sleep(PROBE_INTERVAL)
+            lags.append(loop.time() - start - PROBE_INTERVAL)
+
+    async def light_client(client: httpx.AsyncClient):
+        while not stop.is_set():
+            due = loop.time() + HEALTH_INTERVAL
+            await asyncio.sleep(HEALTH_INTERVAL)
+            await client.get("/health")
+            health.append(loop.time() - due)
+
+    async def heavy_client(client: httpx.AsyncClient, offset: int):
+        nonlocal errors
+        position = offset
+        while not stop.is_set():
+            endpoint, payload = payloads[position % len(payloads)]
+            position += args.clients
+            start = time.perf_counter()
+            response = await client.post(endpoint, json=payload)
+            if response.status_code == 200:
+                latencies[endpoint].append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        tasks = [
+            asyncio.create_task(probe()),
+            asyncio.create_task(light_client(client)),
+            *[asyncio.create_task(heavy_client(client, i)) for i in range(args.clients)]
+        ]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+    await app.router.shutdown()
+
+    return {
+        'loop_lag': _percentiles(lags),
+        'health': _percentiles(health),
+        'enhance': _percentiles(latencies['/enhance']),
+        'rank': _percentiles(latencies['/rank']),
+        'errors': errors
+    }
+
+
+def _start_stub_process(args) -> subprocess.Popen:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    stub = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.stub_llm_server",
+        "--port", str(port), "--latency", str(args.llm_latency), "--jitter", str(args.llm_jitter)
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    stub.url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{stub.url}/stats")
+            return stub
+        except httpx.TransportError:
+            time.sleep(0.1)
+    stub.kill()
+    sys.exit("stub LLM server did not start")
+
+
+def _run_configuration(name: str) -> Dict:
+    """Run this benchmark for one configuration in a fresh interpreter"""
+    env = {**os.environ, **CONFIGURATIONS[name], 'REDIS_URL': '', 'METRICS_ENABLED': '0'}
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_event_loop", *sys.argv[1:], "--configuration", name],
+        env=env, capture_output=True, text=True
+    )
+    if completed.returncode:
+        sys.exit(f"{name} run failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--resume-bullets", type=int, default=600, help="bullets per /enhance resume")
+    parser.add_argument("--jd-repeat", type=int, default=20, help="job descriptions joined into one")
+    parser.add_argument("--rank-resumes", type=int, default=200, help="resumes per /rank request (0: no /rank)")
+    parser.add_argument("--payloads", type=int, default=100)
+    parser.add_argument("--corpus", type=int, default=2000, help="reference resumes indexed")
+    parser.add_argument("--llm-latency", type=float, default=0.02)
+    parser.add_argument("--llm-jitter", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--configuration", choices=sorted(CONFIGURATIONS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.configuration:
+        stub = _start_stub_process(args)
+        try:
+            with tempfile.TemporaryDirectory() as work_dir:
+                app = import_app(args, work_dir, llm_url=stub.url)
+                print(json.dumps(asyncio.run(_measure(args, app))))
+        finally:
+            stub.terminate()
+        return
+
+    results = {name: _run_configuration(name) for name in CONFIGURATIONS}
+    print(f"{'':<11}{'lag p50':>9}{'lag p99':>9}{'lag max':>9}{'health p99':>12}{'enhance':>9}{'rank':>7}{'errors':>8}")
+    for name, result in results.items():
+        lag, health = result['loop_lag'], result['health']
+        print(
+            f"{name:<11}{lag['p50_ms']:>9.2f}{lag['p99_ms']:>9.2f}{lag['max_ms']:>9.1f}"
+            f"{health['p99_ms']:>12.2f}{result['enhance']['count']:>9}{result['rank']['count']:>7}{result['errors']:>8}"
+        )
+    print("lag and latencies in ms; enhance and rank are completed requests")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""LLMGateway behaviour against the stub server under 429s and latency.
+
+    python -m benchmarks.bench_gateway --calls 200 --rate-limit-rate 0.2
+
+Starts its own stub servers on free local ports (the real API is never
+called) and runs four scenarios, printing the gateway counters and call
+latencies for each:
+
+- injected 429s: every call should still succeed, through retries
+- a burst against the stub's requests/minute limit, without and with the
+  matching client-side limit: many retried 429s versus next to none
+- identical concurrent prompts: one API call, the rest deduplicated
+- a stub that always answers 429: the circuit opens and later calls fail fast
+"""
+import argparse
+import asyncio
+import os
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from benchmarks.stub_llm_server import create_app
+
+
+def start_stub(**options) -> str:
+    """Serve a stub app in a background thread; returns its base URL"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(create_app(**options), port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def make_gateway(base_url: str, **options):
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    os.environ["ANTHROPIC_API_KEY"] = "stub-key"
+    from app.services.llm_gateway import LLMGateway
+    return LLMGateway(**options)
+
+
+def request(text: str) -> dict:
+    return {
+        "model": "stub",
+        "max_tokens": 50,
+        "messages": [{"role": "user", "content": f"Original bullet point:\n{text}"}]
+    }
+
+
+async def run_calls(gateway, texts):
+    """Latency of each call (None if it failed), run concurrently"""
+    async def timed(text):
+        start = time.perf_counter()
+        try:
+            await gateway.create("bench", request(text))
+        except Exception:
+            return None
+        return time.perf_counter() - start
+
+    return await asyncio.gather(*[timed(text) for text in texts])
+
+
+def report(name: str, gateway, latencies, base_url: str):
+    succeeded = sorted(latency for latency in latencies if latency is not None)
+    stub = httpx.get(f"{base_url}/stats").json()
+    line = f"{name}: {len(succeeded)}/{len(latencies)} ok"
+    if succeeded:
+        p50 = succeeded[len(succeeded) // 2]
+        p99 = succeeded[min(len(succeeded) - 1, int(len(succeeded) * 0.99))]
+        line += f", p50 {p50:.2f}s, p99 {p99:.2f}s"
+    counters = gateway.stats()
+    print(line)
+    print(
+        f"    gateway: calls={counters['calls']} retries={counters['retries']} "
+        f"rate_limited={counters['rate_limited']} deduplicated={counters['deduplicated']} "
+        f"rejected={counters['rejected']} failed={counters['failed']} circuit={counters['circuit']}"
+    )
+    print(f"    stub: 429s sent={stub['rate_limited']} max in flight={stub['max_in_flight']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.2)
+    parser.add_argument("--requests-per-minute", type=int, default=1200)
+    args = parser.parse_args()
+    texts = [f"Built service number {i}" for i in range(args.calls)]
+
+    base_url = start_stub(
+        latency=args.latency, jitter=args.jitter,
+        rate_limit_rate=args.rate_limit_rate, retry_after=0.2
+    )
+    gateway = make_gateway(base_url, max_retries=8)
+    report(f"injected 429s ({args.rate_limit_rate:.0%})", gateway, await run_calls(gateway, texts), base_url)
+
+    # The same burst against a stub enforcing requests/minute, without and
+    # with the matching client-side limit
+    burst = texts[:max(1, args.requests_per_minute // 12)]
+    for client_limit in (0, args.requests_per_minute):
+        base_url = start_stub(
+            latency=args.latency, jitter=args.jitter,
+            requests_per_minute=args.requests_per_minute, retry_after=1.0
+        )
+        gateway = make_gateway(base_url, max_concurrency=32, max_retries=8, requests_per_minute=client_limit)
+        name = f"stub limit {args.requests_per_minute}/min, client limit {client_limit or 'off'}"
+        report(name, gateway, await run_calls(gateway, burst), base_url)
+
+    base_url = start_stub(latency=args.latency, jitter=args.jitter)
+    gateway = make_gateway(base_url)
+    report("identical prompts", gateway, await run_calls(gateway, ["Same bullet"] * 50), base_url)
+
+    base_url = start_stub(latency=args.latency, rate_limit_rate=1.0, retry_after=0.05)
+    gateway = make_gateway(base_url, max_retries=1)
+    report("always 429 (breaker)", gateway, await run_calls(gateway, texts[:50]), base_url)
+    report("always 429, circuit open", gateway, await run_calls(gateway, texts[50:100]), base_url)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
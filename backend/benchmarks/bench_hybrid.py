@@ -0,0 +1,131 @@
+"""Cost and effect of fusing BM25 with FAISS in RAG retrieval.
+
+    python -m benchmarks.bench_hybrid --n 20000 --queries 300 --k 3
+
+Builds a RAGEngine over a synthetic corpus (hashing embedder, the
+RAG_INDEX_MODE index over resume chunks) and times, per query, each part of
+retrieval: the FAISS chunk search for k resumes (dense only) and for the
+fusion depth, the BM25 search over the JD keywords, and grouping the chunk
+hits by resume plus rank fusion. "added" is what hybrid retrieval costs on
+top of dense-only: the deeper FAISS search plus the sparse search and
+fusion. Scoring the returned resumes' chunks, shared by both paths, is left
+out. As in the service, the sparse search runs right after the FAISS
+search, whose scan leaves the CPU caches cold.
+
+Quality is reported as keyword coverage: the share of the JD's required
+skills that appear in each returned resume, averaged over results. The
+synthetic corpus draws its skills from a short list, so BM25 postings here
+cover a large share of the documents; real corpora are sparser and cheaper
+to query.
+"""
+import argparse
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from app.services import rag_engine
+from app.services.cache import ContentCache
+from app.services.embedder import HashingEmbedder
+from app.services.executors import Executors
+from app.services.index_store import IndexStore
+from app.services.parser import JobDescriptionParser, ResumeParser
+from app.utils.profiles import extract_profile
+from app.utils.text_processing import normalize_term
+from benchmarks.synthetic import generate_corpus, generate_job_description, generate_resume
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def _coverage(corpus, rows, required_terms) -> float:
+    if not len(rows) or not required_terms:
+        return 0.0
+    hits = [
+        sum(term in corpus.reference_resumes[row]['chunk_index']['postings'] for term in required_terms)
+        for row in rows
+    ]
+    return float(np.mean(hits)) / len(required_terms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--depth", type=int, default=rag_engine.CANDIDATE_DEPTH, help="candidates per ranking")
+    args = parser.parse_args()
+    rag_engine.CANDIDATE_DEPTH = args.depth
+    # Every query searches the whole corpus, as partition filtering is measured by bench_partitions
+    rag_engine.PARTITION_FIELDS = []
+
+    cache = ContentCache(redis_url="")
+    executors = Executors(0, 0)
+    with tempfile.TemporaryDirectory() as index_dir:
+        engine = rag_engine.RAGEngine(HashingEmbedder(), IndexStore(index_dir), cache, executors)
+
+    start = time.perf_counter()
+    corpus = generate_corpus(args.n)
+    metadata = [
+        {
+            'id': f'resume_{i}',
+            'filename': f'{i}.txt',
+            'sha256': '',
+            'profile': extract_profile(text),
+            'chunk_index': engine._build_chunk_index(text)
+        }
+        for i, text in enumerate(corpus)
+    ]
+    embeddings = engine._generate_embeddings([text for resume in metadata for text in resume['chunk_index']['texts']])
+    reference = engine._build_corpus(0, embeddings, metadata)
+    print(f"chunked and embedded {args.n} docs ({len(embeddings)} chunks) in {time.perf_counter() - start:.2f}s")
+
+    reference.sparse_index, build_time = _timed(engine._build_sparse_index, reference)
+    sparse = reference.sparse_index
+    print(
+        f"BM25 index: {len(sparse.terms)} terms, {len(sparse.doc_ids)} postings, "
+        f"{sparse.nbytes / 1e6:.1f} MB arrays, built in {build_time:.2f}s"
+    )
+
+    rng = random.Random(1)
+    resume_parser, jd_parser = ResumeParser(cache, executors), JobDescriptionParser(cache, executors)
+    timings = {name: [] for name in ('dense@k', 'dense@depth', 'sparse', 'fuse', 'added')}
+    coverage = {'dense': [], 'hybrid': []}
+    for _ in range(args.queries):
+        parsed_resume = resume_parser.parse(generate_resume(rng))
+        parsed_jd = jd_parser.parse(generate_job_description(rng))
+        query = engine._generate_embeddings([engine._create_query_text(parsed_resume, parsed_jd)])
+
+        dense_only_depth = min(args.k * rag_engine.CHUNK_SEARCH_FACTOR, reference.index.ntotal)
+        (_, dense_k), dense_k_time = _timed(reference.index.search, query, dense_only_depth)
+        (_, dense_depth), dense_depth_time = _timed(
+            reference.index.search, query, engine._chunk_search_depth(reference, args.k)
+        )
+        sparse_ids, sparse_time = _timed(engine._search_sparse, reference, parsed_jd, args.k)
+        rows, fuse_time = _timed(engine._rank_resumes, reference, dense_depth[0], sparse_ids, args.k)
+
+        timings['dense@k'].append(dense_k_time)
+        timings['dense@depth'].append(dense_depth_time)
+        timings['sparse'].append(sparse_time)
+        timings['fuse'].append(fuse_time)
+        timings['added'].append(dense_depth_time - dense_k_time + sparse_time + fuse_time)
+        required = [normalize_term(skill) for skill in parsed_jd.required_skills]
+        coverage['dense'].append(_coverage(reference, engine._dense_ranking(reference, dense_k[0])[:args.k], required))
+        coverage['hybrid'].append(_coverage(reference, rows, required))
+
+    print(f"{'step':<13}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, values in timings.items():
+        p50, p99 = np.percentile(np.array(values) * 1000, [50, 99])
+        print(f"{name:<13}{p50:>9.3f}{p99:>9.3f}")
+    print(
+        f"required-skill coverage of top {args.k}: "
+        f"dense {np.mean(coverage['dense']):.3f}, hybrid {np.mean(coverage['hybrid']):.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Recall-vs-latency comparison of the RAG index modes against exact search.
+
+    python -m benchmarks.bench_index_modes --n 20000 --queries 500 --k 10
+
+For each mode the corpus is embedded once with the hashing embedder, the
+index is built (and trained for IVF), and queries are run one at a time.
+Recall@k is measured against IndexFlatL2 on the same vectors; "ivfpq+refine"
+re-ranks IVF-PQ candidates with exact distances (RAG_REFINE_K_FACTOR).
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.services import index_factory
+from app.services.embedder import HashingEmbedder
+from benchmarks.synthetic import generate_corpus, generate_job_description
+
+
+def _search_each(index, queries: np.ndarray, k: int):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        results.append(ids[0])
+    return np.array(latencies), np.array(results)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--refine-k-factor", type=int, default=8)
+    args = parser.parse_args()
+
+    embedder = HashingEmbedder()
+    start = time.perf_counter()
+    corpus = embedder.embed(generate_corpus(args.n))
+    rng = random.Random(1)
+    queries = embedder.embed([generate_job_description(rng) for _ in range(args.queries)])
+    print(f"embedded {args.n} docs + {args.queries} queries in {time.perf_counter() - start:.2f}s")
+
+    rows = []
+    variants = [('flat', 0), ('ivfpq', 0), ('ivfpq+refine', args.refine_k_factor), ('hnsw', 0)]
+    for label, refine_k_factor in variants:
+        mode = label.split('+')[0]
+        start = time.perf_counter()
+        index = index_factory.build_index(corpus, mode=mode, refine_k_factor=refine_k_factor)
+        build_time = time.perf_counter() - start
+        actual = type(index).__name__
+
+        if mode == 'flat':
+            latencies, truth = _search_each(index, queries, args.k)
+            rows.append((label, actual, '-', build_time, latencies, 1.0))
+            continue
+
+        settings = args.nprobe if mode == 'ivfpq' else args.ef_search
+        for value in settings:
+            index_factory.configure_search(index, nprobe=value, ef_search=value)
+            latencies, found = _search_each(index, queries, args.k)
+            rows.append((label, actual, value, build_time, latencies, _recall(found, truth)))
+
+    print(f"{'mode':<14}{'index':<16}{'param':>7}{'build s':>9}{'p50 ms':>9}{'p99 ms':>9}{'recall@k':>10}")
+    for label, actual, param, build_time, latencies, recall in rows:
+        p50, p99 = np.percentile(latencies * 1000, [50, 99])
+        print(f"{label:<14}{actual:<16}{param!s:>7}{build_time:>9.2f}{p50:>9.3f}{p99:>9.3f}{recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
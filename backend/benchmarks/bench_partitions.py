@@ -0,0 +1,114 @@
+"""Profile-filtered retrieval from per-partition indexes versus post-filtering.
+
+    python -m benchmarks.bench_partitions --n 10000 --queries 300 --k 3
+
+Builds a RAGEngine over a synthetic corpus with RAG_PARTITION_FIELDS
+partitions and runs job descriptions for random roles and years of
+experience through find_similar_resumes, once with the partitions and once
+over the full index. Reported per mode:
+
+- match@k: share of returned resumes whose profile matches the JD on every
+  partition field the JD has a value for, i.e. what keeping only matching
+  resumes from the unfiltered top k would leave
+- vectors: chunk vectors the FAISS search reads per query
+- search p50/p99: the FAISS step alone; total p50: the whole call
+
+Relaxation (dropping seniority, then role family, when too few resumes
+match) is off, as in requests that do not ask for it; every partition
+holds more than k resumes here anyway.
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from app.services import rag_engine
+from app.services.cache import ContentCache
+from app.services.embedder import HashingEmbedder
+from app.services.executors import Executors
+from app.services.index_store import IndexStore
+from app.services.parser import JobDescriptionParser, ResumeParser
+from app.utils.profiles import UNKNOWN, extract_profile
+from benchmarks.synthetic import generate_corpus, generate_job_description, generate_resume
+
+
+def _matches(profile, jd_profile) -> bool:
+    return all(
+        profile.get(field) == jd_profile[field]
+        for field in rag_engine.PARTITION_FIELDS
+        if jd_profile.get(field, UNKNOWN) != UNKNOWN
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    cache, executors = ContentCache(redis_url=""), Executors(0, 0)
+    with tempfile.TemporaryDirectory() as index_dir:
+        engine = rag_engine.RAGEngine(HashingEmbedder(), IndexStore(index_dir), cache, executors)
+
+    corpus = generate_corpus(args.n)
+    metadata = [
+        {
+            'id': f'resume_{i}',
+            'filename': f'{i}.txt',
+            'sha256': '',
+            'profile': extract_profile(text),
+            'chunk_index': engine._build_chunk_index(text)
+        }
+        for i, text in enumerate(corpus)
+    ]
+    embeddings = engine._generate_embeddings([text for resume in metadata for text in resume['chunk_index']['texts']])
+    reference = engine._build_corpus(0, embeddings, metadata)
+    engine._get_text = lambda resume: ''
+
+    start = time.perf_counter()
+    partitions = engine._build_partitions(reference)
+    sizes = [len(partition.rows) for partition in partitions.partitions.values()]
+    print(
+        f"{args.n} resumes, {reference.index.ntotal} chunks; {len(sizes)} partitions over "
+        f"{','.join(rag_engine.PARTITION_FIELDS)} of {min(sizes)}-{max(sizes)} resumes, "
+        f"built in {time.perf_counter() - start:.2f}s, "
+        f"{partitions.ntotal * engine.embedder.dimension * 4 / 1e6:.0f} MB of copied vectors"
+    )
+
+    rng = random.Random(3)
+    resume_parser, jd_parser = ResumeParser(cache, executors), JobDescriptionParser(cache, executors)
+    queries = [
+        (resume_parser.parse(generate_resume(rng)), jd_parser.parse(generate_job_description(rng)))
+        for _ in range(args.queries)
+    ]
+
+    print(f"{'mode':<12}{'match@k':>9}{'vectors':>9}{'search p50':>12}{'p99 ms':>8}{'total p50':>11}")
+    for mode, partition_index in (('unfiltered', None), ('partitioned', partitions)):
+        reference.partitions = partition_index
+        matched, vectors, search_times, total_times = [], [], [], []
+        for parsed_resume, parsed_jd in queries:
+            query = engine._generate_embeddings([engine._create_query_text(parsed_resume, parsed_jd)])
+            selected, _ = engine._select_partitions(reference, parsed_jd, args.k)
+            start = time.perf_counter()
+            engine._search_chunks(reference, query, engine._chunk_search_depth(reference, args.k), selected)
+            search_times.append(time.perf_counter() - start)
+            vectors.append(engine._searched_vectors(reference, selected))
+
+            start = time.perf_counter()
+            similar = asyncio.run(engine.find_similar_resumes(parsed_resume, parsed_jd, args.k, reference))
+            total_times.append(time.perf_counter() - start)
+            matched.extend(_matches(result['resume']['profile'], parsed_jd.profile) for result in similar)
+
+        search_p50, search_p99 = np.percentile(np.array(search_times) * 1000, [50, 99])
+        print(
+            f"{mode:<12}{np.mean(matched):>9.3f}{np.mean(vectors):>9.0f}{search_p50:>12.3f}{search_p99:>8.3f}"
+            f"{np.percentile(np.array(total_times) * 1000, 50):>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""Per-stage latency, throughput and memory of the enhancement pipeline, offline.
+
+    python -m benchmarks.bench_pipeline --sizes 4 12 32 --samples 50 --output results.json
+    python -m benchmarks.bench_pipeline --compare results.json --output new.json
+    python -m benchmarks.bench_pipeline --load --rps 20 --duration 30 --output load.json
+
+Synthetic resumes with each number of bullets in ``--sizes`` are run one at a
+time through ResumeParser, JobDescriptionParser, RAGEngine (hashing embedder
+over a synthetic reference corpus in a temporary directory), GapAnalyzer and
+ResumeEnhancer. The enhancer calls a stub LLM server started on a free local
+port with ``--llm-latency`` seconds per call, so the real API is never used.
+Every sample is a new resume and JD, so the numbers are for cold caches.
+
+Latency is timed without tracing; peak memory per stage is then measured on
+``--memory-samples`` further samples under tracemalloc (Python allocations
+above what was live when the stage started, numpy buffers included).
+
+``--load`` instead serves the FastAPI app (or uses ``--url``) and sends
+``--endpoint`` requests on a fixed schedule at ``--rps``, without waiting
+for earlier responses, so a slow server shows up as latency rather than as
+a lower request rate. Latency is measured from each request's scheduled
+send time. The in-process server shares the CPU with the load generator;
+point ``--url`` at a separately started one for heavier loads.
+
+``--output`` writes the results as JSON together with the git commit and
+the settings; ``--compare`` prints the p50/p99 change against such a file.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.bench_gateway import start_stub
+from benchmarks.synthetic import generate_corpus, generate_job_description, generate_resume
+
+STAGES = ('parse_resume', 'parse_jd', 'rag', 'gap_analysis', 'enhance')
+
+
+def _use_stub_llm(args, base_url: Optional[str] = None) -> str:
+    """Point the SDK at a stub server, started here with the requested latency unless given"""
+    base_url = base_url or start_stub(latency=args.llm_latency, jitter=args.llm_jitter)
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    os.environ["ANTHROPIC_API_KEY"] = "stub-key"
+    return base_url
+
+
+def _write_reference_corpus(directory: str, n: int) -> str:
+    """Synthetic reference resumes as files, where RAGEngine reads its corpus from"""
+    corpus_dir = os.path.join(directory, "reference_resumes")
+    os.makedirs(corpus_dir)
+    for i, text in enumerate(generate_corpus(n, seed=99)):
+        with open(os.path.join(corpus_dir, f"resume_{i:05d}.txt"), "w") as f:
+            f.write(text)
+    return corpus_dir
+
+
+def _summary(latencies: List[float], peaks: List[int]) -> Dict:
+    seconds = np.array(latencies)
+    p50, p99 = np.percentile(seconds * 1000, [50, 99])
+    return {
+        'samples': len(latencies),
+        'throughput_per_s': len(latencies) / seconds.sum() if seconds.sum() else None,
+        'mean_ms': float(seconds.mean() * 1000),
+        'p50_ms': float(p50),
+        'p99_ms': float(p99),
+        'peak_memory_kb': max(peaks) / 1024 if peaks else None
+    }
+
+
+class Pipeline:
+    """The services /enhance runs, built on a process-local cache and the stub LLM"""
+
+    def __init__(self, work_dir: str, corpus_size: int, mode: str):
+        from app.services import rag_engine
+        from app.services.analyzer import GapAnalyzer
+        from app.services.cache import ContentCache
+        from app.services.embedder import HashingEmbedder
+        from app.services.enhancer import ResumeEnhancer
+        from app.services.index_store import IndexStore
+        from app.services.llm_gateway import LLMGateway
+        from app.services.parser import JobDescriptionParser, ResumeParser
+
+        # The engine reads its corpus from a module-level directory
+        rag_engine.RESUME_DIR = _write_reference_corpus(work_dir, corpus_size)
+        cache = ContentCache(redis_url="")
+        self.resume_parser = ResumeParser(cache)
+        self.jd_parser = JobDescriptionParser(cache)
+        self.rag = rag_engine.RAGEngine(
+            HashingEmbedder(), IndexStore(os.path.join(work_dir, "index")), cache
+        )
+        self.gap_analyzer = GapAnalyzer(cache=cache)
+        self.enhancer = ResumeEnhancer(cache, gateway=LLMGateway())
+        self.mode = mode
+
+    async def run(self, resume_text: str, jd_text: str, trace: bool) -> Dict[str, tuple]:
+        """(seconds, peak bytes or None) per stage for one resume and JD"""
+        state = {}
+        steps: Dict[str, Callable] = {
+            'parse_resume': lambda: self.resume_parser.parse(resume_text),
+            'parse_jd': lambda: self.jd_parser.parse(jd_text),
+            'rag': lambda: self.rag.find_similar_resumes(state['parse_resume'], state['parse_jd']),
+            'gap_analysis': lambda: self.gap_analyzer.analyze(
+                state['parse_resume'], state['parse_jd'], state['rag']
+            ),
+            'enhance': lambda: self.enhancer.enhance(
+                state['parse_resume'], state['parse_jd'], state['rag'], state['gap_analysis'],
+                mode=self.mode
+            )
+        }
+        measured = {}
+        for stage in STAGES:
+            if trace:
+                tracemalloc.reset_peak()
+                live = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            result = steps[stage]()
+            if inspect.isawaitable(result):
+                result = await result
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - live if trace else None
+            state[stage] = result
+            measured[stage] = (elapsed, peak)
+        return measured
+
+
+async def run_stages(args) -> Dict:
+    _use_stub_llm(args)
+    with tempfile.TemporaryDirectory() as work_dir:
+        pipeline = Pipeline(work_dir, args.corpus, args.mode)
+        start = time.perf_counter()
+        await pipeline.rag.initialize()
+        print(f"indexed {args.corpus} reference resumes in {time.perf_counter() - start:.2f}s")
+
+        rng = random.Random(args.seed)
+        results = {}
+        for size in args.sizes:
+            latencies = {stage: [] for stage in STAGES}
+            peaks = {stage: [] for stage in STAGES}
+            for sample in range(args.samples + args.memory_samples):
+                trace = sample >= args.samples
+                if trace and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                measured = await pipeline.run(generate_resume(rng, size), generate_job_description(rng), trace)
+                for stage, (elapsed, peak) in measured.items():
+                    if trace:
+                        peaks[stage].append(peak)
+                    else:
+                        latencies[stage].append(elapsed)
+            tracemalloc.stop()
+            results[str(size)] = {stage: _summary(latencies[stage], peaks[stage]) for stage in STAGES}
+
+        await pipeline.enhancer.gateway.close()
+        return results
+
+
+def _print_stages(results: Dict):
+    print(f"{'bullets':>8} {'stage':<14}{'per s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak KiB':>10}")
+    for size, stages in results.items():
+        for stage, row in stages.items():
+            peak = f"{row['peak_memory_kb']:.0f}" if row['peak_memory_kb'] is not None else '-'
+            print(
+                f"{size:>8} {stage:<14}{row['throughput_per_s']:>10.1f}"
+                f"{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{peak:>10}"
+            )
+
+
+def import_app(args, work_dir: str, llm_url: Optional[str] = None):
+    """app.main set up against the stub LLM and a synthetic corpus of ``args.corpus`` resumes"""
+    _use_stub_llm(args, llm_url)
+    os.environ["RAG_INDEX_DIR"] = os.path.join(work_dir, "index")
+    from app.services import rag_engine
+    rag_engine.RESUME_DIR = _write_reference_corpus(work_dir, args.corpus)
+    from app.main import app
+    # app.main logs at INFO, which would include every stub and load request
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    return app
+
+
+def _start_app(args, work_dir: str) -> str:
+    """Serve app.main on a free port; returns its base URL"""
+    import uvicorn
+
+    app = import_app(args, work_dir)
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def _load_payload(args, rng: random.Random) -> Dict:
+    job_description = generate_job_description(rng)
+    if args.endpoint == "/rank":
+        resumes = [generate_resume(rng, args.sizes[0]) for _ in range(args.rank_resumes)]
+        return {'resumes': resumes, 'job_description': job_description, 'top_k': 10}
+    return {
+        'resume_text': generate_resume(rng, args.sizes[0]),
+        'job_description': job_description,
+        'enhancement_mode': args.mode
+    }
+
+
+async def run_load(args, base_url: str) -> Dict:
+    """Open-loop load: request i is sent at start + i / rps whatever the server does"""
+    rng = random.Random(args.seed)
+    total = int(args.rps * args.duration)
+    payloads = [_load_payload(args, rng) for _ in range(total)]
+    latencies, sent, statuses = [], [], {}
+    limits = httpx.Limits(max_connections=args.max_connections)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        async def send(i: int, scheduled: float):
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            sent.append(time.perf_counter())
+            try:
+                response = await client.post(args.endpoint, json=payloads[i])
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == '200':
+                latencies.append(time.perf_counter() - scheduled)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[send(i, start + i / args.rps) for i in range(total)])
+
+    # Rate the requests actually went out at; below target means the client fell behind
+    send_span = max(sent) - min(sent)
+
+    result = {
+        'endpoint': args.endpoint,
+        'target_rps': args.rps,
+        'requests': total,
+        'achieved_rps': (total - 1) / send_span if send_span else None,
+        'statuses': statuses
+    }
+    if latencies:
+        p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+        result.update(p50_ms=float(p50), p99_ms=float(p99), max_ms=max(latencies) * 1000)
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(results: Dict, baseline_path: str):
+    """p50/p99 of this run relative to a previous JSON result"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"compared with {baseline_path} (commit {baseline.get('commit')})")
+    if 'stages' in results and 'stages' in baseline:
+        for size, stages in results['stages'].items():
+            for stage, row in stages.items():
+                before = baseline['stages'].get(size, {}).get(stage)
+                if before:
+                    print(
+                        f"{size:>8} {stage:<14} p50 {row['p50_ms'] / before['p50_ms']:>6.2f}x"
+                        f"  p99 {row['p99_ms'] / before['p99_ms']:>6.2f}x"
+                    )
+    now, before = results.get('load', {}), baseline.get('load', {})
+    if 'p50_ms' in now and 'p50_ms' in before and now['endpoint'] == before['endpoint']:
+        print(
+            f"load {now['endpoint']}  p50 {now['p50_ms'] / before['p50_ms']:.2f}x"
+            f"  p99 {now['p99_ms'] / before['p99_ms']:.2f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 12, 32], help="bullets per resume")
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--memory-samples", type=int, default=5)
+    parser.add_argument("--corpus", type=int, default=500, help="reference resumes indexed")
+    parser.add_argument("--mode", choices=["per_bullet", "batched"], default="per_bullet")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--llm-jitter", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--load", action="store_true", help="drive the HTTP app instead of the stages")
+    parser.add_argument("--url", help="running server for --load; default serves app.main here")
+    parser.add_argument("--endpoint", choices=["/enhance", "/rank"], default="/enhance")
+    parser.add_argument("--rps", type=float, default=10)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--rank-resumes", type=int, default=200, help="resumes per /rank request")
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON result of an earlier run")
+    args = parser.parse_args()
+
+    results = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'settings': vars(args)
+    }
+    if args.load:
+        with tempfile.TemporaryDirectory() as work_dir:
+            base_url = args.url or _start_app(args, work_dir)
+            results['load'] = asyncio.run(run_load(args, base_url))
+        print(json.dumps(results['load'], indent=2))
+    else:
+        results['stages'] = asyncio.run(run_stages(args))
+        _print_stages(results['stages'])
+
+    if args.compare:
+        _compare(results, args.compare)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
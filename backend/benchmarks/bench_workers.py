@@ -0,0 +1,173 @@
+"""Memory and startup of N worker processes with a local versus a shared reference corpus.
+
+    python -m benchmarks.bench_workers --n 10000 --workers 1,2,4
+
+Writes a synthetic corpus to RESUME_DIR, builds it once into an IndexStore
+and publishes it to a SharedCorpusStore, as the corpus builder does. Then,
+for each mode and worker count, starts that many worker processes, each of
+which creates a RAGEngine, initializes it and runs --queries searches so
+the data it serves from is paged in, as in a server that has taken traffic:
+
+- local: every worker loads the IndexStore, unpickles the metadata and
+  derives the BM25 index and the partitions itself
+- shared: every worker maps the published build (RAG_CORPUS_MODE=shared)
+
+Reported per run, from /proc/<pid>/smaps_rollup of the idle workers:
+
+- ready ms: RAGEngine() plus initialize(), slowest worker (imports excluded)
+- rss MB: summed resident sizes, counting shared pages once per worker
+- pss MB: summed proportional sizes, shared pages split between the
+  processes mapping them, i.e. what the workers actually cost together
+- private MB: memory only one worker uses, per worker
+
+Linux only. The per-process cost of Python, NumPy and FAISS is included
+in every figure; the difference between the modes is the corpus.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from app.services import rag_engine
+from app.services.cache import ContentCache
+from app.services.embedder import HashingEmbedder
+from app.services.executors import Executors
+from app.services.index_store import IndexStore
+from app.services.parser import JobDescriptionParser, ResumeParser
+from app.services.shared_corpus import SharedCorpusStore
+from benchmarks.synthetic import generate_corpus, generate_job_description, generate_resume
+
+MODES = ('local', 'shared')
+
+
+def _engine(args, read_only: bool) -> rag_engine.RAGEngine:
+    rag_engine.RESUME_DIR = args.corpus_dir
+    return rag_engine.RAGEngine(
+        HashingEmbedder(),
+        IndexStore(args.index_dir),
+        ContentCache(redis_url=""),
+        Executors(0, 0),
+        SharedCorpusStore(args.shared_dir),
+        read_only=read_only
+    )
+
+
+def _worker(args):
+    """One worker: initialize, search, report, then stay alive until stdin closes"""
+    start = time.perf_counter()
+    engine = _engine(args, args.worker == 'shared')
+    asyncio.run(engine.initialize())
+    ready = time.perf_counter() - start
+
+    rng = random.Random(os.getpid())
+    cache, executors = ContentCache(redis_url=""), Executors(0, 0)
+    resume_parser, jd_parser = ResumeParser(cache, executors), JobDescriptionParser(cache, executors)
+    for _ in range(args.queries):
+        asyncio.run(engine.find_similar_resumes(
+            resume_parser.parse(generate_resume(rng)),
+            jd_parser.parse(generate_job_description(rng))
+        ))
+
+    print(json.dumps({'ready_ms': ready * 1000, 'version': engine.corpus.version}), flush=True)
+    sys.stdin.read()
+
+
+def _memory(pid: int) -> Dict[str, float]:
+    """Rss, Pss and private memory of a process in MB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0]) / 1024
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'private': fields['Private_Clean'] + fields['Private_Dirty']
+    }
+
+
+def _run(args, mode: str, workers: int) -> Dict:
+    command = [
+        sys.executable, "-m", "benchmarks.bench_workers", "--worker", mode,
+        "--corpus-dir", args.corpus_dir, "--index-dir", args.index_dir, "--shared-dir", args.shared_dir,
+        "--queries", str(args.queries)
+    ]
+    env = {**os.environ, 'RAG_CORPUS_MODE': mode}
+    processes = [
+        subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env, text=True)
+        for _ in range(workers)
+    ]
+    try:
+        reports = []
+        for process in processes:
+            line = process.stdout.readline()
+            if not line:
+                sys.exit(f"{mode} worker failed")
+            reports.append(json.loads(line))
+        memory = [_memory(process.pid) for process in processes]
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+    return {
+        'ready_ms': max(report['ready_ms'] for report in reports),
+        'rss': sum(usage['rss'] for usage in memory),
+        'pss': sum(usage['pss'] for usage in memory),
+        'private': sum(usage['private'] for usage in memory) / workers
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=10000)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--corpus-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--index-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--shared-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        _worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        args.corpus_dir, args.index_dir, args.shared_dir = (
+            os.path.join(root, name) for name in ('resumes', 'index', 'shared')
+        )
+        os.makedirs(args.corpus_dir)
+        for i, text in enumerate(generate_corpus(args.n)):
+            with open(os.path.join(args.corpus_dir, f'{i:06d}.txt'), 'w') as f:
+                f.write(text)
+
+        start = time.perf_counter()
+        builder = _engine(args, False)
+        asyncio.run(builder.initialize())
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        asyncio.run(builder.publish())
+        print(
+            f"{args.n} resumes, {builder.corpus.index.ntotal} chunks: built in {built:.1f}s, "
+            f"published in {time.perf_counter() - start:.1f}s"
+        )
+        del builder
+
+        print(f"{'mode':<8}{'workers':>8}{'ready ms':>10}{'rss MB':>9}{'pss MB':>9}{'private MB':>12}")
+        for mode in MODES:
+            for workers in (int(count) for count in args.workers.split(',')):
+                result = _run(args, mode, workers)
+                print(
+                    f"{mode:<8}{workers:>8}{result['ready_ms']:>10.1f}{result['rss']:>9.0f}"
+                    f"{result['pss']:>9.0f}{result['private']:>12.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Local stand-in for the Anthropic Messages API with injected latency.
+
+Run it next to the backend and point the SDK at it:
+
+    python -m benchmarks.stub_llm_server --port 8081 --latency 0.5 --jitter 0.2
+    ANTHROPIC_BASE_URL=http://localhost:8081 uvicorn app.main:app
+
+Every request sleeps for ``latency`` (+ uniform ``jitter``) seconds before
+answering, and requests whose prompt contains ``--slow-marker`` sleep for
+``--slow-latency`` instead, which makes per-call timeouts easy to exercise.
+Streaming requests (``"stream": true``) get the same delay before the first
+token, then one SSE text delta per word every ``--token-interval`` seconds.
+
+Prompt caching is simulated: a system prefix ending in a ``cache_control``
+block of at least ``--cache-min-tokens`` (len / 4) is reported as a cache write the
+first time and a cache read afterwards. ``--prefill-per-1k`` adds that many
+seconds per 1000 uncached input tokens (cached ones cost a tenth), so
+smaller or cached prompts show up as a shorter time to first token.
+The reply echoes the bullet after "Original bullet point:" (else the last
+line of the user message). Batch prompts asking for a ``{"points": ...}``
+JSON object get one, with each bullet omitted at ``--batch-drop-rate``
+so the per-bullet fallback can be exercised.
+
+Rate limiting is simulated for the gateway's retries and breaker: a
+``--rate-limit-rate`` fraction of requests, and every request beyond
+``--requests-per-minute`` (a token bucket holding one second's worth,
+refilled continuously, as the API enforces its limits), gets a 429 with
+a ``retry-after`` of ``--retry-after`` seconds.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+
+def create_app(
+    latency: float = 0.5,
+    jitter: float = 0.0,
+    slow_marker: str = "SLOW",
+    slow_latency: float = 60.0,
+    token_interval: float = 0.02,
+    prefill_per_1k: float = 0.0,
+    cache_min_tokens: int = 1024,
+    batch_drop_rate: float = 0.0,
+    rate_limit_rate: float = 0.0,
+    requests_per_minute: int = 0,
+    retry_after: float = 1.0
+) -> FastAPI:
+    app = FastAPI(title="Stub LLM")
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+    app.state.cached_prefixes = set()
+    app.state.bucket = {"level": requests_per_minute / 60, "updated": time.monotonic()}
+    app.state.rate_limited = 0
+    app.state.usage = {"input_tokens": 0, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+
+    def usage_for(system, prompt: str) -> dict:
+        """Input token accounting, including simulated prompt-cache reads and writes"""
+        blocks = [{"text": system}] if isinstance(system, str) else list(system or [])
+        system_tokens = sum(len(block.get("text", "")) for block in blocks) // 4
+        breakpoints = [i for i, block in enumerate(blocks) if block.get("cache_control")]
+        cached = written = 0
+        if breakpoints:
+            prefix = "".join(block.get("text", "") for block in blocks[:breakpoints[-1] + 1])
+            prefix_tokens = len(prefix) // 4
+            if prefix_tokens >= cache_min_tokens:
+                digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+                if digest in app.state.cached_prefixes:
+                    cached = prefix_tokens
+                else:
+                    app.state.cached_prefixes.add(digest)
+                    written = prefix_tokens
+        usage = {
+            "input_tokens": system_tokens + len(prompt) // 4 - cached - written,
+            "cache_creation_input_tokens": written,
+            "cache_read_input_tokens": cached
+        }
+        for field, count in usage.items():
+            app.state.usage[field] += count
+        return usage
+
+    def reply_text(prompt: str) -> str:
+        if '{"points"' in prompt:
+            points = [
+                {"index": int(index), "enhanced": f"Enhanced: {bullet.strip()}"}
+                for index, bullet in re.findall(r"^(\d+): (.+)$", prompt, re.MULTILINE)
+                if random.random() >= batch_drop_rate
+            ]
+            reply = {"points": points}
+            if '"recommendations"' in prompt:
+                reply["recommendations"] = ["Enhanced: highlight the missing required skills"]
+            return json.dumps(reply)
+
+        lines = [line.strip() for line in prompt.strip().splitlines() if line.strip()]
+        if "Original bullet point:" in lines[:-1]:
+            return f"Enhanced: {lines[lines.index('Original bullet point:') + 1][:120]}"
+        return f"Enhanced: {lines[-1][:120]}"
+
+    def rate_limited() -> bool:
+        """Whether to reject this request, taking a token from the bucket if not"""
+        if random.random() < rate_limit_rate:
+            return True
+        if not requests_per_minute:
+            return False
+
+        bucket, now = app.state.bucket, time.monotonic()
+        per_second = requests_per_minute / 60
+        bucket["level"] = min(per_second, bucket["level"] + (now - bucket["updated"]) * per_second)
+        bucket["updated"] = now
+        if bucket["level"] < 1:
+            return True
+        bucket["level"] -= 1
+        return False
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        if rate_limited():
+            app.state.rate_limited += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": str(retry_after)},
+                content={"type": "error", "error": {"type": "rate_limit_error", "message": "Stub rate limit"}}
+            )
+        prompt = body["messages"][-1]["content"]
+        if not isinstance(prompt, str):
+            prompt = " ".join(block.get("text", "") for block in prompt)
+
+        usage = usage_for(body.get("system"), prompt)
+        prefill_tokens = (
+            usage["input_tokens"] + usage["cache_creation_input_tokens"]
+            + usage["cache_read_input_tokens"] / 10
+        )
+        delay = slow_latency if slow_marker and slow_marker in prompt else latency
+        delay += prefill_per_1k * prefill_tokens / 1000
+        text = reply_text(prompt)
+        message = {
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "stub"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {**usage, "output_tokens": len(text) // 4}
+        }
+
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream_message(message, delay + random.uniform(0, jitter)),
+                media_type="text/event-stream"
+            )
+
+        app.state.in_flight += 1
+        app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+        try:
+            await asyncio.sleep(delay + random.uniform(0, jitter))
+        finally:
+            app.state.in_flight -= 1
+        return message
+
+    async def _stream_message(message: dict, delay: float):
+        """Replay message as Messages API stream events, one word per delta"""
+        def event(name: str, data: dict) -> str:
+            return f"event: {name}\ndata: {json.dumps({'type': name, **data})}\n\n"
+
+        app.state.in_flight += 1
+        app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+        try:
+            await asyncio.sleep(delay)
+            text = message["content"][0]["text"]
+            yield event("message_start", {"message": {**message, "content": [], "stop_reason": None}})
+            yield event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+            for position, word in enumerate(text.split(" ")):
+                if position:
+                    await asyncio.sleep(token_interval)
+                delta = word if position == 0 else " " + word
+                yield event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": delta}})
+            yield event("content_block_stop", {"index": 0})
+            yield event("message_delta", {
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": message["usage"]["output_tokens"]}
+            })
+            yield event("message_stop", {})
+        finally:
+            app.state.in_flight -= 1
+
+    @app.get("/stats")
+    async def stats():
+        """Peak concurrency observed, to check the enhancer's fan-out limit, 429s sent and token totals"""
+        return {
+            "in_flight": app.state.in_flight,
+            "max_in_flight": app.state.max_in_flight,
+            "cached_prefixes": len(app.state.cached_prefixes),
+            "rate_limited": app.state.rate_limited,
+            **app.state.usage
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--slow-marker", default="SLOW")
+    parser.add_argument("--slow-latency", type=float, default=60.0)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--prefill-per-1k", type=float, default=0.0)
+    parser.add_argument("--cache-min-tokens", type=int, default=1024)
+    parser.add_argument("--batch-drop-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--requests-per-minute", type=int, default=0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.latency, args.jitter, args.slow_marker, args.slow_latency,
+                   args.token_interval, args.prefill_per_1k, args.cache_min_tokens,
+                   args.batch_drop_rate, args.rate_limit_rate, args.requests_per_minute,
+                   args.retry_after),
+        host=args.host,
+        port=args.port
+    )
@@ -0,0 +1,65 @@
+"""Synthetic resumes and job descriptions for benchmarks."""
+import random
+from typing import List
+
+TECHNOLOGIES = [
+    'python', 'java', 'javascript', 'typescript', 'go', 'rust', 'scala', 'kotlin',
+    'react', 'angular', 'vue', 'django', 'flask', 'spring', 'fastapi', 'nodejs',
+    'aws', 'gcp', 'azure', 'docker', 'kubernetes', 'jenkins', 'terraform', 'ansible',
+    'postgresql', 'mysql', 'mongodb', 'redis', 'elasticsearch', 'cassandra', 'dynamodb',
+    'graphql', 'microservices', 'kafka', 'spark', 'airflow', 'pytorch', 'tensorflow'
+]
+VERBS = ['Built', 'Developed', 'Created', 'Implemented', 'Led', 'Designed', 'Migrated', 'Optimized']
+SYSTEMS = [
+    'payments platform', 'search service', 'analytics pipeline', 'recommendation engine',
+    'data warehouse', 'mobile backend', 'CI/CD pipeline', 'billing system', 'ML feature store'
+]
+OUTCOMES = [
+    'serving {n}k daily users', 'cutting latency by {n}%', 'reducing costs by {n}%',
+    'processing {n}M events per day', 'improving uptime to 99.{n}%'
+]
+ROLES = ['Backend Engineer', 'Frontend Engineer', 'Data Engineer', 'ML Engineer', 'DevOps Engineer']
+
+
+def _bullet(rng: random.Random) -> str:
+    a, b = rng.sample(TECHNOLOGIES, 2)
+    outcome = rng.choice(OUTCOMES).format(n=rng.randint(2, 95))
+    return f"- {rng.choice(VERBS)} a {rng.choice(SYSTEMS)} using {a} and {b}, {outcome}"
+
+
+def generate_resume(rng: random.Random, n_bullets: int = 8) -> str:
+    """A resume with skills, experience and project sections"""
+    experience = max(1, n_bullets * 2 // 3)
+    lines = [
+        f"Candidate {rng.randint(1000, 9999)}",
+        "",
+        "Skills",
+        "Languages: " + ", ".join(rng.sample(TECHNOLOGIES, rng.randint(4, 10))),
+        "",
+        "Experience",
+        f"{rng.choice(ROLES)}, Company {rng.randint(1, 500)} ({rng.randint(1, 12)} years)",
+    ]
+    lines += [_bullet(rng) for _ in range(experience)]
+    lines += ["", "Projects"]
+    lines += [_bullet(rng) for _ in range(n_bullets - experience)]
+    lines += ["", "Education", "BSc Computer Science"]
+    return "\n".join(lines)
+
+
+def generate_job_description(rng: random.Random, n_skills: int = 6) -> str:
+    """A job description with required/preferred skills and responsibilities"""
+    required = rng.sample(TECHNOLOGIES, n_skills)
+    preferred = rng.sample([t for t in TECHNOLOGIES if t not in required], max(1, n_skills // 2))
+    responsibilities = [f"- Own the {rng.choice(SYSTEMS)} end to end" for _ in range(4)]
+    return "\n".join([
+        f"{rng.choice(ROLES)}",
+        f"Required: {', '.join(required)}. {rng.randint(2, 8)}+ years of experience.",
+        f"Preferred: {', '.join(preferred)}.",
+        "Responsibilities:",
+        *responsibilities
+    ])
+
+
+def generate_corpus(n: int, seed: int = 0, n_bullets: int = 8) -> List[str]:
+    rng = random.Random(seed)
+    return [generate_resume(rng, n_bullets) for _ in range(n)]
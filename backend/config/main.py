@@ -1,16 +1,51 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import Depends, FastAPI, Header, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+import asyncio
+import json
 import logging
-from app.models import EnhancementRequest, EnhancementResponse
+import os
+import secrets
+from typing import Dict, List, Optional
+from app.models import (
+    EnhancementRequest,
+    EnhancementResponse,
+    BatchEnhancementRequest,
+    BatchEnhancementResult,
+    JobInfo,
+    JobResult,
+    RankRequest,
+    RankResponse,
+    ReferenceIndexInfo,
+    ReferenceResumeRequest,
+    ReferenceUpdate
+)
 from app.services.parser import ResumeParser, JobDescriptionParser
-from app.services.rag_engine import RAGEngine
+from app.services.rag_engine import RAGEngine, ReadOnlyCorpusError
 from app.services.enhancer import ResumeEnhancer
 from app.services.analyzer import GapAnalyzer
+from app.services.ranking import RankingEngine
+from app.services.cache import get_cache
+from app.services.executors import EXECUTOR_INLINE_MAX_CHARS, get_executors
+from app.services.jobs import FINISHED_STATES, JobManager, JobQueueFullError, create_job_store
+from app.services.metrics import MetricsMiddleware, get_metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upper bound on resumes per /enhance/batch request
+BATCH_MAX_RESUMES = int(os.getenv("BATCH_MAX_RESUMES", "1000"))
+# Candidates enhanced at once within one batch; keeping this small lets the
+# first candidates finish (and stream out) early instead of all finishing last
+BATCH_CANDIDATES_IN_FLIGHT = int(os.getenv("BATCH_CANDIDATES_IN_FLIGHT", "4"))
+# Upper bound on resumes per /rank request
+RANK_MAX_RESUMES = int(os.getenv("RANK_MAX_RESUMES", "20000"))
+# Retry-After (seconds) sent when the job queue is full
+JOB_RETRY_AFTER = 5
+# Shared secret for the /admin endpoints, sent as X-Admin-Token; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
 app = FastAPI(title="Resume Enhancement API")
 
 # CORS for React frontend
@@ -22,12 +57,120 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage timers, /metrics and optional Server-Timing headers; off with METRICS_ENABLED=0
+metrics = get_metrics()
+if metrics.enabled:
+    app.add_middleware(MetricsMiddleware, metrics=metrics, routes=app.router.routes)
+
+# Thread and process pools for CPU-bound steps; small inputs stay on the event loop
+executors = get_executors()
+
 # Initialize services
 resume_parser = ResumeParser()
 jd_parser = JobDescriptionParser()
 rag_engine = RAGEngine()
 enhancer = ResumeEnhancer()
 gap_analyzer = GapAnalyzer()
+# Candidate-side caching is the engine's own, so /rank cannot evict /enhance entries
+ranking_engine = RankingEngine(jd_parser=jd_parser, embedder=rag_engine.embedder)
+
+def _relaxed_filters(similar_resumes: List[Dict]) -> List[str]:
+    """Profile filters retrieval dropped for these results"""
+    return similar_resumes[0]['relaxed_filters'] if similar_resumes else []
+
+async def _analyze_gaps(request: EnhancementRequest, parsed_resume, parsed_jd, similar_resumes) -> dict:
+    """Gap analysis, on the thread pool for large resumes"""
+    return await executors.run_in_thread(
+        gap_analyzer.analyze,
+        parsed_resume,
+        parsed_jd,
+        similar_resumes,
+        inline=len(request.resume_text) <= EXECUTOR_INLINE_MAX_CHARS
+    )
+
+async def run_enhancement_job(request: dict, emit):
+    """Body of a /jobs job: the /enhance pipeline, reporting each bullet as it finishes"""
+    request = EnhancementRequest(**request)
+    with metrics.stage('parse_resume'):
+        parsed_resume = await resume_parser.aparse(request.resume_text)
+    with metrics.stage('parse_jd'):
+        parsed_jd = await jd_parser.aparse(request.job_description)
+    await emit('plan', {'points_total': len(parsed_resume.projects) + len(parsed_resume.experience)})
+    
+    corpus = rag_engine.corpus
+    similar_resumes = await rag_engine.find_similar_resumes(
+        parsed_resume,
+        parsed_jd,
+        corpus=corpus,
+        relax_filters=request.relax_filters
+    )
+    await emit('retrieval', {'index_version': corpus.version, 'relaxed_filters': _relaxed_filters(similar_resumes)})
+    with metrics.stage('gap_analysis'):
+        gaps = await _analyze_gaps(request, parsed_resume, parsed_jd, similar_resumes)
+    
+    with metrics.stage('enhance'):
+        async for event, payload in enhancer.stream_enhancements(
+            parsed_resume,
+            parsed_jd,
+            similar_resumes,
+            gaps,
+            mode=request.enhancement_mode
+        ):
+            # Token deltas are not kept; only finished bullets are stored
+            if event != 'point_delta':
+                await emit(event, payload)
+
+job_manager = JobManager(create_job_store(), run_enhancement_job)
+
+# Counters the services keep themselves, read when /metrics is scraped
+metrics.register_snapshot(
+    'resume_cache_events', 'Content cache lookups and errors by namespace',
+    ['namespace', 'event'],
+    lambda: {
+        (namespace, event): count
+        for namespace, counters in get_cache().stats().items()
+        for event, count in counters.items() if event != 'hit_rate'
+    }
+)
+metrics.register_snapshot(
+    'resume_cache_hit_ratio', 'Content cache hit rate by namespace',
+    ['namespace'],
+    lambda: {(namespace,): counters['hit_rate'] for namespace, counters in get_cache().stats().items()},
+    kind='gauge'
+)
+metrics.register_snapshot(
+    'resume_llm_events', 'LLM gateway retries, 429s, deduplicated, rejected and failed calls',
+    ['event'],
+    lambda: {(event,): count for event, count in enhancer.gateway.counters.items()}
+)
+metrics.register_snapshot(
+    'resume_llm_calls_in_flight', 'LLM calls holding a concurrency slot',
+    [],
+    lambda: {(): enhancer.gateway.calls_in_flight},
+    kind='gauge'
+)
+metrics.register_snapshot(
+    'resume_llm_circuit_open', '1 while the LLM circuit breaker is open or half-open',
+    [],
+    lambda: {(): float(enhancer.gateway.breaker.state != 'closed')},
+    kind='gauge'
+)
+metrics.register_snapshot(
+    'resume_executor_calls', 'CPU-bound steps run inline, on the thread pool or in a worker process',
+    ['where'],
+    lambda: {(where,): count for where, count in executors.counters.items()}
+)
+metrics.register_snapshot(
+    'resume_jobs', 'Background jobs submitted, rejected and finished by this process',
+    ['event'],
+    lambda: {(event,): count for event, count in job_manager.counters.items()}
+)
+metrics.register_snapshot(
+    'resume_jobs_running', 'Background jobs running in this process',
+    [],
+    lambda: {(): job_manager.running},
+    kind='gauge'
+)
 
 @app.on_event("startup")
 async def startup_event():
@@ -35,52 +178,353 @@ async def startup_event():
     logger.info("Initializing RAG engine...")
     await rag_engine.initialize()
     logger.info("RAG engine initialized successfully")
+    rag_engine.start_watcher()
+    await executors.warm_up()
+    job_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the job workers and the corpus watcher, close the LLM gateway's pooled connections and the executor pools"""
+    await job_manager.stop()
+    await rag_engine.stop_watcher()
+    await enhancer.gateway.close()
+    executors.shutdown()
 
 @app.post("/enhance", response_model=EnhancementResponse)
 async def enhance_resume(request: EnhancementRequest):
     """Main endpoint for resume enhancement"""
     try:
         # Parse inputs
-        parsed_resume = resume_parser.parse(request.resume_text)
-        parsed_jd = jd_parser.parse(request.job_description)
+        with metrics.stage('parse_resume'):
+            parsed_resume = await resume_parser.aparse(request.resume_text)
+        with metrics.stage('parse_jd'):
+            parsed_jd = await jd_parser.aparse(request.job_description)
         
-        # Find similar resumes using RAG
+        # Find similar resumes using RAG (embedding and search are timed inside)
+        corpus = rag_engine.corpus
         similar_resumes = await rag_engine.find_similar_resumes(
             parsed_resume, 
-            parsed_jd
+            parsed_jd,
+            corpus=corpus,
+            relax_filters=request.relax_filters
         )
         
         # Analyze gaps
-        gaps = gap_analyzer.analyze(
-            parsed_resume, 
-            parsed_jd, 
-            similar_resumes
-        )
+        with metrics.stage('gap_analysis'):
+            gaps = await _analyze_gaps(request, parsed_resume, parsed_jd, similar_resumes)
         
-        # Enhance resume points
-        enhanced_points = await enhancer.enhance_points(
-            parsed_resume,
-            parsed_jd,
-            similar_resumes,
-            gaps
-        )
-        
-        # Generate recommendations
-        recommendations = await enhancer.generate_recommendations(
-            gaps,
-            similar_resumes,
-            parsed_jd
-        )
+        # Enhance resume points and generate recommendations, per bullet or
+        # in one batched call as the request selects
+        with metrics.stage('enhance'):
+            enhanced_points, recommendations = await enhancer.enhance(
+                parsed_resume,
+                parsed_jd,
+                similar_resumes,
+                gaps,
+                mode=request.enhancement_mode
+            )
         
         return EnhancementResponse(
             enhanced_resume_points=enhanced_points,
-            recommendations=recommendations
+            recommendations=recommendations,
+            index_version=corpus.version,
+            relaxed_filters=_relaxed_filters(similar_resumes)
         )
         
     except Exception as e:
         logger.error(f"Enhancement failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse_event(event: str, data) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/enhance/stream")
+async def enhance_resume_stream(request: EnhancementRequest):
+    """Resume enhancement as server-sent events, emitted as each stage completes.
+    
+    Events: 'parsed' and 'gaps' up front, then 'point_delta' (model tokens)
+    and 'point' (final bullet) per enhanced bullet in completion order,
+    'recommendations', and finally 'done' with the reference index_version
+    used and the relaxed_filters - or 'error' if the request failed.
+    Batched mode sends each 'point' without 'point_delta' events.
+    """
+    async def stream_events():
+        try:
+            with metrics.stage('parse_resume'):
+                parsed_resume = await resume_parser.aparse(request.resume_text)
+            with metrics.stage('parse_jd'):
+                parsed_jd = await jd_parser.aparse(request.job_description)
+            yield _sse_event('parsed', {
+                'projects': len(parsed_resume.projects),
+                'required_skills': parsed_jd.required_skills
+            })
+            
+            corpus = rag_engine.corpus
+            similar_resumes = await rag_engine.find_similar_resumes(
+                parsed_resume,
+                parsed_jd,
+                corpus=corpus,
+                relax_filters=request.relax_filters
+            )
+            with metrics.stage('gap_analysis'):
+                gaps = await _analyze_gaps(request, parsed_resume, parsed_jd, similar_resumes)
+            yield _sse_event('gaps', gaps)
+            
+            with metrics.stage('enhance'):
+                async for event, payload in enhancer.stream_enhancements(
+                    parsed_resume,
+                    parsed_jd,
+                    similar_resumes,
+                    gaps,
+                    mode=request.enhancement_mode
+                ):
+                    yield _sse_event(event, payload)
+            
+            yield _sse_event('done', {
+                'index_version': corpus.version,
+                'relaxed_filters': _relaxed_filters(similar_resumes)
+            })
+        except Exception as e:
+            logger.error(f"Streaming enhancement failed: {str(e)}")
+            yield _sse_event('error', {'detail': str(e)})
+    
+    return StreamingResponse(
+        stream_events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/enhance/batch")
+async def enhance_batch(request: BatchEnhancementRequest):
+    """Enhance many resumes against one job description, streaming NDJSON per candidate"""
+    if len(request.resumes) > BATCH_MAX_RESUMES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BATCH_MAX_RESUMES} resumes per batch"
+        )
+    
+    try:
+        # The JD is parsed once; retrieval is one embedding call and one FAISS search
+        with metrics.stage('parse_jd'):
+            parsed_jd = await jd_parser.aparse(request.job_description)
+        with metrics.stage('parse_resume'):
+            parsed_resumes = await resume_parser.aparse_many(request.resumes)
+        corpus = rag_engine.corpus
+        similar_batch = await rag_engine.find_similar_resumes_batch(
+            parsed_resumes,
+            parsed_jd,
+            corpus=corpus,
+            relax_filters=request.relax_filters
+        )
+        # Gap analysis encodes the JD once and scores all candidates together
+        with metrics.stage('gap_analysis'):
+            gaps_batch = await executors.run_in_thread(
+                gap_analyzer.analyze_batch,
+                parsed_resumes,
+                parsed_jd,
+                similar_batch,
+                inline=len(parsed_resumes) == 1
+            )
+    except Exception as e:
+        logger.error(f"Batch preparation failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    candidate_slots = asyncio.Semaphore(BATCH_CANDIDATES_IN_FLIGHT)
+    
+    async def enhance_candidate(index: int) -> BatchEnhancementResult:
+        async with candidate_slots:
+            try:
+                parsed_resume = parsed_resumes[index]
+                similar_resumes = similar_batch[index]
+                gaps = gaps_batch[index]
+                
+                # LLM calls go through the gateway's global concurrency limit
+                with metrics.stage('enhance'):
+                    enhanced_points, recommendations = await enhancer.enhance(
+                        parsed_resume,
+                        parsed_jd,
+                        similar_resumes,
+                        gaps,
+                        mode=request.enhancement_mode
+                    )
+                return BatchEnhancementResult(
+                    index=index,
+                    enhanced_resume_points=enhanced_points,
+                    recommendations=recommendations,
+                    index_version=corpus.version,
+                    relaxed_filters=_relaxed_filters(similar_resumes)
+                )
+            except Exception as e:
+                logger.error(f"Batch candidate {index} failed: {str(e)}")
+                return BatchEnhancementResult(index=index, error=str(e), index_version=corpus.version)
+    
+    async def stream_results():
+        tasks = [asyncio.create_task(enhance_candidate(i)) for i in range(len(parsed_resumes))]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                yield result.model_dump_json() + "\n"
+        finally:
+            # Client went away or the stream failed: stop the remaining work
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.post("/rank", response_model=RankResponse)
+async def rank_resumes(request: RankRequest):
+    """Shortlist resumes against a job description; no LLM calls"""
+    if len(request.resumes) > RANK_MAX_RESUMES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {RANK_MAX_RESUMES} resumes per request"
+        )
+    
+    try:
+        # CPU-bound; run it off the event loop so other requests keep flowing
+        candidates = await executors.run_in_thread(
+            ranking_engine.rank,
+            request.resumes,
+            request.job_description,
+            request.top_k
+        )
+        return RankResponse(candidates=candidates, total=len(request.resumes))
+    except Exception as e:
+        logger.error(f"Ranking failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _job_info(job: dict, model=JobInfo):
+    """A stored job as the API model; bullets are stored in completion order"""
+    points = sorted(job['points'], key=lambda point: point['index'])
+    return model(
+        **job,
+        points_done=len(points),
+        enhanced_resume_points=points
+    )
+
+@app.post("/jobs", response_model=JobInfo, status_code=202)
+async def submit_job(request: EnhancementRequest):
+    """Queue an enhancement and return its job id without waiting for it"""
+    try:
+        job = await job_manager.submit(request.model_dump())
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(JOB_RETRY_AFTER)})
+    return _job_info(job)
+
+@app.get("/jobs/{job_id}", response_model=JobInfo)
+async def job_status(job_id: str):
+    """Status and progress of a job"""
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return _job_info(job)
+
+@app.get("/jobs/{job_id}/result", response_model=JobResult)
+async def job_result(job_id: str):
+    """Bullets and recommendations of a job, partial while it is still running"""
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return _job_info(job, JobResult)
+
+@app.delete("/jobs/{job_id}", response_model=JobInfo)
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; results finished before that are kept"""
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    if job['status'] in FINISHED_STATES:
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return _job_info(await job_manager.cancel(job_id))
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/llm/usage")
+async def llm_usage():
+    """LLM calls, API-reported token counts, retries and circuit state since startup"""
+    return enhancer.gateway.stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition: stage and LLM latencies, tokens, cache and in-flight gauges"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    body, content_type = metrics.render()
+    # Set as a header: media_type would append a second charset
+    return Response(content=body, headers={'Content-Type': content_type})
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters per cache namespace"""
+    return get_cache().stats()
+
+def _require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints answer only when ADMIN_TOKEN is set and sent as X-Admin-Token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def _reference_info() -> ReferenceIndexInfo:
+    corpus = rag_engine.corpus
+    return ReferenceIndexInfo(
+        index_version=corpus.version,
+        resumes=len(corpus.reference_resumes),
+        vectors=corpus.index.ntotal,
+        dead_vectors=corpus.dead_vectors,
+        rebuilding=rag_engine.rebuilding
+    )
+
+@app.get("/admin/reference", response_model=ReferenceIndexInfo, dependencies=[Depends(_require_admin)])
+async def reference_info():
+    """Version and size of the reference index being served"""
+    return _reference_info()
+
+@app.put("/admin/reference/{filename}", response_model=ReferenceUpdate, dependencies=[Depends(_require_admin)])
+async def put_reference(filename: str, request: ReferenceResumeRequest):
+    """Add or replace a reference resume; returns once queries see it"""
+    try:
+        return await rag_engine.put_reference(filename, request.text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ReadOnlyCorpusError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.delete("/admin/reference/{filename}", response_model=ReferenceUpdate, dependencies=[Depends(_require_admin)])
+async def delete_reference(filename: str):
+    """Remove a reference resume; returns once queries no longer see it"""
+    try:
+        result = await rag_engine.delete_reference(filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ReadOnlyCorpusError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unknown reference file")
+    return result
+
+@app.post("/admin/reference/sync", response_model=ReferenceUpdate, dependencies=[Depends(_require_admin)])
+async def sync_reference():
+    """Apply files added, changed or deleted in the reference directory since the last sync"""
+    try:
+        return await rag_engine.sync()
+    except ReadOnlyCorpusError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post(
+    "/admin/reference/rebuild",
+    response_model=ReferenceIndexInfo,
+    status_code=202,
+    dependencies=[Depends(_require_admin)]
+)
+async def rebuild_reference():
+    """Rebuild and compact the whole index in the background; the current version serves meanwhile"""
+    try:
+        rag_engine.start_rebuild()
+    except ReadOnlyCorpusError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _reference_info()
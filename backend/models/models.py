@@ -1,17 +1,89 @@
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Literal, Optional
+
+# per_bullet: one LLM call per bullet; batched: one JSON call for all bullets
+# and the recommendations, retrying unparsable bullets one by one
+EnhancementMode = Literal["per_bullet", "batched"]
+
+# Resume sections whose bullets are enhanced
+BulletSection = Literal["projects", "experience"]
 
 class ResumePoint(BaseModel):
     original_point: str
     enhanced_point: str
+    section: BulletSection = "projects"
+    # False when the bullet was left as is: outside the request's token or
+    # latency budget, or its LLM call failed
+    enhanced: bool = True
 
 class EnhancementRequest(BaseModel):
     resume_text: str
     job_description: str
+    enhancement_mode: EnhancementMode = "per_bullet"
+    # Drop profile filters (seniority, then role family) when too few
+    # reference resumes match them, rather than retrieving fewer
+    relax_filters: bool = False
 
 class EnhancementResponse(BaseModel):
     enhanced_resume_points: List[ResumePoint]
     recommendations: List[str]
+    # Version of the reference index the similar resumes came from
+    index_version: Optional[int] = None
+    # Profile filters dropped to retrieve enough similar resumes
+    relaxed_filters: List[str] = []
+
+class BatchEnhancementRequest(BaseModel):
+    resumes: List[str]
+    job_description: str
+    enhancement_mode: EnhancementMode = "per_bullet"
+    relax_filters: bool = False
+
+class BatchEnhancementResult(BaseModel):
+    """One NDJSON line of /enhance/batch; index refers to the position in the request"""
+    index: int
+    enhanced_resume_points: List[ResumePoint] = []
+    recommendations: List[str] = []
+    error: Optional[str] = None
+    index_version: Optional[int] = None
+    relaxed_filters: List[str] = []
+
+JobState = Literal["queued", "running", "succeeded", "failed", "cancelled"]
+
+class JobInfo(BaseModel):
+    """A background enhancement; points_done counts the bullets finished so far"""
+    job_id: str
+    status: JobState
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    points_done: int = 0
+    points_total: Optional[int] = None
+    error: Optional[str] = None
+    # Reference index version used, once the job has retrieved similar resumes
+    index_version: Optional[int] = None
+    relaxed_filters: List[str] = []
+
+class JobResult(JobInfo):
+    """Results of a job so far: finished bullets in resume order, the rest still missing"""
+    enhanced_resume_points: List[ResumePoint] = []
+    recommendations: List[str] = []
+
+class RankRequest(BaseModel):
+    resumes: List[str]
+    job_description: str
+    top_k: int = 10
+
+class RankedCandidate(BaseModel):
+    """index refers to the position in the request; component scores are 0-100"""
+    index: int
+    score: float
+    skill_match: float
+    keyword_coverage: float
+    similarity: float
+
+class RankResponse(BaseModel):
+    candidates: List[RankedCandidate]
+    total: int
 
 class ParsedResume(BaseModel):
     projects: List[Dict[str, str]]
@@ -23,4 +95,26 @@ class ParsedJobDescription(BaseModel):
     required_skills: List[str]
     preferred_skills: List[str]
     responsibilities: List[str]
-    keywords: List[str]
\ No newline at end of file
+    keywords: List[str]
+    # role_family, seniority and domain; see app.utils.profiles
+    profile: Dict[str, str] = {}
+
+class ReferenceResumeRequest(BaseModel):
+    text: str
+
+class ReferenceUpdate(BaseModel):
+    """Reference files applied by one sync and the index version serving them"""
+    index_version: int
+    added: List[str] = []
+    updated: List[str] = []
+    removed: List[str] = []
+    # True when the index was rebuilt rather than updated in place
+    rebuilt: bool = False
+
+class ReferenceIndexInfo(BaseModel):
+    index_version: int
+    resumes: int
+    vectors: int
+    # Embedding rows of removed chunks, reclaimed by the next rebuild
+    dead_vectors: int
+    rebuilding: bool
@@ -1,7 +1,40 @@
-from typing import List, Dict, Set
+import os
+from typing import List, Dict, Optional, Sequence
+from functools import lru_cache
+import numpy as np
 from app.models import ParsedResume, ParsedJobDescription
+from app.services.cache import ContentCache
+from app.utils.keywords import get_tech_keyword_matcher, normalize_keyword
+from app.utils.text_processing import YEARS_PATTERN
+from app.utils.vocabulary import SkillVocabulary, VocabularyOverlay, get_skill_vocabulary
+
+# Reference skill lines whose word ids are memoized
+LINE_CACHE_SIZE = 65536
+# Bump when resume term extraction changes so cached term sets are not reused
+RESUME_TERMS_VERSION = "resume-terms-1"
+# Resume term sets are cached in process only: extracting one (~0.1ms) costs
+# less than a Redis round-trip, which would also block the event loop when
+# small analyses run inline
+RESUME_TERMS_CACHE_ITEMS = int(os.getenv("ANALYZER_TERMS_CACHE_ITEMS", "4096"))
 
 class GapAnalyzer:
+    """Skill and keyword gaps, computed on integer term ids with NumPy.
+    
+    Skills, JD keywords and reference resume words are mapped to ids in a
+    shared SkillVocabulary. The JD is encoded once per call and every resume
+    becomes a row of a boolean matrix over the JD's terms, so match and
+    coverage figures for thousands of resumes are a few array reductions.
+    Word ids of reference resume lines are computed once and reused, and
+    each resume's keyword set is cached in process by content hash, so
+    scoring it against another JD costs only id lookups.
+    """
+    
+    def __init__(self, vocabulary: Optional[SkillVocabulary] = None, cache: Optional[ContentCache] = None):
+        self.vocabulary = vocabulary or get_skill_vocabulary()
+        self.keyword_matcher = get_tech_keyword_matcher()
+        self.cache = cache or ContentCache(redis_url="", max_items=RESUME_TERMS_CACHE_ITEMS)
+        self._line_word_ids = lru_cache(maxsize=LINE_CACHE_SIZE)(self._encode_skill_line)
+    
     def analyze(
         self,
         parsed_resume: ParsedResume,
@@ -9,92 +42,197 @@ class GapAnalyzer:
         similar_resumes: List[Dict]
     ) -> Dict:
         """Analyze gaps between resume and job description"""
+        return self.analyze_batch([parsed_resume], parsed_jd, [similar_resumes])[0]
+    
+    def analyze_batch(
+        self,
+        parsed_resumes: Sequence[ParsedResume],
+        parsed_jd: ParsedJobDescription,
+        similar_batch: Sequence[List[Dict]]
+    ) -> List[Dict]:
+        """Analyze gaps of many resumes against one job description"""
         
-        current_skills = set(skill.lower() for skill in parsed_resume.skills)
-        required_skills = set(skill.lower() for skill in parsed_jd.required_skills)
-        preferred_skills = set(skill.lower() for skill in parsed_jd.preferred_skills)
+        # Skills from similar successful resumes; shared ids, so encode before the overlay
+        common_ids = [self._extract_common_skills_from_similar(similar) for similar in similar_batch]
         
-        # Skills from similar successful resumes
-        common_skills = self._extract_common_skills_from_similar(similar_resumes)
+        overlay = self.vocabulary.overlay()
+        required_ids = self._encode_skills(overlay, parsed_jd.required_skills)
+        preferred_ids = self._encode_skills(overlay, parsed_jd.preferred_skills)
+        keyword_ids = overlay.encode(normalize_keyword(keyword) for keyword in parsed_jd.keywords)
+        all_common_ids = np.unique(np.concatenate(common_ids)) if common_ids else np.empty(0, dtype=np.int64)
+        
+        resume_skills, skill_ids, term_ids = self._encode_resumes(
+            overlay,
+            parsed_resumes,
+            np.concatenate([required_ids, preferred_ids, all_common_ids]),
+            keyword_ids
+        )
+        
+        has_skill = self._membership(skill_ids, np.concatenate([required_ids, preferred_ids]), overlay.size)
+        has_keyword = self._membership(term_ids, keyword_ids, overlay.size)
+        required_hits = has_skill[:, :len(required_ids)]
+        preferred_hits = has_skill[:, len(required_ids):]
+        
+        # One matrix over every common skill of the batch, then each row picks its own columns
+        has_common = self._membership(skill_ids, all_common_ids, overlay.size)
+        
+        match_percentages = self._calculate_match_percentage(required_hits, preferred_hits)
+        
+        # Names decoded once; each row only masks them
+        required_names = np.array(overlay.decode(required_ids), dtype=object)
+        preferred_names = np.array(overlay.decode(preferred_ids), dtype=object)
+        common_names = np.array(overlay.decode(all_common_ids), dtype=object)
+        
+        gaps_batch = []
+        for row, skills in enumerate(resume_skills):
+            common_columns = np.searchsorted(all_common_ids, common_ids[row])
+            gaps_batch.append({
+                'missing_skills': required_names[~required_hits[row]].tolist(),
+                'missing_preferred': preferred_names[~preferred_hits[row]].tolist(),
+                'missing_from_similar': common_names[common_columns[~has_common[row, common_columns]]].tolist(),
+                'current_skills': skills,
+                'match_percentage': float(match_percentages[row]),
+                'keyword_coverage': self._calculate_keyword_coverage(
+                    has_keyword[row],
+                    parsed_jd.keywords
+                )
+            })
+        
+        return gaps_batch
+    
+    def score_batch(
+        self,
+        parsed_resumes: Sequence[ParsedResume],
+        parsed_jd: ParsedJobDescription
+    ) -> Dict[str, np.ndarray]:
+        """Match and keyword coverage percentages per resume, without the gap lists"""
+        overlay = self.vocabulary.overlay()
+        required_ids = self._encode_skills(overlay, parsed_jd.required_skills)
+        preferred_ids = self._encode_skills(overlay, parsed_jd.preferred_skills)
+        skill_columns = np.concatenate([required_ids, preferred_ids])
+        keyword_ids = overlay.encode(normalize_keyword(keyword) for keyword in parsed_jd.keywords)
         
-        gaps = {
-            'missing_skills': list(required_skills - current_skills),
-            'missing_preferred': list(preferred_skills - current_skills),
-            'missing_from_similar': list(common_skills - current_skills),
-            'current_skills': list(current_skills),
+        _, skill_ids, term_ids = self._encode_resumes(overlay, parsed_resumes, skill_columns, keyword_ids)
+        has_skill = self._membership(skill_ids, skill_columns, overlay.size)
+        has_keyword = self._membership(term_ids, keyword_ids, overlay.size)
+        
+        return {
             'match_percentage': self._calculate_match_percentage(
-                current_skills, 
-                required_skills, 
-                preferred_skills
+                has_skill[:, :len(required_ids)],
+                has_skill[:, len(required_ids):]
             ),
-            'keyword_coverage': self._calculate_keyword_coverage(
-                parsed_resume,
-                parsed_jd.keywords
+            'keyword_coverage': (
+                has_keyword.mean(axis=1) * 100
+                if len(keyword_ids) else np.zeros(len(parsed_resumes))
             )
         }
+    
+    def _encode_resumes(
+        self,
+        overlay: VocabularyOverlay,
+        parsed_resumes: Sequence[ParsedResume],
+        skill_columns: np.ndarray,
+        keyword_ids: np.ndarray
+    ):
+        """Per resume: normalized skills, ids of skills in skill_columns, ids of keywords found"""
+        # Resume terms only matter where they hit a JD or common term, so
+        # intersect as sets first and encode just those
+        jd_skills = set(overlay.decode(skill_columns))
+        jd_keywords = set(overlay.decode(keyword_ids))
+        resume_skills = [
+            list(dict.fromkeys(normalize_keyword(skill) for skill in resume.skills))
+            for resume in parsed_resumes
+        ]
+        skill_ids = [overlay.lookup(jd_skills.intersection(skills)) for skills in resume_skills]
+        term_ids = [
+            overlay.lookup(jd_keywords.intersection(self._resume_terms(self._get_resume_text(resume))))
+            for resume in parsed_resumes
+        ]
+        return resume_skills, skill_ids, term_ids
+    
+    def _encode_skills(self, overlay: VocabularyOverlay, skills: List[str]) -> np.ndarray:
+        """Distinct skill ids in first-seen order"""
+        return overlay.encode(dict.fromkeys(normalize_keyword(skill) for skill in skills))
+    
+    def _membership(self, rows: List[np.ndarray], columns: np.ndarray, size: int) -> np.ndarray:
+        """Boolean matrix: does row i contain the term of column j"""
+        # Map every id to its JD column (or -1) once, then scatter all rows together
+        column_of = np.full(size, -1, dtype=np.int64)
+        column_of[columns[::-1]] = np.arange(len(columns))[::-1]
         
-        return gaps
+        lengths = [len(ids) for ids in rows]
+        ids = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        row_of = np.repeat(np.arange(len(rows)), lengths)
+        cols = column_of[ids]
+        hit = cols >= 0
+        
+        matrix = np.zeros((len(rows), len(columns)), dtype=bool)
+        matrix[row_of[hit], cols[hit]] = True
+        # Duplicate columns (repeated JD keywords) share the first column's answer
+        return matrix[:, column_of[columns]]
+    
+    def _resume_terms(self, resume_text: str) -> frozenset:
+        """JD-keyword-shaped terms of a resume: tech keywords and 'N+ years' (cached)"""
+        return self.cache.get_or_compute(
+            'resume_terms',
+            f"{RESUME_TERMS_VERSION}:{self.keyword_matcher.digest}",
+            (resume_text,),
+            lambda: frozenset(self.keyword_matcher.find_set(resume_text)).union(
+                f"{years}+ years" for years in YEARS_PATTERN.findall(resume_text.lower())
+            )
+        )
+    
+    def _encode_skill_line(self, skill_line: str) -> np.ndarray:
+        # Simple skill extraction - can be improved
+        words = [word for word in skill_line.lower().split() if len(word) > 3]
+        return self.vocabulary.encode(words)
     
     def _extract_common_skills_from_similar(
-        self, 
+        self,
         similar_resumes: List[Dict]
-    ) -> Set[str]:
-        """Extract skills that appear in multiple similar resumes"""
-        skill_counts = {}
-        
-        for resume_data in similar_resumes:
-            sections = resume_data.get('relevant_sections', {})
-            skills = sections.get('matching_skills', [])
-            
-            for skill_line in skills:
-                # Simple skill extraction - can be improved
-                words = skill_line.lower().split()
-                for word in words:
-                    if len(word) > 3:
-                        skill_counts[word] = skill_counts.get(word, 0) + 1
+    ) -> np.ndarray:
+        """Ids of skills that appear in multiple similar resumes"""
+        line_ids = [
+            self._line_word_ids(skill_line)
+            for resume_data in similar_resumes
+            for skill_line in resume_data.get('relevant_sections', {}).get('matching_skills', [])
+        ]
+        if not line_ids:
+            return np.empty(0, dtype=np.int64)
         
         # Return skills that appear in at least 2 resumes
-        return {
-            skill for skill, count in skill_counts.items() 
-            if count >= 2
-        }
+        skill_counts = np.bincount(np.concatenate(line_ids), minlength=len(self.vocabulary))
+        return np.flatnonzero(skill_counts >= 2)
     
     def _calculate_match_percentage(
         self,
-        current_skills: Set[str],
-        required_skills: Set[str],
-        preferred_skills: Set[str]
-    ) -> float:
-        """Calculate overall match percentage"""
-        if not required_skills:
-            return 100.0
+        required_hits: np.ndarray,
+        preferred_hits: np.ndarray
+    ) -> np.ndarray:
+        """Calculate overall match percentage per resume row"""
+        if not required_hits.shape[1]:
+            return np.full(len(required_hits), 100.0)
         
-        required_match = len(current_skills & required_skills) / len(required_skills)
-        preferred_match = len(current_skills & preferred_skills) / len(preferred_skills) if preferred_skills else 0
+        required_match = required_hits.mean(axis=1)
+        preferred_match = preferred_hits.mean(axis=1) if preferred_hits.shape[1] else 0
         
         # Weight: 70% required, 30% preferred
-        return round((required_match * 0.7 + preferred_match * 0.3) * 100, 1)
+        return np.round((required_match * 0.7 + preferred_match * 0.3) * 100, 1)
     
     def _calculate_keyword_coverage(
         self,
-        parsed_resume: ParsedResume,
+        found: np.ndarray,
         jd_keywords: List[str]
     ) -> Dict[str, int]:
         """Calculate how many JD keywords appear in resume"""
-        resume_text = self._get_resume_text(parsed_resume).lower()
+        found_keywords = int(found.sum())
         
         coverage = {
             'total_keywords': len(jd_keywords),
-            'found_keywords': 0,
-            'missing_keywords': []
+            'found_keywords': found_keywords,
+            'missing_keywords': [keyword for keyword, hit in zip(jd_keywords, found) if not hit]
         }
         
-        for keyword in jd_keywords:
-            if keyword.lower() in resume_text:
-                coverage['found_keywords'] += 1
-            else:
-                coverage['missing_keywords'].append(keyword)
-        
         coverage['coverage_percentage'] = round(
             (coverage['found_keywords'] / coverage['total_keywords']) * 100
             if coverage['total_keywords'] > 0 else 0
@@ -115,4 +253,4 @@ class GapAnalyzer:
         # Add experience
         texts.extend([e['description'] for e in parsed_resume.experience])
         
-        return ' '.join(texts)
\ No newline at end of file
+        return ' '.join(texts)
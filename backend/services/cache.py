@@ -0,0 +1,352 @@
+import asyncio
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Empty REDIS_URL keeps the cache process-local
+REDIS_URL = os.getenv("REDIS_URL", "")
+CACHE_LOCAL_MAX_ITEMS = int(os.getenv("CACHE_LOCAL_MAX_ITEMS", "4096"))
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "86400"))
+# Redis calls sit on the request path, so they must fail fast
+REDIS_TIMEOUT_SECONDS = float(os.getenv("CACHE_REDIS_TIMEOUT", "0.05"))
+# After a Redis error, serve from the local tier only for this long
+REDIS_RETRY_SECONDS = float(os.getenv("CACHE_REDIS_RETRY", "30"))
+
+_MISSING = object()
+
+class LRUCache:
+    """Thread-safe in-process LRU with a maximum item count and per-entry expiry"""
+
+    def __init__(self, max_items: int = CACHE_LOCAL_MAX_ITEMS):
+        self.max_items = max_items
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class ContentCache:
+    """Two-tier cache keyed by content hashes: in-process LRU in front of Redis.
+
+    Keys are ``namespace:sha256(version, *parts)``, where the version names
+    everything besides the inputs that shapes the result (parser revision,
+    embedder signature, model and prompt revision), so changing any of them
+    simply misses. Values must be picklable and are shared between callers
+    on a local hit, so treat them as immutable.
+
+    The ``a``-prefixed methods are for coroutines: local hits are answered
+    inline and Redis round-trips run in a thread, so a slow or unreachable
+    Redis never blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = REDIS_URL,
+        max_items: int = CACHE_LOCAL_MAX_ITEMS,
+        default_ttl: float = CACHE_TTL_SECONDS,
+        redis_client=None
+    ):
+        self.local = LRUCache(max_items)
+        self.default_ttl = default_ttl
+        self.redis = redis_client
+        if self.redis is None and redis_url:
+            import redis
+            self.redis = redis.Redis.from_url(
+                redis_url,
+                socket_timeout=REDIS_TIMEOUT_SECONDS,
+                socket_connect_timeout=REDIS_TIMEOUT_SECONDS
+            )
+        self._redis_down_until = 0.0
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(namespace: str, version: str, parts: Iterable[str]) -> str:
+        digest = hashlib.sha256(version.encode('utf-8'))
+        for part in parts:
+            data = part.encode('utf-8')
+            # Length-prefix each part so ('ab', 'c') and ('a', 'bc') differ
+            digest.update(len(data).to_bytes(8, 'little'))
+            digest.update(data)
+        return f"{namespace}:{digest.hexdigest()}"
+
+    def _count(self, namespace: str, event: str, n: int = 1):
+        with self._stats_lock:
+            counters = self._stats.setdefault(
+                namespace,
+                {'local_hits': 0, 'redis_hits': 0, 'misses': 0, 'redis_errors': 0}
+            )
+            counters[event] += n
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, namespace: str, error: Exception):
+        self._count(namespace, 'redis_errors')
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+        logger.warning(f"Redis cache unavailable, using local tier for {REDIS_RETRY_SECONDS}s: {error!r}")
+
+    def _loads(self, namespace: str, key: str, payload: bytes) -> Any:
+        """Unpickled Redis value, or _MISSING if it no longer loads, e.g. pickled by older models"""
+        try:
+            return pickle.loads(payload)
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {key}: {e!r}")
+        try:
+            # Recomputed by the caller and stored again
+            self.redis.delete(key)
+        except Exception as e:
+            self._redis_failed(namespace, e)
+        return _MISSING
+
+    def get(self, namespace: str, key: str) -> Tuple[bool, Any]:
+        found, value = self._get_local(namespace, key)
+        if found:
+            return True, value
+        return self._get_redis(namespace, key)
+
+    async def aget(self, namespace: str, key: str) -> Tuple[bool, Any]:
+        found, value = self._get_local(namespace, key)
+        if found:
+            return True, value
+        if not self._redis_available():
+            self._count(namespace, 'misses')
+            return False, None
+        return await asyncio.to_thread(self._get_redis, namespace, key)
+
+    def _get_local(self, namespace: str, key: str) -> Tuple[bool, Any]:
+        value = self.local.get(key)
+        if value is _MISSING:
+            return False, None
+        self._count(namespace, 'local_hits')
+        return True, value
+
+    def _get_redis(self, namespace: str, key: str) -> Tuple[bool, Any]:
+        """Redis lookup after a local miss, filling the local tier; counts the miss otherwise"""
+        if self._redis_available():
+            try:
+                # One round-trip for the value and its remaining lifetime
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.get(key)
+                pipe.ttl(key)
+                payload, ttl = pipe.execute()
+            except Exception as e:
+                self._redis_failed(namespace, e)
+            else:
+                value = _MISSING if payload is None else self._loads(namespace, key, payload)
+                if value is not _MISSING:
+                    self.local.set(key, value, ttl if ttl and ttl > 0 else self.default_ttl)
+                    self._count(namespace, 'redis_hits')
+                    return True, value
+
+        self._count(namespace, 'misses')
+        return False, None
+
+    def get_many(self, namespace: str, keys: Sequence[str]) -> List[Tuple[bool, Any]]:
+        """get() for many keys: local lookups, then one Redis round-trip for the rest"""
+        results, pending = self._get_many_local(namespace, keys)
+        return self._get_many_redis(namespace, keys, results, pending)
+
+    async def aget_many(self, namespace: str, keys: Sequence[str]) -> List[Tuple[bool, Any]]:
+        results, pending = self._get_many_local(namespace, keys)
+        if not (pending and self._redis_available()):
+            self._count(namespace, 'misses', len(pending))
+            return results
+        return await asyncio.to_thread(self._get_many_redis, namespace, keys, results, pending)
+
+    def _get_many_local(self, namespace: str, keys: Sequence[str]) -> Tuple[List[Tuple[bool, Any]], List[int]]:
+        """Results of the local lookups and the positions still to look up"""
+        results = [(False, None)] * len(keys)
+        pending = []
+        for position, key in enumerate(keys):
+            value = self.local.get(key)
+            if value is _MISSING:
+                pending.append(position)
+            else:
+                results[position] = (True, value)
+        self._count(namespace, 'local_hits', len(keys) - len(pending))
+        return results, pending
+
+    def _get_many_redis(
+        self,
+        namespace: str,
+        keys: Sequence[str],
+        results: List[Tuple[bool, Any]],
+        pending: List[int]
+    ) -> List[Tuple[bool, Any]]:
+        if pending and self._redis_available():
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for position in pending:
+                    pipe.get(keys[position])
+                    pipe.ttl(keys[position])
+                replies = pipe.execute()
+            except Exception as e:
+                self._redis_failed(namespace, e)
+            else:
+                still_pending = []
+                for position, payload, ttl in zip(pending, replies[::2], replies[1::2]):
+                    value = _MISSING if payload is None else self._loads(namespace, keys[position], payload)
+                    if value is _MISSING:
+                        still_pending.append(position)
+                        continue
+                    self.local.set(keys[position], value, ttl if ttl and ttl > 0 else self.default_ttl)
+                    results[position] = (True, value)
+                self._count(namespace, 'redis_hits', len(pending) - len(still_pending))
+                pending = still_pending
+
+        self._count(namespace, 'misses', len(pending))
+        return results
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        self.set_many(namespace, [(key, value)], ttl)
+
+    async def aset(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        await self.aset_many(namespace, [(key, value)], ttl)
+
+    def set_many(self, namespace: str, items: Sequence[Tuple[str, Any]], ttl: Optional[float] = None):
+        """set() for many (key, value) pairs in one Redis round-trip"""
+        ttl = ttl or self.default_ttl
+        for key, value in items:
+            self.local.set(key, value, ttl)
+        self._set_many_redis(namespace, items, ttl)
+
+    async def aset_many(self, namespace: str, items: Sequence[Tuple[str, Any]], ttl: Optional[float] = None):
+        ttl = ttl or self.default_ttl
+        for key, value in items:
+            self.local.set(key, value, ttl)
+        if items and self._redis_available():
+            await asyncio.to_thread(self._set_many_redis, namespace, items, ttl)
+
+    def _set_many_redis(self, namespace: str, items: Sequence[Tuple[str, Any]], ttl: float):
+        if items and self._redis_available():
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for key, value in items:
+                    pipe.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=int(ttl))
+                pipe.execute()
+            except Exception as e:
+                self._redis_failed(namespace, e)
+
+    def get_or_compute(
+        self,
+        namespace: str,
+        version: str,
+        parts: Iterable[str],
+        compute: Callable[[], Any],
+        ttl: Optional[float] = None
+    ) -> Any:
+        key = self.make_key(namespace, version, parts)
+        found, value = self.get(namespace, key)
+        if found:
+            return value
+
+        value = compute()
+        self.set(namespace, key, value, ttl)
+        return value
+
+    def get_or_compute_many(
+        self,
+        namespace: str,
+        version: str,
+        parts_list: Sequence[Iterable[str]],
+        compute_many: Callable[[List[int]], Sequence[Any]],
+        ttl: Optional[float] = None
+    ) -> List[Any]:
+        """get_or_compute for a batch; compute_many gets the positions of all misses at once"""
+        keys = [self.make_key(namespace, version, parts) for parts in parts_list]
+        results = self.get_many(namespace, keys)
+        values = [value for _, value in results]
+
+        missing = [position for position, (found, _) in enumerate(results) if not found]
+        if missing:
+            computed = compute_many(missing)
+            for position, value in zip(missing, computed):
+                values[position] = value
+            self.set_many(namespace, [(keys[position], values[position]) for position in missing], ttl)
+        return values
+
+    async def aget_or_compute(
+        self,
+        namespace: str,
+        version: str,
+        parts: Iterable[str],
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None
+    ) -> Any:
+        """get_or_compute for coroutine producers; failures are not cached"""
+        key = self.make_key(namespace, version, parts)
+        found, value = await self.aget(namespace, key)
+        if found:
+            return value
+
+        value = await compute()
+        await self.aset(namespace, key, value, ttl)
+        return value
+
+    async def aget_or_compute_many(
+        self,
+        namespace: str,
+        version: str,
+        parts_list: Sequence[Iterable[str]],
+        compute_many: Callable[[List[int]], Awaitable[Sequence[Any]]],
+        ttl: Optional[float] = None
+    ) -> List[Any]:
+        """get_or_compute_many for a coroutine producer"""
+        keys = [self.make_key(namespace, version, parts) for parts in parts_list]
+        results = await self.aget_many(namespace, keys)
+        values = [value for _, value in results]
+
+        missing = [position for position, (found, _) in enumerate(results) if not found]
+        if missing:
+            computed = await compute_many(missing)
+            for position, value in zip(missing, computed):
+                values[position] = value
+            await self.aset_many(namespace, [(keys[position], values[position]) for position in missing], ttl)
+        return values
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-namespace hit/miss counters with the overall hit rate"""
+        with self._stats_lock:
+            snapshot = {namespace: dict(counters) for namespace, counters in self._stats.items()}
+
+        for counters in snapshot.values():
+            hits = counters['local_hits'] + counters['redis_hits']
+            lookups = hits + counters['misses']
+            counters['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        return snapshot
+
+_cache: Optional[ContentCache] = None
+
+def get_cache() -> ContentCache:
+    """Process-wide cache configured from the environment"""
+    global _cache
+    if _cache is None:
+        _cache = ContentCache()
+    return _cache
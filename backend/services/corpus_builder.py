@@ -0,0 +1,43 @@
+"""Build the reference corpus once and publish it for workers in shared mode.
+
+    python -m app.services.corpus_builder [--watch SECONDS]
+
+Loads or builds the corpus from RESUME_DIR as a local-mode server does
+(re-embedding only changed files, via the IndexStore) and publishes it to
+the SharedCorpusStore, where workers started with RAG_CORPUS_MODE=shared
+map it. Run it before starting the workers; with --watch it keeps
+rescanning RESUME_DIR and publishes every new version, which workers pick
+up when RAG_WATCH_INTERVAL is set.
+"""
+import argparse
+import asyncio
+import logging
+
+from app.services.rag_engine import RAGEngine
+
+logger = logging.getLogger(__name__)
+
+async def run(watch: float):
+    engine = RAGEngine(read_only=False)
+    try:
+        await engine.initialize()
+        while True:
+            build = await engine.publish()
+            if build is not None:
+                logger.info(f"Published shared reference build {build}")
+            if watch <= 0:
+                return
+            await asyncio.sleep(watch)
+            await engine.sync()
+    finally:
+        engine.executors.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--watch", type=float, default=0, help="seconds between rescans; 0 publishes once and exits")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args.watch))
+
+if __name__ == "__main__":
+    main()
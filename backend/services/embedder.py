@@ -0,0 +1,146 @@
+import os
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import List
+import numpy as np
+from app.utils.text_processing import tokenize
+
+EMBEDDING_DIMENSION = 384
+
+# Very common words carry no signal for matching resumes to roles
+STOPWORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+    'into', 'is', 'of', 'on', 'or', 'the', 'to', 'using', 'with', 'we', 'our'
+})
+
+class Embedder(ABC):
+    """Turns a batch of texts into L2-normalised float32 vectors"""
+    dimension: int = EMBEDDING_DIMENSION
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed all texts in one call, returning a (len(texts), dimension) matrix"""
+
+    @property
+    @abstractmethod
+    def signature(self) -> str:
+        """Identifies the vector space; stored vectors are reusable only under the same signature"""
+
+
+# Features whose hash codes are kept per dimension before the table is reset
+FEATURE_CACHE_SIZE = 200_000
+
+class _FeatureCodes(dict):
+    """feature -> stable signed bucket code, +(bucket + 1) or -(bucket + 1).
+
+    crc32, unlike hash(), is not salted per process. Packing bucket and sign
+    into one int lets a whole batch be scattered with a single bincount, and
+    as a dict with __missing__, lookups of known features never leave C.
+    """
+
+    def __init__(self, dimension: int):
+        super().__init__()
+        self.dimension = dimension
+
+    def __missing__(self, feature: str) -> int:
+        if len(self) >= FEATURE_CACHE_SIZE:
+            self.clear()
+        h = zlib.crc32(feature.encode('utf-8'))
+        code = h % self.dimension + 1
+        code = self[feature] = code if (h >> 31) & 1 else -code
+        return code
+
+@lru_cache(maxsize=None)
+def _feature_codes(dimension: int) -> _FeatureCodes:
+    return _FeatureCodes(dimension)
+
+
+class HashingEmbedder(Embedder):
+    """Signed feature-hashing of unigrams and bigrams with sublinear TF weighting.
+
+    Needs no model files, no fitting step and no network, and the same text
+    always maps to the same vector.
+    """
+
+    def __init__(self, dimension: int = EMBEDDING_DIMENSION, use_bigrams: bool = True):
+        self.dimension = dimension
+        self.use_bigrams = use_bigrams
+
+    @property
+    def signature(self) -> str:
+        return f"hashing-v1:{self.dimension}:{int(self.use_bigrams)}"
+
+    def _features(self, text: str) -> List[str]:
+        tokens = [t for t in tokenize(text) if t not in STOPWORDS]
+        if self.use_bigrams:
+            return tokens + list(map(' '.join, zip(tokens, tokens[1:])))
+        return tokens
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        feature_codes = _feature_codes(self.dimension)
+        codes, lengths = [], []
+        for text in texts:
+            features = self._features(text)
+            # map() keeps the per-feature hash lookup out of the interpreter loop
+            codes.extend(map(feature_codes.__getitem__, features))
+            lengths.append(len(features))
+
+        # Scatter every feature of every text into the matrix in one call
+        codes = np.array(codes, dtype=np.int64)
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        cells = rows * self.dimension + np.abs(codes) - 1
+        matrix = np.bincount(
+            cells,
+            weights=np.sign(codes).astype(np.float64),
+            minlength=len(texts) * self.dimension
+        ).reshape(len(texts), self.dimension).astype(np.float32)
+
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """Small sentence-embedding model loaded from a local directory"""
+
+    def __init__(self, model_path: str, batch_size: int = 64):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDER_BACKEND=sentence-transformers requires the "
+                "sentence-transformers package"
+            ) from e
+
+        self.model = SentenceTransformer(model_path, device='cpu')
+        self.model_path = model_path
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+
+    @property
+    def signature(self) -> str:
+        return f"sentence-transformers:{os.path.basename(self.model_path)}:{self.dimension}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        ).astype(np.float32)
+
+
+def create_embedder() -> Embedder:
+    """Build the embedder selected by EMBEDDER_BACKEND (default: hashing)"""
+    backend = os.getenv("EMBEDDER_BACKEND", "hashing")
+
+    if backend == "hashing":
+        return HashingEmbedder(int(os.getenv("EMBEDDING_DIMENSION", EMBEDDING_DIMENSION)))
+    if backend == "sentence-transformers":
+        return SentenceTransformerEmbedder(
+            os.getenv("EMBEDDING_MODEL_PATH", "app/data/models/all-MiniLM-L6-v2")
+        )
+
+    raise ValueError(f"Unknown EMBEDDER_BACKEND: {backend}")
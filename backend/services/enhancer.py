@@ -1,11 +1,121 @@
-from typing import List, Dict
-from anthropic import Anthropic
+import asyncio
+import logging
+import textwrap
+from typing import AsyncIterator, Awaitable, List, Dict, Optional, Tuple
 import os
-from app.models import ParsedResume, ParsedJobDescription, ResumePoint
+from app.models import EnhancementMode, ParsedResume, ParsedJobDescription, ResumePoint
+from app.services.cache import ContentCache, get_cache
+from app.services.llm_gateway import LLMGateway, LLMUnavailableError, get_llm_gateway
+from app.services.prompts import BulletPrompt, PromptBuilder, parse_batch_response
+from app.services.scheduler import BULLET_MAX_TOKENS, BulletScheduler
+
+logger = logging.getLogger(__name__)
+
+MODEL = os.getenv("ANTHROPIC_MODEL", "claude-3-sonnet-20240229")
+# Bump when prompt templates change so cached completions are not reused
+PROMPT_VERSION = "prompts-3"
+# Send one bullet before the rest when the shared prefix is cacheable, so the
+# others read the prefix from the API cache instead of each writing it.
+# Cheaper, but /enhance waits for that first call before fanning out.
+PREFIX_WARMUP = os.getenv("ENHANCER_PREFIX_WARMUP", "1") == "1"
 
 class ResumeEnhancer:
-    def __init__(self):
-        self.anthropic = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    def __init__(
+        self,
+        cache: Optional[ContentCache] = None,
+        prompt_builder: Optional[PromptBuilder] = None,
+        scheduler: Optional[BulletScheduler] = None,
+        gateway: Optional[LLMGateway] = None
+    ):
+        # Concurrency, timeouts, retries and rate limits live in the gateway
+        self.gateway = gateway or get_llm_gateway()
+        self.cache = cache or get_cache()
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.scheduler = scheduler or BulletScheduler()
+    
+    def _request_args(self, prompt: str, max_tokens: int, system: Optional[List[Dict]]) -> Dict:
+        args = {
+            'model': MODEL,
+            'max_tokens': max_tokens,
+            'messages': [{"role": "user", "content": prompt}]
+        }
+        if system:
+            args['system'] = system
+        return args
+    
+    def _completion_parts(self, prompt: str, system: Optional[List[Dict]]) -> Tuple[str, str]:
+        return '\n\n'.join(block['text'] for block in system or []), prompt
+    
+    async def _cached_complete(
+        self,
+        namespace: str,
+        prompt: str,
+        max_tokens: int,
+        system: Optional[List[Dict]] = None
+    ) -> str:
+        """_complete, reusing the answer for an identical prompt, model and prompt version"""
+        return await self.cache.aget_or_compute(
+            namespace,
+            f"{PROMPT_VERSION}:{MODEL}:{max_tokens}",
+            self._completion_parts(prompt, system),
+            lambda: self._complete(namespace, prompt, max_tokens, system)
+        )
+    
+    async def _complete(
+        self,
+        namespace: str,
+        prompt: str,
+        max_tokens: int,
+        system: Optional[List[Dict]] = None
+    ) -> str:
+        """Run one LLM call through the gateway"""
+        response = await self.gateway.create(namespace, self._request_args(prompt, max_tokens, system))
+        return response.content[0].text.strip()
+    
+    async def _stream_complete(
+        self,
+        namespace: str,
+        prompt: str,
+        max_tokens: int,
+        system: Optional[List[Dict]] = None
+    ) -> AsyncIterator[str]:
+        """Token-level streaming variant of _cached_complete; a cached answer arrives as one chunk"""
+        key = self.cache.make_key(
+            namespace,
+            f"{PROMPT_VERSION}:{MODEL}:{max_tokens}",
+            self._completion_parts(prompt, system)
+        )
+        found, text = await self.cache.aget(namespace, key)
+        if found:
+            yield text
+            return
+        
+        chunks = []
+        async for chunk in self.gateway.stream(namespace, self._request_args(prompt, max_tokens, system)):
+            chunks.append(chunk)
+            yield chunk
+        
+        await self.cache.aset(namespace, key, ''.join(chunks).strip())
+    
+    async def enhance(
+        self,
+        parsed_resume: ParsedResume,
+        parsed_jd: ParsedJobDescription,
+        similar_resumes: List[Dict],
+        gaps: Dict,
+        mode: EnhancementMode = "per_bullet"
+    ) -> Tuple[List[ResumePoint], List[str]]:
+        """Enhanced bullets and recommendations, using the requested call strategy"""
+        if mode == "batched":
+            # One LLM call for all bullets and the recommendations
+            return await self.enhance_points_batched(parsed_resume, parsed_jd, similar_resumes, gaps)
+        
+        # Both share the global LLM concurrency limit
+        enhanced_points, recommendations = await asyncio.gather(
+            self.enhance_points(parsed_resume, parsed_jd, similar_resumes, gaps),
+            self.generate_recommendations(gaps, similar_resumes, parsed_jd)
+        )
+        return enhanced_points, recommendations
     
     async def enhance_points(
         self,
@@ -14,86 +124,273 @@ class ResumeEnhancer:
         similar_resumes: List[Dict],
         gaps: Dict
     ) -> List[ResumePoint]:
-        """Enhance resume bullet points with relevant keywords"""
-        enhanced_points = []
-        
-        # Focus on project descriptions as requested
-        for project in parsed_resume.projects[:5]:  # Limit to top 5 projects
-            enhanced = await self._enhance_single_point(
-                project['description'],
-                parsed_jd,
-                similar_resumes,
-                gaps
+        """Enhance resume bullet points with relevant keywords.
+        
+        Project and experience bullets are enhanced in the scheduler's
+        priority order within the request's token and latency budgets; the
+        rest come back unmodified with enhanced=False.
+        """
+        # Context shared by every bullet, built once
+        prompt = self.prompt_builder.bullet_prompt(parsed_jd, similar_resumes, gaps)
+        plan = self.scheduler.plan(parsed_resume, parsed_jd, gaps, prompt)
+        deadline = self.scheduler.deadline()
+        order = plan.order
+        
+        results = {}
+        if PREFIX_WARMUP and prompt.cacheable and len(order) > 1:
+            # The API cache entry exists once a call has been answered; fanning
+            # out before that would write the same prefix once per bullet
+            first, = await self._gather_until(
+                deadline,
+                [self._enhance_single_point(plan.bullets[order[0]]['text'], prompt)]
             )
-            
-            enhanced_points.append(ResumePoint(
-                original_point=project['description'],
-                enhanced_point=enhanced
-            ))
+            results[order[0]] = first
         
-        return enhanced_points
+        # Fan out the remaining bullets in priority order; the semaphore
+        # bounds the real concurrency and serves waiters first come first served
+        rest = order[len(results):]
+        results.update(zip(rest, await self._gather_until(
+            deadline,
+            [self._enhance_single_point(plan.bullets[index]['text'], prompt) for index in rest]
+        )))
+        
+        return [self._resume_point(bullet, results.get(index)) for index, bullet in enumerate(plan.bullets)]
     
-    async def _enhance_single_point(
+    async def enhance_points_batched(
         self,
-        original_point: str,
+        parsed_resume: ParsedResume,
         parsed_jd: ParsedJobDescription,
         similar_resumes: List[Dict],
         gaps: Dict
-    ) -> str:
-        """Enhance a single bullet point using Claude"""
+    ) -> Tuple[List[ResumePoint], List[str]]:
+        """Enhance the scheduled bullets and write the recommendations in one JSON-mode call.
         
-        # Gather context from similar resumes
-        similar_patterns = self._extract_enhancement_patterns(similar_resumes)
+        Bullets the reply does not map back to (or all of them, if the call
+        fails or returns no JSON) are retried with per-bullet calls, and
+        missing recommendations with generate_recommendations. Bullets
+        outside the budgets come back unmodified with enhanced=False.
+        """
+        prompt = self.prompt_builder.bullet_prompt(parsed_jd, similar_resumes, gaps)
+        plan = self.scheduler.plan(parsed_resume, parsed_jd, gaps, prompt, batched=True)
+        deadline = self.scheduler.deadline()
+        if not plan.order:
+            recommendations = await self.generate_recommendations(gaps, similar_resumes, parsed_jd)
+            return [self._resume_point(bullet, None) for bullet in plan.bullets], recommendations
+        
+        originals = [plan.bullets[index]['text'] for index in plan.order]
+        message = prompt.batch_message(
+            originals,
+            self._recommendation_context(gaps, similar_resumes, parsed_jd)
+        )
+        max_tokens = BULLET_MAX_TOKENS * len(originals) + 300
         
-        prompt = f"""
-        Enhance this resume bullet point by naturally incorporating relevant keywords and skills from the job description.
+        async def complete_and_parse():
+            text = await self._complete('enhanced_batch', message, max_tokens, prompt.system)
+            return parse_batch_response(text, len(originals))
         
-        Original bullet point:
-        {original_point}
+        enhanced, recommendations = {}, None
+        # The parsed reply is cached, so an unparsable one is never reused
+        reply, = await self._gather_until(deadline, [self.cache.aget_or_compute(
+            'enhanced_batch',
+            f"{PROMPT_VERSION}:{MODEL}:{max_tokens}",
+            self._completion_parts(message, prompt.system),
+            complete_and_parse
+        )])
+        if isinstance(reply, BaseException):
+            logger.warning(f"Batched enhancement failed, retrying per bullet: {reply!r}")
+        elif reply is not None:
+            # Copied, as retried bullets are added to it and the reply may be cached in process
+            enhanced, recommendations = dict(reply[0]), reply[1]
         
-        Job Description Keywords:
-        - Required: {', '.join(parsed_jd.required_skills)}
-        - Keywords: {', '.join(parsed_jd.keywords[:10])}
+        retry = [position for position in range(len(originals)) if position not in enhanced]
+        if retry:
+            logger.info(f"Batched enhancement: {len(retry)} of {len(originals)} bullets fall back to per-bullet calls")
         
-        Missing skills to potentially incorporate:
-        {', '.join(gaps.get('missing_skills', [])[:5])}
+        async def recommendations_fallback() -> List[str]:
+            if recommendations is not None:
+                return recommendations
+            return await self.generate_recommendations(gaps, similar_resumes, parsed_jd)
         
-        Patterns from successful resumes:
-        {similar_patterns}
+        # Retries share what is left of the deadline; recommendations are not bounded by it
+        recommendations, retried = await asyncio.gather(
+            recommendations_fallback(),
+            self._gather_until(
+                deadline,
+                [self._enhance_single_point(originals[position], prompt) for position in retry]
+            )
+        )
+        enhanced.update(zip(retry, retried))
         
-        Rules:
-        1. Keep the core achievement/work intact
-        2. Only add keywords that make logical sense
-        3. Don't force keywords that don't fit
-        4. Maintain professional tone
-        5. Keep it under 2 lines
-        6. Use action verbs
-        7. Include metrics if possible
+        results = {index: enhanced[position] for position, index in enumerate(plan.order)}
+        enhanced_points = [
+            self._resume_point(bullet, results.get(index))
+            for index, bullet in enumerate(plan.bullets)
+        ]
+        return enhanced_points, recommendations
+    
+    async def _gather_until(self, deadline: Optional[float], coroutines: List[Awaitable]) -> List:
+        """Results of coroutines run concurrently, in input order.
         
-        Return only the enhanced bullet point, nothing else.
+        A failed call gives its exception; calls still running at the
+        deadline, or cancelled before it, give None.
         """
+        tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+        if not tasks:
+            return []
         
-        response = self.anthropic.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=150,
-            messages=[{"role": "user", "content": prompt}]
-        )
+        timeout = None if deadline is None else max(0, deadline - asyncio.get_running_loop().time())
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=timeout)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.info(f"Latency budget exhausted: {len(pending)} of {len(tasks)} calls cancelled")
         
-        return response.content[0].text.strip()
+        return [
+            None if task not in done or task.cancelled() else task.exception() or task.result()
+            for task in tasks
+        ]
     
-    def _extract_enhancement_patterns(self, similar_resumes: List[Dict]) -> str:
-        """Extract useful patterns from similar resumes"""
-        patterns = []
+    def _resume_point(self, bullet: Dict[str, str], result) -> ResumePoint:
+        """ResumePoint for a bullet given its call's result (None if it was not enhanced)"""
+        if isinstance(result, LLMUnavailableError):
+            # Degraded mode while the circuit is open: keep the original bullet
+            result = None
+        elif isinstance(result, BaseException):
+            # Partial result: keep the original bullet instead of failing the request
+            logger.warning(f"Bullet enhancement failed: {result!r}")
+            result = None
         
-        for resume_data in similar_resumes[:2]:  # Top 2 similar resumes
-            relevant = resume_data.get('relevant_sections', {})
-            
-            # Extract strong action verbs and structures
-            for project in relevant.get('relevant_projects', [])[:3]:
-                if len(project) > 20:  # Meaningful bullets only
-                    patterns.append(f"- {project}")
+        return ResumePoint(
+            original_point=bullet['text'],
+            enhanced_point=result or bullet['text'],
+            section=bullet['section'],
+            enhanced=bool(result)
+        )
+    
+    async def stream_enhancements(
+        self,
+        parsed_resume: ParsedResume,
+        parsed_jd: ParsedJobDescription,
+        similar_resumes: List[Dict],
+        gaps: Dict,
+        mode: EnhancementMode = "per_bullet"
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Yield (event, payload) pairs as results arrive, in completion order.
         
-        return '\n'.join(patterns) if patterns else "No specific patterns found"
+        Bullets outside the budgets come first as unmodified 'point' events.
+        Each scheduled bullet produces 'point_delta' events with model tokens
+        as they stream in, then a final 'point' event carrying the complete
+        ResumePoint (the original text if the call failed or missed the
+        deadline). A single 'recommendations' event is emitted when those
+        are ready. In batched mode there are no deltas; all events follow
+        the one JSON call.
+        """
+        if mode == "batched":
+            enhanced_points, recommendations = await self.enhance_points_batched(
+                parsed_resume, parsed_jd, similar_resumes, gaps
+            )
+            for index, point in enumerate(enhanced_points):
+                yield 'point', {'index': index, **point.model_dump()}
+            yield 'recommendations', {'recommendations': recommendations}
+            return
+        
+        queue: asyncio.Queue = asyncio.Queue()
+        prompt = self.prompt_builder.bullet_prompt(parsed_jd, similar_resumes, gaps)
+        plan = self.scheduler.plan(parsed_resume, parsed_jd, gaps, prompt)
+        deadline = self.scheduler.deadline()
+        
+        scheduled = set(plan.order)
+        for index, bullet in enumerate(plan.bullets):
+            if index not in scheduled:
+                yield 'point', {'index': index, **self._resume_point(bullet, None).model_dump()}
+        
+        # With a cacheable prefix, later bullets wait until the first one is
+        # streaming, i.e. until the API has the prefix cached
+        prefix_warm = asyncio.Event()
+        if not (PREFIX_WARMUP and prompt.cacheable):
+            prefix_warm.set()
+        
+        async def run_point(index: int, bullet: Dict[str, str], first: bool):
+            enhanced = None
+            try:
+                if not first:
+                    await prefix_warm.wait()
+                text = ''
+                async for delta in self._stream_complete(
+                    'enhanced_point',
+                    prompt.user_message(bullet['text']),
+                    max_tokens=BULLET_MAX_TOKENS,
+                    system=prompt.system
+                ):
+                    prefix_warm.set()
+                    text += delta
+                    queue.put_nowait(('point_delta', {'index': index, 'text': delta}))
+                enhanced = text.strip()
+            except Exception as e:
+                enhanced = e
+            finally:
+                prefix_warm.set()
+                point = self._resume_point(bullet, enhanced)
+                queue.put_nowait(('point', {'index': index, **point.model_dump()}))
+        
+        async def run_recommendations():
+            recommendations = []
+            try:
+                recommendations = await self.generate_recommendations(gaps, similar_resumes, parsed_jd)
+            finally:
+                queue.put_nowait(('recommendations', {'recommendations': recommendations}))
+        
+        # Created in priority order, so the semaphore admits them in that order
+        point_tasks = {
+            index: asyncio.create_task(run_point(index, plan.bullets[index], position == 0))
+            for position, index in enumerate(plan.order)
+        }
+        recommendations_task = asyncio.create_task(run_recommendations())
+        
+        try:
+            unfinished = set(point_tasks)
+            recommendations_done = False
+            loop = asyncio.get_running_loop()
+            while unfinished or not recommendations_done:
+                try:
+                    event, payload = await asyncio.wait_for(
+                        queue.get(),
+                        timeout=None if deadline is None or not unfinished else deadline - loop.time()
+                    )
+                except asyncio.TimeoutError:
+                    # Out of time: the unfinished bullets are sent as they were
+                    logger.info(f"Latency budget exhausted: {len(unfinished)} of {len(point_tasks)} bullets not enhanced")
+                    for index in sorted(unfinished):
+                        point_tasks[index].cancel()
+                        yield 'point', {'index': index, **self._resume_point(plan.bullets[index], None).model_dump()}
+                    unfinished.clear()
+                    continue
+        
+                if event == 'recommendations':
+                    recommendations_done = True
+                elif payload['index'] not in unfinished:
+                    # Late output of a bullet already sent unmodified
+                    continue
+                elif event == 'point':
+                    unfinished.discard(payload['index'])
+                yield event, payload
+        finally:
+            for task in [*point_tasks.values(), recommendations_task]:
+                task.cancel()
+    
+    async def _enhance_single_point(self, original_point: str, prompt: BulletPrompt) -> str:
+        """Enhance a single bullet point using Claude"""
+        return await self._cached_complete(
+            'enhanced_point',
+            prompt.user_message(original_point),
+            max_tokens=BULLET_MAX_TOKENS,
+            system=prompt.system
+        )
     
     async def generate_recommendations(
         self,
@@ -102,22 +399,10 @@ class ResumeEnhancer:
         parsed_jd: ParsedJobDescription
     ) -> List[str]:
         """Generate recommendations based on gap analysis"""
-        
-        # Compile insights from similar resumes
-        common_skills = self._extract_common_skills(similar_resumes)
-        missing_critical = set(parsed_jd.required_skills) - set(gaps.get('current_skills', []))
-        
-        prompt = f"""
+        prompt = textwrap.dedent("""
         Generate 3-5 specific, actionable recommendations for improving this resume based on:
         
-        Critical missing skills from JD:
-        {', '.join(missing_critical)}
-        
-        Skills commonly found in similar successful resumes:
-        {', '.join(common_skills[:10])}
-        
-        JD emphasis areas:
-        {', '.join(parsed_jd.keywords[:8])}
+        {context}
         
         Provide recommendations that are:
         1. Specific and actionable
@@ -127,23 +412,45 @@ class ResumeEnhancer:
         
         Format: Return as a simple list, one recommendation per line.
         Focus on skills, experiences, or projects they could add or highlight.
-        """
+        """).strip().format(context=self._recommendation_context(gaps, similar_resumes, parsed_jd))
         
-        response = self.anthropic.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=300,
-            messages=[{"role": "user", "content": prompt}]
-        )
+        try:
+            text = await self._cached_complete('recommendations', prompt, max_tokens=300)
+        except LLMUnavailableError:
+            # Degraded mode while the circuit is open
+            return []
+        except Exception as e:
+            # Partial result: the enhanced bullets are still worth returning
+            logger.warning(f"Recommendation generation failed: {e!r}")
+            return []
         
         # Parse response into list
         recommendations = [
             line.strip() 
-            for line in response.content[0].text.strip().split('\n')
+            for line in text.split('\n')
             if line.strip() and not line.strip().startswith('#')
         ]
         
         return recommendations[:5]  # Limit to 5 recommendations
     
+    def _recommendation_context(
+        self,
+        gaps: Dict,
+        similar_resumes: List[Dict],
+        parsed_jd: ParsedJobDescription
+    ) -> str:
+        """Gap and reference-resume insights the recommendations are based on"""
+        # Compile insights from similar resumes
+        common_skills = self._extract_common_skills(similar_resumes)
+        # Sorted so the prompt (and its cache key) does not depend on set order
+        missing_critical = sorted(set(parsed_jd.required_skills) - set(gaps.get('current_skills', [])))
+        
+        return (
+            f"Critical missing skills from JD:\n{', '.join(missing_critical)}\n\n"
+            f"Skills commonly found in similar successful resumes:\n{', '.join(common_skills[:10])}\n\n"
+            f"JD emphasis areas:\n{', '.join(parsed_jd.keywords[:8])}"
+        )
+    
     def _extract_common_skills(self, similar_resumes: List[Dict]) -> List[str]:
         """Extract commonly occurring skills from similar resumes"""
         skill_frequency = {}
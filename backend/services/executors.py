@@ -0,0 +1,123 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Threads for work that releases the GIL (FAISS search, NumPy) or must not block the loop
+EXECUTOR_THREADS = int(os.getenv("EXECUTOR_THREADS", "4"))
+# Processes for GIL-bound parsing of large texts; 0 sends that work to the thread pool
+EXECUTOR_PROCESSES = int(os.getenv("EXECUTOR_PROCESSES", "2"))
+# Texts up to this many characters are parsed inline on the event loop: a
+# process round-trip (~1ms) costs more than parsing them. JD parsing runs at
+# roughly 0.6ms per 1000 characters, resume parsing well under 0.1ms.
+EXECUTOR_INLINE_MAX_CHARS = int(os.getenv("EXECUTOR_INLINE_MAX_CHARS", "5000"))
+# FAISS searches over at most this many vectors run inline (a flat search of 20k is ~1-2ms)
+EXECUTOR_INLINE_MAX_VECTORS = int(os.getenv("EXECUTOR_INLINE_MAX_VECTORS", "20000"))
+
+class Executors:
+    """Where CPU-bound steps of a request run, so they do not stall the event loop.
+
+    ``run_in_thread`` is for code that releases the GIL (FAISS, NumPy) or
+    whole blocking calls like ranking; ``run_in_process`` for pure-Python
+    work such as regex parsing, which threads cannot overlap with the loop.
+    Both take ``inline=True`` for inputs small enough that the hop costs
+    more than the work. Process workers are spawned (not forked, which is
+    unsafe once the app has started threads) and receive a module-level
+    function and picklable arguments. Spawning re-imports the entry script,
+    so one that starts the server must do so under ``if __name__ ==
+    "__main__"`` (the uvicorn command does); if the workers cannot start,
+    process work falls back to the thread pool.
+    """
+
+    def __init__(self, threads: int = EXECUTOR_THREADS, processes: int = EXECUTOR_PROCESSES):
+        self.thread_pool = ThreadPoolExecutor(threads, thread_name_prefix='cpu') if threads > 0 else None
+        self.process_pool = None
+        self.processes = processes
+        if processes > 0:
+            self.process_pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'))
+        self.counters = {'inline': 0, 'thread': 0, 'process': 0}
+
+    async def run_in_thread(self, func: Callable, *args, inline: bool = False) -> Any:
+        """func(*args) on the thread pool, keeping context variables such as stage timings"""
+        if inline or self.thread_pool is None:
+            self.counters['inline'] += 1
+            return func(*args)
+        self.counters['thread'] += 1
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self.thread_pool, functools.partial(context.run, func, *args)
+        )
+
+    async def run_in_process(self, func: Callable, *args, inline: bool = False) -> Any:
+        """func(*args) in a worker process; the thread pool when processes are off"""
+        if inline or self.process_pool is None:
+            return await self.run_in_thread(func, *args, inline=inline)
+        self.counters['process'] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.process_pool, func, *args)
+        except BrokenProcessPool as e:
+            self._process_pool_failed(e)
+            return await self.run_in_thread(func, *args)
+
+    async def map_in_processes(
+        self,
+        func: Callable[[List], List],
+        items: Sequence,
+        inline: bool = False
+    ) -> List:
+        """func over items split into one chunk per process; func maps a list to a list"""
+        if not items:
+            return []
+        chunks = max(1, min(self.processes, len(items)))
+        size = -(-len(items) // chunks)
+        results = await asyncio.gather(*[
+            self.run_in_process(func, list(items[start:start + size]), inline=inline)
+            for start in range(0, len(items), size)
+        ])
+        return [result for chunk in results for result in chunk]
+
+    async def warm_up(self):
+        """Start the worker processes now rather than on the first large request"""
+        if self.process_pool is not None:
+            loop = asyncio.get_running_loop()
+            try:
+                await asyncio.gather(*[
+                    loop.run_in_executor(self.process_pool, _warm_up_worker)
+                    for _ in range(self.processes)
+                ])
+            except BrokenProcessPool as e:
+                self._process_pool_failed(e)
+
+    def _process_pool_failed(self, error: Exception):
+        if self.process_pool is None:
+            return
+        logger.warning(f"Executor worker processes failed, using the thread pool instead: {error!r}")
+        self.process_pool.shutdown(wait=False, cancel_futures=True)
+        self.process_pool = None
+        self.processes = 0
+
+    def shutdown(self):
+        if self.thread_pool is not None:
+            self.thread_pool.shutdown(wait=False, cancel_futures=True)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+
+def _warm_up_worker():
+    # Import the parsers in the worker so the first real call does not pay for it
+    import app.services.parser
+
+_executors: Optional[Executors] = None
+
+def get_executors() -> Executors:
+    """Process-wide executors configured from the environment"""
+    global _executors
+    if _executors is None:
+        _executors = Executors()
+    return _executors
@@ -0,0 +1,175 @@
+import math
+import os
+from typing import Dict, Optional, Tuple
+import faiss
+import numpy as np
+
+# flat: exact search; ivfpq: inverted lists + product quantisation; hnsw: graph search
+INDEX_MODE = os.getenv("RAG_INDEX_MODE", "flat")
+IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))  # 0 picks sqrt(n)
+PQ_M = int(os.getenv("RAG_PQ_M", "48"))
+PQ_NBITS = 8
+NPROBE = int(os.getenv("RAG_NPROBE", "16"))
+# >0 re-ranks k * factor IVF-PQ candidates with exact distances (keeps full vectors in RAM)
+REFINE_K_FACTOR = int(os.getenv("RAG_REFINE_K_FACTOR", "0"))
+HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+EF_CONSTRUCTION = int(os.getenv("RAG_EF_CONSTRUCTION", "80"))
+EF_SEARCH = int(os.getenv("RAG_EF_SEARCH", "64"))
+
+# faiss wants ~39 training points per centroid; fewer gives poor clusters
+MIN_POINTS_PER_CENTROID = 39
+MAX_TRAINING_POINTS = 100_000
+
+def index_settings(mode: str = INDEX_MODE) -> Dict:
+    """Build-time parameters; a change here means the index must be rebuilt"""
+    if mode == 'ivfpq':
+        return {
+            'mode': mode, 'nlist': IVF_NLIST, 'pq_m': PQ_M, 'pq_nbits': PQ_NBITS,
+            'refine': REFINE_K_FACTOR > 0
+        }
+    if mode == 'hnsw':
+        return {'mode': mode, 'M': HNSW_M, 'ef_construction': EF_CONSTRUCTION}
+    if mode == 'flat':
+        return {'mode': mode}
+    raise ValueError(f"Unknown RAG_INDEX_MODE: {mode}")
+
+def create_index(
+    dimension: int,
+    n_vectors: int,
+    mode: str = INDEX_MODE,
+    refine_k_factor: int = REFINE_K_FACTOR
+) -> faiss.Index:
+    """Create an empty index of the configured type, sized for n_vectors"""
+    index_settings(mode)
+
+    if mode == 'ivfpq':
+        if n_vectors < 2 ** PQ_NBITS * MIN_POINTS_PER_CENTROID:
+            # Too small to train the PQ codebooks; exact search is fast at this size anyway
+            return faiss.IndexFlatL2(dimension)
+        nlist = IVF_NLIST or int(math.sqrt(n_vectors))
+        nlist = max(1, min(nlist, n_vectors // MIN_POINTS_PER_CENTROID))
+        if dimension % PQ_M:
+            raise ValueError(f"RAG_PQ_M={PQ_M} must divide the embedding dimension {dimension}")
+
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, PQ_M, PQ_NBITS)
+        if refine_k_factor > 0:
+            index = faiss.IndexRefineFlat(index)
+            index.k_factor = refine_k_factor
+        return index
+
+    if mode == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M)
+        index.hnsw.efConstruction = EF_CONSTRUCTION
+        return index
+
+    return faiss.IndexFlatL2(dimension)
+
+def train_index(index: faiss.Index, embeddings: np.ndarray, seed: int = 0):
+    """Train IVF coarse centroids and PQ codebooks on a sample of the corpus"""
+    if index.is_trained:
+        return
+
+    n = embeddings.shape[0]
+    if n > MAX_TRAINING_POINTS:
+        rows = np.sort(np.random.default_rng(seed).choice(n, MAX_TRAINING_POINTS, replace=False))
+        sample = np.asarray(embeddings[rows], dtype='float32')
+    else:
+        sample = np.asarray(embeddings, dtype='float32')
+
+    index.train(sample)
+
+def configure_search(index: faiss.Index, nprobe: int = NPROBE, ef_search: int = EF_SEARCH):
+    """Apply query-time recall/latency knobs, which are not fixed at build time"""
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexRefine):
+        index = faiss.downcast_index(index.base_index)
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = nprobe
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+def is_flat(index: faiss.Index) -> bool:
+    """Whether an index, ID-mapped or not, is an exact flat index (its data is just the vectors)"""
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    return isinstance(index, faiss.IndexFlat)
+
+def build_index(
+    embeddings: np.ndarray,
+    mode: str = INDEX_MODE,
+    refine_k_factor: int = REFINE_K_FACTOR,
+    add_batch_size: int = 65_536,
+    ids: Optional[np.ndarray] = None
+) -> faiss.Index:
+    """Create, train and fill an index from an embedding matrix (may be memory-mapped).
+
+    With ``ids`` the index is wrapped in an IndexIDMap: searches return
+    ids[row] instead of the row, and vectors can later be added or removed
+    by id (see update_index).
+    """
+    n, dimension = embeddings.shape
+    index = create_index(dimension, n, mode, refine_k_factor)
+    train_index(index, embeddings)
+    if ids is not None:
+        index = faiss.IndexIDMap(index)
+
+    for start in range(0, n, add_batch_size):
+        batch = np.ascontiguousarray(embeddings[start:start + add_batch_size], dtype='float32')
+        if ids is None:
+            index.add(batch)
+        else:
+            index.add_with_ids(batch, np.ascontiguousarray(ids[start:start + add_batch_size], dtype='int64'))
+
+    configure_search(index)
+    return index
+
+def update_index(
+    index: faiss.IndexIDMap,
+    embeddings: np.ndarray,
+    remove_ids: np.ndarray,
+    add_ids: np.ndarray,
+    copy: bool = True
+) -> Optional[faiss.Index]:
+    """An ID-mapped index without remove_ids and with rows add_ids of embeddings added.
+
+    The ids double as rows of embeddings. By default a copy is updated and
+    the index passed in is left untouched, so it can keep serving searches
+    meanwhile. IVF modes reuse their trained centroids and codebooks.
+    Returns None when the index type cannot remove vectors (HNSW, refined
+    IVF-PQ) or cannot be copied (memory-mapped IVF lists).
+    """
+    try:
+        if copy:
+            index = faiss.clone_index(index)
+        if len(remove_ids):
+            index.remove_ids(np.ascontiguousarray(remove_ids, dtype='int64'))
+    except RuntimeError:
+        return None
+
+    if len(add_ids):
+        index.add_with_ids(
+            np.ascontiguousarray(embeddings[add_ids], dtype='float32'),
+            np.ascontiguousarray(add_ids, dtype='int64')
+        )
+    configure_search(index)
+    return index
+
+class MappedFlatIndex:
+    """Exact L2 search directly over rows of a (memory-mapped) embedding matrix.
+
+    Has the ``ntotal`` and ``search`` of a FAISS index, labels being row
+    numbers plus ``start``. faiss.read_index copies a flat index's vectors
+    into the process; searching the mapped .npy keeps them in the page
+    cache, shared by every process that maps the same file.
+    """
+
+    def __init__(self, embeddings: np.ndarray, start: int = 0):
+        self.embeddings = embeddings
+        self.start = start
+        self.ntotal = len(embeddings)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances, labels = faiss.knn(np.ascontiguousarray(queries, dtype='float32'), self.embeddings, k)
+        return distances, np.where(labels >= 0, labels + self.start, -1)
@@ -0,0 +1,207 @@
+import json
+import os
+import pickle
+import re
+import uuid
+from typing import Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+from app.services.index_factory import update_index
+
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", "app/data/index")
+
+class IndexStore:
+    """On-disk FAISS index, embedding matrix and id->metadata table.
+
+    The manifest records the embedder signature plus size, mtime and
+    sha256 of every reference file, so a restart can tell which files
+    need re-embedding. It is written last and shares a build id with the
+    metadata table, so a half-written store is detected and rebuilt.
+
+    Updates are stored as numbered delta files on top of a build (see
+    save_delta) and replayed in order on load, so an update writes only
+    what it changed. ``save`` writes a whole build, which compacts them.
+    """
+    INDEX_FILE = 'reference.index'
+    EMBEDDINGS_FILE = 'embeddings.npy'
+    METADATA_FILE = 'metadata.pkl'
+    MANIFEST_FILE = 'manifest.json'
+    DELTA_PATTERN = re.compile(r'delta-(\d{6})\.pkl')
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.index_dir = index_dir
+        # Delta files on top of the stored build
+        self.deltas = 0
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def load_manifest(self) -> Optional[Dict]:
+        """Return the manifest as of the last delta, or None when there is no usable store"""
+        try:
+            with open(self._path(self.MANIFEST_FILE), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        deltas = self._load_deltas(manifest.get('build_id'))
+        for delta in deltas:
+            changes = delta['manifest']
+            files = {**manifest['files'], **changes['files']}
+            manifest = {**manifest, **changes, 'files': {name: record for name, record in files.items() if record}}
+        self.deltas = len(deltas)
+        return manifest
+
+    def load(self, manifest: Dict, mmap: bool = True) -> Optional[Tuple[faiss.Index, np.ndarray, List[Dict]]]:
+        """Memory-map the stored index and embeddings; None if they don't match the manifest.
+
+        With ``mmap=False`` the index is read into memory instead, giving a
+        private copy that can be modified. Replaying deltas also reads both
+        into memory.
+        """
+        deltas = self._load_deltas(manifest.get('build_id'))
+        try:
+            with open(self._path(self.METADATA_FILE), 'rb') as f:
+                stored = pickle.load(f)
+            if stored['build_id'] != manifest.get('build_id'):
+                return None
+            vectors, rows = stored['vectors'], stored['rows']
+
+            embeddings = np.load(self._path(self.EMBEDDINGS_FILE), mmap_mode='r')
+            index = faiss.read_index(
+                self._path(self.INDEX_FILE),
+                faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap and not deltas else 0
+            )
+        except (OSError, KeyError, ValueError, RuntimeError, pickle.UnpicklingError):
+            return None
+
+        # Embedding rows of removed chunks stay until the next rebuild, so
+        # both counts are checked against the recorded ones
+        if index.ntotal != vectors or embeddings.shape[0] != rows:
+            return None
+        if deltas:
+            return self._replay(index, embeddings, stored['metadata'], deltas)
+
+        return index, embeddings, stored['metadata']
+
+    def save_manifest(self, manifest: Dict):
+        self._atomic_write(self.MANIFEST_FILE, lambda path: self._write_json(path, manifest))
+
+    def save(
+        self,
+        index: faiss.Index,
+        embeddings: np.ndarray,
+        metadata: List[Dict],
+        manifest: Dict
+    ):
+        """Persist a new build; the manifest goes last so readers never trust a partial write"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        manifest['build_id'] = uuid.uuid4().hex
+
+        self._atomic_write(self.EMBEDDINGS_FILE, lambda path: np.save(path, embeddings))
+        self._atomic_write(
+            self.METADATA_FILE,
+            lambda path: self._write_pickle(
+                path,
+                {
+                    'build_id': manifest['build_id'],
+                    'vectors': index.ntotal,
+                    'rows': len(embeddings),
+                    'metadata': metadata
+                }
+            )
+        )
+        self._atomic_write(self.INDEX_FILE, lambda path: faiss.write_index(index, path))
+        self.save_manifest(manifest)
+        # Deltas of the previous build no longer apply; a leftover one is
+        # skipped on load by its build id
+        self._remove_deltas()
+
+    def save_delta(self, manifest: Dict, delta: Dict):
+        """Persist one update to the stored build (manifest['build_id']) as the next delta file.
+
+        ``delta`` holds 'manifest' (the changed 'files' records, None for
+        removed files, and the other manifest fields), 'removed_slots' and
+        'removed_ids' (resume ids whose entries go), 'embeddings' appended
+        after the existing rows with their 'resumes' entries, and the
+        resulting 'vectors' and 'rows' counts.
+        """
+        name = f"delta-{self.deltas + 1:06d}.pkl"
+        self._atomic_write(name, lambda path: self._write_pickle(path, {**delta, 'build_id': manifest['build_id']}))
+        self.deltas += 1
+
+    def _load_deltas(self, build_id: Optional[str]) -> List[Dict]:
+        """The build's deltas in order, up to the first missing, unreadable or stale one"""
+        try:
+            names = os.listdir(self.index_dir)
+        except OSError:
+            return []
+        numbers = sorted(int(match.group(1)) for match in map(self.DELTA_PATTERN.fullmatch, names) if match)
+
+        deltas = []
+        for expected, number in enumerate(numbers, 1):
+            if number != expected:
+                break
+            try:
+                with open(self._path(f"delta-{number:06d}.pkl"), 'rb') as f:
+                    delta = pickle.load(f)
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+                break
+            if build_id is None or delta.get('build_id') != build_id:
+                break
+            deltas.append(delta)
+        return deltas
+
+    @staticmethod
+    def _replay(
+        index: faiss.Index,
+        embeddings: np.ndarray,
+        metadata: List[Dict],
+        deltas: List[Dict]
+    ) -> Optional[Tuple[faiss.Index, np.ndarray, List[Dict]]]:
+        """The build with the deltas applied; None if one does not fit it"""
+        rows = len(embeddings)
+        embeddings = np.concatenate(
+            [np.asarray(embeddings, dtype='float32')] + [delta['embeddings'] for delta in deltas]
+        )
+        for delta in deltas:
+            added_slots = np.arange(rows, rows + len(delta['embeddings']), dtype=np.int64)
+            index = update_index(index, embeddings, delta['removed_slots'], added_slots, copy=False)
+            if index is None:
+                return None
+            rows += len(delta['embeddings'])
+            removed = set(delta['removed_ids'])
+            metadata = [resume for resume in metadata if resume['id'] not in removed] + delta['resumes']
+            if index.ntotal != delta['vectors'] or rows != delta['rows']:
+                return None
+        return index, embeddings, metadata
+
+    def _remove_deltas(self):
+        for name in os.listdir(self.index_dir):
+            if self.DELTA_PATTERN.fullmatch(name):
+                try:
+                    os.remove(self._path(name))
+                except FileNotFoundError:
+                    pass
+        self.deltas = 0
+
+    def _atomic_write(self, name: str, write):
+        final_path = self._path(name)
+        # Keep the real suffix so np.save does not append '.npy' to the temp name
+        tmp_path = self._path(f".tmp-{uuid.uuid4().hex}-{name}")
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, final_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _write_json(path: str, data: Dict):
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    @staticmethod
+    def _write_pickle(path: str, data):
+        with open(path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,354 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.services.cache import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+# "redis" shares the queue and results between API processes; "memory" keeps them in this one
+JOB_BACKEND = os.getenv("JOB_BACKEND", "redis" if REDIS_URL else "memory")
+# Jobs waiting for a worker; submissions beyond this are rejected with a 429
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+# Worker tasks per API process (0: this process only accepts and reports jobs)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Seconds a job's status and results stay available after it finishes
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+# How often a running job checks for a cancellation made through another process
+JOB_CANCEL_POLL = float(os.getenv("JOB_CANCEL_POLL", "1"))
+
+JOB_KEY_PREFIX = "job:"
+JOB_QUEUE_KEY = "jobs:queue"
+FINISHED_STATES = ('succeeded', 'failed', 'cancelled')
+
+# A job body: gets the request and an emit(event, payload) callback for progress
+JobRunner = Callable[[Dict, Callable[[str, Dict], Awaitable[None]]], Awaitable[None]]
+
+class JobQueueFullError(Exception):
+    """Too many jobs are waiting; the caller should retry later"""
+
+def _new_record(job_id: str, request: Dict) -> Dict:
+    return {
+        'job_id': job_id,
+        'status': 'queued',
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+        'points_total': None,
+        'index_version': None,
+        'relaxed_filters': [],
+        'recommendations': [],
+        'error': None,
+        'cancel': False,
+        'request': request
+    }
+
+def _public(record: Dict, points: List[Dict]) -> Dict:
+    """A stored record as the API reports it, without the request or cancel flag"""
+    job = {field: value for field, value in record.items() if field not in ('request', 'cancel')}
+    job['points'] = points
+    return job
+
+class InMemoryJobStore:
+    """Queue and results in this process; jobs are lost when it exits"""
+
+    def __init__(self, max_queued: int = JOB_QUEUE_MAX, ttl: float = JOB_RESULT_TTL):
+        self.queue: asyncio.Queue = asyncio.Queue(max_queued)
+        self.ttl = ttl
+        self.jobs: Dict[str, Dict] = {}
+        self.points: Dict[str, List[Dict]] = {}
+        # (expires_at, job_id) in finishing order, so expiry only looks at the front
+        self._expiry = deque()
+
+    def _prune(self):
+        now = time.time()
+        while self._expiry and self._expiry[0][0] < now:
+            _, job_id = self._expiry.popleft()
+            self.jobs.pop(job_id, None)
+            self.points.pop(job_id, None)
+
+    async def submit(self, job_id: str, request: Dict):
+        self._prune()
+        try:
+            self.queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            raise JobQueueFullError(f"{self.queue.maxsize} jobs are already waiting")
+        self.jobs[job_id] = _new_record(job_id, request)
+        self.points[job_id] = []
+
+    async def next_job(self) -> Optional[str]:
+        return await self.queue.get()
+
+    async def start(self, job_id: str) -> Optional[Dict]:
+        """Mark a dequeued job running; None if it was cancelled or has expired"""
+        record = self.jobs.get(job_id)
+        if record is None or record['cancel']:
+            return None
+        record.update(status='running', started_at=time.time())
+        return record['request']
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        record = self.jobs.get(job_id)
+        if record is None:
+            return None
+        return _public(record, list(self.points[job_id]))
+
+    async def update(self, job_id: str, **fields):
+        self.jobs[job_id].update(fields)
+
+    async def add_point(self, job_id: str, point: Dict):
+        self.points[job_id].append(point)
+
+    async def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        record = self.jobs.get(job_id)
+        if record is None:
+            return
+        record.update(status=status, finished_at=time.time(), error=error)
+        self._expiry.append((record['finished_at'] + self.ttl, job_id))
+
+    async def request_cancel(self, job_id: str) -> Optional[Dict]:
+        record = self.jobs.get(job_id)
+        if record is None:
+            return None
+        record['cancel'] = True
+        if record['status'] == 'queued':
+            # Stays in the queue until a worker skips it
+            await self.finish(job_id, 'cancelled')
+        return await self.get(job_id)
+
+    async def cancel_requested(self, job_id: str) -> bool:
+        return self.jobs[job_id]['cancel']
+
+    async def close(self):
+        pass
+
+class RedisJobStore:
+    """Queue and results in Redis, shared by every API process using it.
+
+    Each job is a hash of JSON-encoded fields under ``job:<id>`` with its
+    finished bullets in the list ``job:<id>:points``; waiting job ids are in
+    the list ``jobs:queue``. Keys expire ``ttl`` seconds after the job is
+    created and again after it finishes. A job whose worker process died
+    stays "running" until its keys expire.
+    """
+
+    def __init__(self, redis_url: str = REDIS_URL, max_queued: int = JOB_QUEUE_MAX, ttl: int = JOB_RESULT_TTL):
+        import redis.asyncio
+        # No socket timeout: workers block on the queue for up to a second
+        self.redis = redis.asyncio.Redis.from_url(redis_url, decode_responses=True)
+        self.max_queued = max_queued
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"{JOB_KEY_PREFIX}{job_id}"
+
+    async def submit(self, job_id: str, request: Dict):
+        key = self._key(job_id)
+        record = _new_record(job_id, request)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(key, mapping={field: json.dumps(value) for field, value in record.items()})
+        pipe.expire(key, self.ttl)
+        pipe.lpush(JOB_QUEUE_KEY, job_id)
+        *_, queued = await pipe.execute()
+        if queued > self.max_queued:
+            # Over the limit once pushed: take it back out (a worker may already have it)
+            await self.redis.lrem(JOB_QUEUE_KEY, 1, job_id)
+            await self.redis.delete(key)
+            raise JobQueueFullError(f"{self.max_queued} jobs are already waiting")
+
+    async def next_job(self) -> Optional[str]:
+        """A queued job id, or None after a second without one"""
+        reply = await self.redis.brpop(JOB_QUEUE_KEY, timeout=1)
+        return reply[1] if reply else None
+
+    async def start(self, job_id: str) -> Optional[Dict]:
+        key = self._key(job_id)
+        cancel, request = await self.redis.hmget(key, 'cancel', 'request')
+        if request is None or json.loads(cancel):
+            return None
+        await self.redis.hset(key, mapping={'status': json.dumps('running'), 'started_at': json.dumps(time.time())})
+        return json.loads(request)
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        key = self._key(job_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(key)
+        pipe.lrange(f"{key}:points", 0, -1)
+        fields, points = await pipe.execute()
+        if not fields:
+            return None
+        record = {field: json.loads(value) for field, value in fields.items()}
+        return _public(record, [json.loads(point) for point in points])
+
+    async def update(self, job_id: str, **fields):
+        await self.redis.hset(
+            self._key(job_id),
+            mapping={field: json.dumps(value) for field, value in fields.items()}
+        )
+
+    async def add_point(self, job_id: str, point: Dict):
+        points_key = f"{self._key(job_id)}:points"
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(points_key, json.dumps(point))
+        pipe.expire(points_key, self.ttl)
+        await pipe.execute()
+
+    async def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        key = self._key(job_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(key, mapping={
+            'status': json.dumps(status),
+            'finished_at': json.dumps(time.time()),
+            'error': json.dumps(error)
+        })
+        pipe.expire(key, self.ttl)
+        pipe.expire(f"{key}:points", self.ttl)
+        await pipe.execute()
+
+    async def request_cancel(self, job_id: str) -> Optional[Dict]:
+        key = self._key(job_id)
+        if not await self.redis.exists(key):
+            return None
+        await self.redis.hset(key, 'cancel', json.dumps(True))
+        # A worker that dequeues it now sees the flag and skips it
+        if json.loads(await self.redis.hget(key, 'status')) == 'queued':
+            await self.finish(job_id, 'cancelled')
+        return await self.get(job_id)
+
+    async def cancel_requested(self, job_id: str) -> bool:
+        cancel = await self.redis.hget(self._key(job_id), 'cancel')
+        return bool(cancel and json.loads(cancel))
+
+    async def close(self):
+        await self.redis.aclose()
+
+def create_job_store():
+    """Job store selected by JOB_BACKEND"""
+    if JOB_BACKEND == "redis":
+        return RedisJobStore()
+    if JOB_BACKEND != "memory":
+        raise ValueError(f"Unknown JOB_BACKEND: {JOB_BACKEND}")
+    return InMemoryJobStore()
+
+class JobManager:
+    """Runs submitted jobs on a fixed number of worker tasks.
+
+    Runners report progress through ``emit`` ('plan', 'retrieval', 'point',
+    'recommendations'); points are stored as they arrive. Cancelling stops
+    a job running here at once, elsewhere within JOB_CANCEL_POLL seconds.
+    """
+
+    def __init__(self, store, runner: JobRunner, workers: int = JOB_WORKERS):
+        self.store = store
+        self.runner = runner
+        self.workers = workers
+        self._worker_tasks: List[asyncio.Task] = []
+        # Jobs running in this process
+        self._running: Dict[str, asyncio.Task] = {}
+        self.counters = {'submitted': 0, 'rejected': 0, 'succeeded': 0, 'failed': 0, 'cancelled': 0}
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def start(self):
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        await self.store.close()
+
+    async def submit(self, request: Dict) -> Dict:
+        """Queue a job; raises JobQueueFullError when the queue is full"""
+        job_id = uuid.uuid4().hex
+        try:
+            await self.store.submit(job_id, request)
+        except JobQueueFullError:
+            self.counters['rejected'] += 1
+            raise
+        self.counters['submitted'] += 1
+        return await self.store.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await self.store.get(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Dict]:
+        job = await self.store.request_cancel(job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+            # Let the worker record the cancellation before reporting
+            await asyncio.wait({task})
+            job = await self.store.get(job_id)
+        return job
+
+    async def _worker(self):
+        while True:
+            try:
+                job_id = await self.store.next_job()
+                if job_id is not None:
+                    await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Store unreachable: back off instead of spinning
+                logger.error(f"Job worker error: {e!r}")
+                await asyncio.sleep(1)
+
+    async def _run(self, job_id: str):
+        request = await self.store.start(job_id)
+        if request is None:
+            return
+
+        task = asyncio.create_task(self._execute(job_id, request))
+        self._running[job_id] = task
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=JOB_CANCEL_POLL)
+                if not task.done() and await self.store.cancel_requested(job_id):
+                    task.cancel()
+                    await asyncio.wait({task})
+        except asyncio.CancelledError:
+            # The worker is shutting down; the job records itself as failed
+            task.cancel()
+            await asyncio.wait({task})
+            raise
+        finally:
+            self._running.pop(job_id, None)
+
+    async def _execute(self, job_id: str, request: Dict):
+        """Run one job and record how it ended"""
+        async def emit(event: str, payload: Dict):
+            if event == 'point':
+                await self.store.add_point(job_id, payload)
+            elif event == 'plan':
+                await self.store.update(job_id, points_total=payload['points_total'])
+            elif event == 'retrieval':
+                await self.store.update(
+                    job_id,
+                    index_version=payload['index_version'],
+                    relaxed_filters=payload['relaxed_filters']
+                )
+            elif event == 'recommendations':
+                await self.store.update(job_id, recommendations=payload['recommendations'])
+
+        status, error = 'succeeded', None
+        try:
+            await self.runner(request, emit)
+        except asyncio.CancelledError:
+            if await self.store.cancel_requested(job_id):
+                status = 'cancelled'
+            else:
+                status, error = 'failed', "Worker stopped before the job finished"
+        except Exception as e:
+            status, error = 'failed', str(e)
+            logger.error(f"Job {job_id} failed: {error}")
+        await self.store.finish(job_id, status, error)
+        self.counters[status] += 1
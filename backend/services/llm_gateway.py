@@ -0,0 +1,401 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+from anthropic import (
+    APIConnectionError,
+    APIStatusError,
+    AsyncAnthropic,
+    DefaultAsyncHttpxClient,
+    RateLimitError
+)
+from anthropic.types import Message
+
+from app.services.metrics import get_metrics
+from app.services.prompts import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Global cap on in-flight LLM calls across all requests served by this process
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("ENHANCER_MAX_CONCURRENCY", "8"))
+# Per-attempt timeout in seconds
+LLM_CALL_TIMEOUT = float(os.getenv("ENHANCER_CALL_TIMEOUT", "20"))
+# Pooled keep-alive connections to the API
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+# Client-side limits, set to the account's API limits (0: unlimited)
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+# Seconds' worth of either limit that may be spent in one burst; the API
+# replenishes limits continuously, so a minute's worth at once gets 429s
+LLM_RATE_BURST_SECONDS = float(os.getenv("LLM_RATE_BURST_SECONDS", "1"))
+# Retries of rate-limited, overloaded, 5xx, timed-out and unreachable calls
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+# Consecutive failed calls that open the circuit (0: never), and seconds until a trial call
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+# Token counters reported by the API, summed over calls
+USAGE_FIELDS = ('input_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens', 'output_tokens')
+
+class LLMUnavailableError(Exception):
+    """Raised without calling the API while the circuit breaker is open"""
+
+class TokenBucket:
+    """Allows ``rate_per_minute`` units per minute, in bursts of ``burst_seconds`` worth.
+
+    Waiters are served in arrival order. ``pause`` holds everyone back,
+    e.g. for the retry-after of a 429; it applies even when unlimited.
+    """
+
+    def __init__(self, rate_per_minute: float, burst_seconds: float = LLM_RATE_BURST_SECONDS):
+        self.rate = rate_per_minute / 60
+        self.capacity = self.rate * burst_seconds
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.capacity <= 0:
+                        return
+                    self._refill(now)
+                    # A call larger than a burst waits for a full bucket and leaves it in debt
+                    needed = min(amount, self.capacity)
+                    if self.level >= needed:
+                        self.level -= amount
+                        return
+                    wait = (needed - self.level) / self.rate
+                await asyncio.sleep(wait)
+
+    def refund(self, amount: float):
+        """Return an over-reservation; a negative amount charges an under-reservation"""
+        if self.capacity > 0:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level + amount)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class CircuitBreaker:
+    """Fails fast after ``threshold`` consecutive failed calls.
+
+    Once ``reset_timeout`` seconds have passed, a single trial call is let
+    through: success closes the circuit, failure opens it again. The trial
+    includes its retries; ``release`` frees it for a call ending without
+    an outcome.
+    """
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, reset_timeout: float = LLM_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if self._trial or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self._trial or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self._trial = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial = False
+        if self.threshold > 0 and (self.failures >= self.threshold or self.opened_at is not None):
+            if self.opened_at is None:
+                logger.warning(f"LLM circuit opened after {self.failures} failed calls")
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """A call ended without an outcome (cancelled); let another trial through"""
+        self._trial = False
+
+class LLMGateway:
+    """The process's single way to the LLM API.
+
+    Owns one pooled HTTP client and, per call: the circuit breaker, the
+    request and token rate limiters, the concurrency limit with a timeout
+    per attempt, and retries with exponential backoff and jitter (honouring
+    retry-after, which also pauses the limiters for every caller).
+    Identical non-streaming requests in flight at the same time share one
+    API call. Callers degrade on LLMUnavailableError or any other error,
+    e.g. by keeping the original bullet.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENT_LLM_CALLS,
+        call_timeout: float = LLM_CALL_TIMEOUT,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+        max_retries: int = LLM_MAX_RETRIES,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        # ANTHROPIC_BASE_URL is honoured by the client, so a local stub server
+        # (see benchmarks/stub_llm_server.py) can stand in for the real API
+        self.client = AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            # Retried here instead, so the limiters and breaker see every attempt
+            max_retries=0,
+            timeout=call_timeout,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS
+                )
+            )
+        )
+        self.call_timeout = call_timeout
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.calls_in_flight = 0
+        self.metrics = get_metrics()
+        # request key -> [shared task, number of waiting callers]
+        self._in_flight: Dict[str, List] = {}
+        self.usage = {'calls': 0, **{field: 0 for field in USAGE_FIELDS}}
+        self.counters = {'retries': 0, 'rate_limited': 0, 'deduplicated': 0, 'rejected': 0, 'failed': 0}
+
+    def stats(self) -> Dict:
+        return {**self.usage, **self.counters, 'circuit': self.breaker.state}
+
+    async def close(self):
+        await self.client.close()
+
+    async def create(self, namespace: str, request: Dict) -> Message:
+        """One Messages API call; identical concurrent requests share it"""
+        key = hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+        entry = self._in_flight.get(key)
+        if entry is None:
+            entry = self._in_flight[key] = [asyncio.create_task(self._create(namespace, request)), 0]
+            entry[0].add_done_callback(lambda _: self._forget(key, entry))
+        else:
+            self.counters['deduplicated'] += 1
+
+        entry[1] += 1
+        try:
+            # Shielded so one caller giving up does not cancel the call for the others
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not entry[0].done():
+                entry[0].cancel()
+
+    def _forget(self, key: str, entry: List):
+        if self._in_flight.get(key) is entry:
+            del self._in_flight[key]
+
+    async def _create(self, namespace: str, request: Dict) -> Message:
+        start = time.perf_counter()
+        trial = False
+        try:
+            # Once per call: a half-open trial keeps its slot through its retries
+            trial = self._check_breaker()
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with self._slot():
+                        # Paced inside the slot, so calls leave at the limited rate
+                        reserved = await self._acquire(request)
+                        message = await asyncio.wait_for(
+                            self.client.messages.create(**request),
+                            timeout=self.call_timeout
+                        )
+                except Exception as e:
+                    await self._after_failure(e, attempt, trial)
+                    continue
+
+                self._after_success(namespace, request, message.usage, reserved, start)
+                return message
+        except asyncio.CancelledError:
+            # Also while backing off between attempts
+            if trial:
+                self.breaker.release()
+            raise
+        except Exception as e:
+            self._observe_failure(namespace, e, start)
+            raise
+
+    async def stream(self, namespace: str, request: Dict) -> AsyncIterator[str]:
+        """Text deltas of one streamed call.
+
+        Failures before the first delta are retried like create(); once
+        text has been yielded they propagate. The timeout covers the whole
+        attempt, not each delta.
+        """
+        start = time.perf_counter()
+        trial = False
+        try:
+            trial = self._check_breaker()
+            for attempt in range(self.max_retries + 1):
+                started = False
+                try:
+                    async with self._slot():
+                        reserved = await self._acquire(request)
+                        loop = asyncio.get_running_loop()
+                        deadline = loop.time() + self.call_timeout
+                        async with self.client.messages.stream(**request) as stream:
+                            text_stream = stream.text_stream.__aiter__()
+                            while True:
+                                try:
+                                    chunk = await asyncio.wait_for(
+                                        text_stream.__anext__(),
+                                        timeout=deadline - loop.time()
+                                    )
+                                except StopAsyncIteration:
+                                    break
+                                started = True
+                                yield chunk
+
+                            message = await stream.get_final_message()
+                except Exception as e:
+                    if started:
+                        self.breaker.record_failure()
+                        raise
+                    await self._after_failure(e, attempt, trial)
+                    continue
+
+                self._after_success(namespace, request, message.usage, reserved, start)
+                return
+        except (asyncio.CancelledError, GeneratorExit):
+            if trial:
+                self.breaker.release()
+            raise
+        except Exception as e:
+            self._observe_failure(namespace, e, start)
+            raise
+
+    @asynccontextmanager
+    async def _slot(self):
+        """One of the max_concurrency call slots"""
+        async with self._semaphore:
+            self.calls_in_flight += 1
+            try:
+                yield
+            finally:
+                self.calls_in_flight -= 1
+
+    def _check_breaker(self) -> bool:
+        """Raises while the circuit is open; True if this call is the half-open trial"""
+        if not self.breaker.allow():
+            self.counters['rejected'] += 1
+            raise LLMUnavailableError(f"LLM circuit {self.breaker.state}")
+        return self.breaker.state == 'half_open'
+
+    async def _acquire(self, request: Dict) -> int:
+        """Wait for both limiters; returns the tokens reserved"""
+        reserved = self._estimate_tokens(request) + request['max_tokens']
+        await self.request_bucket.acquire()
+        await self.token_bucket.acquire(reserved)
+        return reserved
+
+    async def _after_failure(self, error: Exception, attempt: int, trial: bool):
+        """Back off before the next attempt, or raise once retries are used up"""
+        status = error.status_code if isinstance(error, APIStatusError) else None
+        retryable = (
+            isinstance(error, (APIConnectionError, asyncio.TimeoutError))
+            or status == 429 or (status is not None and status >= 500)
+        )
+        if not retryable:
+            # The request itself is bad; the API is fine
+            if trial:
+                self.breaker.release()
+            raise error
+        if attempt >= self.max_retries:
+            self.counters['failed'] += 1
+            self.breaker.record_failure()
+            raise error
+
+        delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt)
+        # Equal jitter: at least half the backoff, so retries still spread out
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if isinstance(error, RateLimitError):
+            self.counters['rate_limited'] += 1
+            if retry_after is not None:
+                # Everyone waits, not just this call, so the limit is not hit again at once
+                self.request_bucket.pause(retry_after)
+
+        self.counters['retries'] += 1
+        logger.info(f"LLM call failed ({error!r}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    def _after_success(self, namespace: str, request: Dict, usage, reserved: int, start: float):
+        self.breaker.record_success()
+        counts = {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+        self.metrics.observe_llm_call(namespace, time.perf_counter() - start, 'ok', counts)
+        self.token_bucket.refund(
+            reserved - counts['input_tokens'] - counts['cache_creation_input_tokens'] - counts['output_tokens']
+        )
+
+        self.usage['calls'] += 1
+        for field, count in counts.items():
+            self.usage[field] += count
+        logger.info(
+            f"LLM call {namespace}: ~{self._estimate_tokens(request)} prompt tokens estimated, "
+            f"input={counts['input_tokens']} cache_write={counts['cache_creation_input_tokens']} "
+            f"cache_read={counts['cache_read_input_tokens']} output={counts['output_tokens']}"
+        )
+
+    def _observe_failure(self, namespace: str, error: Exception, start: float):
+        outcome = 'rejected' if isinstance(error, LLMUnavailableError) else 'error'
+        self.metrics.observe_llm_call(namespace, time.perf_counter() - start, outcome)
+
+    def _estimate_tokens(self, request: Dict) -> int:
+        system = request.get('system') or []
+        return (
+            sum(estimate_tokens(message['content']) for message in request['messages'])
+            + sum(estimate_tokens(block['text']) for block in system)
+        )
+
+    def _retry_after(self, error: Exception) -> Optional[float]:
+        response = getattr(error, 'response', None)
+        try:
+            return float(response.headers['retry-after'])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return None
+
+_gateway: Optional[LLMGateway] = None
+
+def get_llm_gateway() -> LLMGateway:
+    """Process-wide gateway configured from the environment"""
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway()
+    return _gateway
@@ -0,0 +1,219 @@
+import contextvars
+import logging
+import os
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Collect Prometheus metrics (needs prometheus_client); when off, timers are no-ops
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Add a Server-Timing header with per-stage durations to every response
+METRICS_TIMING_HEADERS = os.getenv("METRICS_TIMING_HEADERS", "0") == "1"
+# Seconds, from an in-process cache hit up to a slow LLM call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stage name -> [seconds, count] for the request being served, if it is timed
+_request_timings: contextvars.ContextVar[Optional[Dict[str, List[float]]]] = contextvars.ContextVar(
+    'request_timings', default=None
+)
+_NOOP = nullcontext()
+
+class Metrics:
+    """Prometheus metrics for the pipeline, in a registry of their own.
+
+    ``stage(name)`` times a block into a per-stage histogram and, when
+    timing headers are on, into the current request's Server-Timing
+    entry. Counters that services already keep (cache hits, LLM retries)
+    are read at scrape time through ``register_snapshot`` instead of being
+    updated on the hot path. Disabled, ``stage`` returns a shared no-op
+    context manager and nothing else is recorded.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED, timing_headers: bool = METRICS_TIMING_HEADERS):
+        self.enabled = enabled
+        self.timing_headers = timing_headers
+        if enabled:
+            try:
+                import prometheus_client
+            except ImportError:
+                logger.warning("METRICS_ENABLED is set but prometheus_client is not installed; metrics are off")
+                self.enabled = False
+        if not self.enabled:
+            return
+
+        from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+        from prometheus_client import PlatformCollector, ProcessCollector
+
+        self.registry = CollectorRegistry()
+        ProcessCollector(registry=self.registry)
+        PlatformCollector(registry=self.registry)
+        self.stage_seconds = Histogram(
+            'resume_stage_seconds', 'Time spent in each pipeline stage',
+            ['stage'], buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.request_seconds = Histogram(
+            'resume_http_request_seconds', 'HTTP request latency until the response body is sent',
+            ['method', 'route', 'status'], buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.requests_in_progress = Gauge(
+            'resume_http_requests_in_progress', 'HTTP requests being served',
+            ['method', 'route'], registry=self.registry
+        )
+        self.llm_call_seconds = Histogram(
+            'resume_llm_call_seconds', 'LLM call latency, retries included',
+            ['namespace', 'outcome'], buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.llm_tokens = Counter(
+            'resume_llm_tokens', 'Tokens reported by the LLM API',
+            ['namespace', 'type'], registry=self.registry
+        )
+        # Labelled children, looked up once per stage name
+        self._stage_histograms = {}
+
+    def stage(self, name: str):
+        """Context manager timing one pipeline stage"""
+        if not self.enabled:
+            return _NOOP
+        histogram = self._stage_histograms.get(name)
+        if histogram is None:
+            histogram = self._stage_histograms[name] = self.stage_seconds.labels(name)
+        return _StageTimer(name, histogram)
+
+    def observe_llm_call(self, namespace: str, seconds: float, outcome: str, tokens: Optional[Dict[str, int]] = None):
+        """One gateway call: its latency and, if it succeeded, the tokens it used"""
+        if not self.enabled:
+            return
+        self.llm_call_seconds.labels(namespace, outcome).observe(seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            entry = timings.setdefault(f"llm_{namespace}", [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+        for token_type, count in (tokens or {}).items():
+            if count:
+                self.llm_tokens.labels(namespace, token_type).inc(count)
+
+    def register_snapshot(
+        self,
+        name: str,
+        documentation: str,
+        labels: List[str],
+        read: Callable[[], Dict[Tuple[str, ...], float]],
+        kind: str = 'counter'
+    ):
+        """Expose values a service already tracks, read when /metrics is scraped"""
+        if self.enabled:
+            self.registry.register(_SnapshotCollector(name, documentation, labels, read, kind))
+
+    def render(self) -> Tuple[bytes, str]:
+        """Body and content type of the Prometheus text exposition"""
+        from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+        return generate_latest(self.registry), CONTENT_TYPE_LATEST
+
+class _StageTimer:
+    __slots__ = ('name', 'histogram', 'start')
+
+    def __init__(self, name: str, histogram):
+        self.name = name
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.histogram.observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            entry = timings.setdefault(self.name, [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += 1
+
+class _SnapshotCollector:
+    def __init__(self, name: str, documentation: str, labels: List[str], read: Callable, kind: str):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.read = read
+        self.kind = kind
+
+    def collect(self) -> Iterable:
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+        family_type = CounterMetricFamily if self.kind == 'counter' else GaugeMetricFamily
+        family = family_type(self.name, self.documentation, labels=self.labels)
+        for label_values, value in self.read().items():
+            family.add_metric(list(label_values), value)
+        yield family
+
+class MetricsMiddleware:
+    """ASGI middleware: request latency and in-progress gauges per route, plus Server-Timing.
+
+    Routes are labelled by their path template, so ids in paths do not
+    create new series. Server-Timing only holds the stages finished before
+    the response headers go out, which for streaming responses is the
+    work done before the first event.
+    """
+
+    def __init__(self, app, metrics: Metrics, routes: List):
+        self.app = app
+        self.metrics = metrics
+        self.routes = routes
+
+    def _route(self, scope) -> str:
+        from starlette.routing import Match
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return 'unmatched'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope['method'], self._route(scope)
+        timings = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if self.metrics.timing_headers:
+                    header = _server_timing(timings, time.perf_counter() - start)
+                    message = {**message, 'headers': [*message.get('headers', []), (b'server-timing', header.encode('latin-1'))]}
+            await send(message)
+
+        in_progress = self.metrics.requests_in_progress.labels(method, route)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            in_progress.dec()
+            _request_timings.reset(token)
+            self.metrics.request_seconds.labels(method, route, str(status)).observe(time.perf_counter() - start)
+
+def _server_timing(timings: Dict[str, List[float]], total: float) -> str:
+    """Server-Timing value; stages run concurrently (LLM calls) are summed, with their count"""
+    entries = []
+    for name, (seconds, count) in timings.items():
+        entry = f"{name};dur={seconds * 1000:.1f}"
+        if count > 1:
+            entry += f';desc="{count} calls, summed"'
+        entries.append(entry)
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(entries)
+
+_metrics: Optional[Metrics] = None
+
+def get_metrics() -> Metrics:
+    """Process-wide metrics configured from the environment"""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
@@ -1,142 +1,237 @@
 import re
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Optional, Sequence, Tuple
 from app.models import ParsedResume, ParsedJobDescription
+from app.services.cache import ContentCache, get_cache
+from app.services.executors import EXECUTOR_INLINE_MAX_CHARS, Executors, get_executors
+from app.utils.keywords import get_tech_keyword_matcher
+from app.utils.profiles import extract_profile
+from app.utils.text_processing import YEARS_PATTERN
+
+# Bump when parsing logic changes so cached parses are not reused
+RESUME_PARSER_VERSION = "resume-parser-3"
+JD_PARSER_VERSION = "jd-parser-3"
+
+# A header is a whole line holding only the section name, optionally with
+# qualifier words ("Technical Skills"), markdown decoration ("## Projects",
+# "**Skills**") and a trailing colon. Content after the colon ("Skills: Go,
+# Rust") belongs to the section body. Lines may end in CRLF.
+SECTION_HEADER_PATTERN = re.compile(
+    r'^[ \t]*(?:#+|[*_]+)?[ \t]*'
+    r'(?:(?:technical|professional|work|relevant|personal|academic|key|core|selected|side|other)[ \t]+)*'
+    r'(?:'
+    r'(?P<projects>projects?|portfolio)'
+    r'|(?P<experience>experience|work[ \t]+history|employment(?:[ \t]+history)?)'
+    r'|(?P<skills>skills?|technologies|tech[ \t]+stack)'
+    r'|(?P<education>education|academics?)'
+    r')'
+    r'(?:[ \t]*(?:&|and)[ \t]*[a-z]+)?'
+    r'[ \t]*[*_]*[ \t\r]*(?::[*_]*|$)',
+    re.IGNORECASE | re.MULTILINE
+)
+BULLET_PATTERN = re.compile(r'[•\-\*]\s*(.+)')
+NON_BLANK_PATTERN = re.compile(r'\S')
+SKILL_LABEL_PATTERN = re.compile(r'(?i)(languages?|frameworks?|tools?|technologies):')
+
+# (start, end) offsets of a section body within the resume text
+EMPTY_SPAN = (0, 0)
 
 class ResumeParser:
-    def __init__(self):
-        self.section_patterns = {
-            'projects': r'(?i)(projects?|portfolio)',
-            'experience': r'(?i)(experience|work history|employment)',
-            'skills': r'(?i)(skills?|technical skills|technologies)',
-            'education': r'(?i)(education|academic)'
-        }
+    def __init__(self, cache: Optional[ContentCache] = None, executors: Optional[Executors] = None):
+        self.section_pattern = SECTION_HEADER_PATTERN
+        self.cache = cache or get_cache()
+        self.executors = executors or get_executors()
     
     def parse(self, resume_text: str) -> ParsedResume:
-        """Parse resume text into structured format"""
+        """Parse resume text into structured format (cached by content hash)"""
+        return self.cache.get_or_compute(
+            'resume_parse',
+            RESUME_PARSER_VERSION,
+            (resume_text,),
+            lambda: self._parse(resume_text)
+        )
+    
+    def parse_many(self, resume_texts: Sequence[str]) -> List[ParsedResume]:
+        """parse() for a batch; cache lookups and stores are one round-trip each"""
+        return self.cache.get_or_compute_many(
+            'resume_parse',
+            RESUME_PARSER_VERSION,
+            [(text,) for text in resume_texts],
+            lambda missing: [self._parse(resume_texts[position]) for position in missing]
+        )
+    
+    async def aparse(self, resume_text: str) -> ParsedResume:
+        """parse() for request handlers: large texts are parsed in a worker process"""
+        async def compute() -> ParsedResume:
+            if len(resume_text) <= EXECUTOR_INLINE_MAX_CHARS:
+                return self._parse(resume_text)
+            return await self.executors.run_in_process(parse_resume_uncached, resume_text)
+        
+        return await self.cache.aget_or_compute('resume_parse', RESUME_PARSER_VERSION, (resume_text,), compute)
+    
+    async def aparse_many(self, resume_texts: Sequence[str]) -> List[ParsedResume]:
+        """parse_many() for request handlers: cache misses are split across worker processes"""
+        async def compute_many(missing: List[int]) -> List[ParsedResume]:
+            texts = [resume_texts[position] for position in missing]
+            return await self.executors.map_in_processes(
+                parse_resumes_uncached,
+                texts,
+                inline=sum(map(len, texts)) <= EXECUTOR_INLINE_MAX_CHARS
+            )
+        
+        return await self.cache.aget_or_compute_many(
+            'resume_parse',
+            RESUME_PARSER_VERSION,
+            [(text,) for text in resume_texts],
+            compute_many
+        )
+    
+    def chunk(self, resume_text: str) -> List[Dict]:
+        """Split a resume into retrieval units, one per non-empty line.
+        
+        Header lines are dropped; every other line becomes
+        ``{'text', 'section', 'bullet'}`` with the section it sits in
+        ('other' before the first header) and whether it is a bullet, whose
+        marker is stripped.
+        """
+        chunks = []
+        body_start, section = 0, 'other'
+        for match in self.section_pattern.finditer(resume_text):
+            chunks.extend(self._chunk_lines(resume_text[body_start:match.start()], section))
+            body_start, section = match.end(), match.lastgroup
+        chunks.extend(self._chunk_lines(resume_text[body_start:], section))
+        return chunks
+    
+    def _chunk_lines(self, body: str, section: str) -> List[Dict]:
+        chunks = []
+        for line in body.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            bullet = BULLET_PATTERN.match(line)
+            chunks.append({
+                'text': bullet.group(1).strip() if bullet else line,
+                'section': section,
+                'bullet': bullet is not None
+            })
+        return chunks
+    
+    def _parse(self, resume_text: str) -> ParsedResume:
         sections = self._extract_sections(resume_text)
         
         return ParsedResume(
-            projects=self._parse_projects(sections.get('projects', '')),
-            skills=self._parse_skills(sections.get('skills', '')),
-            experience=self._parse_experience(sections.get('experience', '')),
-            education=self._parse_education(sections.get('education', ''))
+            projects=self._parse_projects(resume_text, sections.get('projects', EMPTY_SPAN)),
+            skills=self._parse_skills(resume_text, sections.get('skills', EMPTY_SPAN)),
+            experience=self._parse_experience(resume_text, sections.get('experience', EMPTY_SPAN)),
+            education=self._parse_education(resume_text, sections.get('education', EMPTY_SPAN))
         )
     
-    def _extract_sections(self, text: str) -> Dict[str, str]:
-        """Extract major sections from resume"""
+    def _extract_sections(self, text: str) -> Dict[str, Tuple[int, int]]:
+        """Locate major sections in one scan, returning body offsets into text"""
         sections = {}
-        lines = text.split('\n')
         current_section = None
-        current_content = []
-        
-        for line in lines:
-            # Check if line is a section header
-            for section, pattern in self.section_patterns.items():
-                if re.search(pattern, line):
-                    if current_section:
-                        sections[current_section] = '\n'.join(current_content)
-                    current_section = section
-                    current_content = []
-                    break
-            else:
-                if current_section:
-                    current_content.append(line)
+        body_start = 0
+        
+        for match in self.section_pattern.finditer(text):
+            if current_section:
+                self._add_section(sections, current_section, text, (body_start, match.start()))
+            current_section = match.lastgroup
+            # The body starts after the colon, or on the line after a bare header
+            body_start = match.end()
+            if text.startswith('\n', body_start):
+                body_start += 1
         
         # Add last section
         if current_section:
-            sections[current_section] = '\n'.join(current_content)
+            self._add_section(sections, current_section, text, (body_start, len(text)))
         
         return sections
     
-    def _parse_projects(self, text: str) -> List[Dict[str, str]]:
+    def _add_section(self, sections: Dict, name: str, text: str, span: Tuple[int, int]):
+        """Record a section body; a repeated header with an empty body keeps the earlier one"""
+        if name not in sections or NON_BLANK_PATTERN.search(text, *span):
+            sections[name] = span
+    
+    def _parse_bullets(self, text: str, span: Tuple[int, int], point_type: str) -> List[Dict[str, str]]:
+        """Extract bullet points from a section without copying it"""
+        return [
+            {'description': bullet.strip(), 'type': point_type}
+            for bullet in BULLET_PATTERN.findall(text, *span)
+        ]
+    
+    def _parse_projects(self, text: str, span: Tuple[int, int]) -> List[Dict[str, str]]:
         """Extract project descriptions as bullet points"""
-        projects = []
-        
-        # Split by bullet points or numbered lists
-        bullets = re.findall(r'[•\-\*]\s*(.+)', text)
-        
-        for bullet in bullets:
-            projects.append({
-                'description': bullet.strip(),
-                'type': 'project_point'
-            })
-        
-        return projects
+        return self._parse_bullets(text, span, 'project_point')
     
-    def _parse_skills(self, text: str) -> List[str]:
+    def _parse_skills(self, text: str, span: Tuple[int, int]) -> List[str]:
         """Extract skills from skills section"""
         # Common patterns: comma-separated, bullet points, categories
         skills = []
         
         # Remove common words
-        text = re.sub(r'(?i)(languages?|frameworks?|tools?|technologies):', '', text)
+        text = SKILL_LABEL_PATTERN.sub('', text[span[0]:span[1]])
         
         # Extract comma-separated values
         if ',' in text:
             skills.extend([s.strip() for s in text.split(',') if s.strip()])
         else:
             # Extract from bullet points
-            skills.extend(re.findall(r'[•\-\*]\s*(.+)', text))
+            skills.extend(BULLET_PATTERN.findall(text))
         
         return [s.strip() for s in skills if len(s.strip()) > 1]
     
-    def _parse_experience(self, text: str) -> List[Dict[str, str]]:
+    def _parse_experience(self, text: str, span: Tuple[int, int]) -> List[Dict[str, str]]:
         """Parse work experience section"""
-        experiences = []
         # Similar to projects - extract bullet points
-        bullets = re.findall(r'[•\-\*]\s*(.+)', text)
-        
-        for bullet in bullets:
-            experiences.append({
-                'description': bullet.strip(),
-                'type': 'experience_point'
-            })
-        
-        return experiences
+        return self._parse_bullets(text, span, 'experience_point')
     
-    def _parse_education(self, text: str) -> List[Dict[str, str]]:
+    def _parse_education(self, text: str, span: Tuple[int, int]) -> List[Dict[str, str]]:
         """Parse education section"""
         # Basic implementation - can be enhanced
-        return [{'description': text.strip()}] if text.strip() else []
+        description = text[span[0]:span[1]].strip()
+        return [{'description': description}] if description else []
 
 
 class JobDescriptionParser:
-    def __init__(self):
-        self.tech_keywords = self._load_tech_keywords()
-    
-    def _load_tech_keywords(self) -> set:
-        """Load common tech keywords"""
-        return {
-            # Languages
-            'python', 'java', 'javascript', 'typescript', 'go', 'rust', 'c++',
-            'ruby', 'scala', 'kotlin', 'swift', 'r', 'sql',
-            
-            # Frameworks
-            'react', 'angular', 'vue', 'django', 'flask', 'spring', 'express',
-            'fastapi', 'rails', 'laravel', 'nextjs', 'nodejs',
-            
-            # Tools & Platforms
-            'aws', 'gcp', 'azure', 'docker', 'kubernetes', 'jenkins', 'git',
-            'terraform', 'ansible', 'ci/cd', 'microservices', 'rest', 'graphql',
-            
-            # Databases
-            'postgresql', 'mysql', 'mongodb', 'redis', 'elasticsearch',
-            'cassandra', 'dynamodb', 'firebase',
-            
-            # Concepts
-            'agile', 'scrum', 'devops', 'tdd', 'clean code', 'solid',
-            'design patterns', 'distributed systems', 'scalability'
-        }
+    def __init__(self, cache: Optional[ContentCache] = None, executors: Optional[Executors] = None):
+        # Built once per process and shared; matches the whole vocabulary in one pass
+        self.keyword_matcher = get_tech_keyword_matcher()
+        self.tech_keywords = self.keyword_matcher.keywords
+        self.cache = cache or get_cache()
+        self.executors = executors or get_executors()
     
     def parse(self, job_description: str) -> ParsedJobDescription:
-        """Parse job description to extract key information"""
+        """Parse job description to extract key information (cached by content hash)"""
+        return self.cache.get_or_compute(
+            'jd_parse',
+            f"{JD_PARSER_VERSION}:{self.keyword_matcher.digest}",
+            (job_description,),
+            lambda: self._parse(job_description)
+        )
+    
+    async def aparse(self, job_description: str) -> ParsedJobDescription:
+        """parse() for request handlers: large texts are parsed in a worker process"""
+        async def compute() -> ParsedJobDescription:
+            if len(job_description) <= EXECUTOR_INLINE_MAX_CHARS:
+                return self._parse(job_description)
+            return await self.executors.run_in_process(parse_job_description_uncached, job_description)
+        
+        return await self.cache.aget_or_compute(
+            'jd_parse',
+            f"{JD_PARSER_VERSION}:{self.keyword_matcher.digest}",
+            (job_description,),
+            compute
+        )
+    
+    def _parse(self, job_description: str) -> ParsedJobDescription:
         jd_lower = job_description.lower()
         
         return ParsedJobDescription(
             required_skills=self._extract_required_skills(job_description),
             preferred_skills=self._extract_preferred_skills(job_description),
             responsibilities=self._extract_responsibilities(job_description),
-            keywords=self._extract_keywords(jd_lower)
+            keywords=self._extract_keywords(jd_lower),
+            profile=extract_profile(job_description)
         )
     
     def _extract_required_skills(self, text: str) -> List[str]:
@@ -156,7 +251,7 @@ class JobDescriptionParser:
                 # Extract individual skills
                 skills.extend(self._extract_skills_from_text(match))
         
-        return list(set(skills))
+        return list(dict.fromkeys(skills))
     
     def _extract_preferred_skills(self, text: str) -> List[str]:
         """Extract nice-to-have skills"""
@@ -173,19 +268,11 @@ class JobDescriptionParser:
             for match in matches:
                 skills.extend(self._extract_skills_from_text(match))
         
-        return list(set(skills))
+        return list(dict.fromkeys(skills))
     
     def _extract_skills_from_text(self, text: str) -> List[str]:
         """Extract individual skills from a text block"""
-        skills = []
-        text_lower = text.lower()
-        
-        # Check for known tech keywords
-        for keyword in self.tech_keywords:
-            if keyword in text_lower:
-                skills.append(keyword)
-        
-        return skills
+        return self.keyword_matcher.find(text)
     
     def _extract_responsibilities(self, text: str) -> List[str]:
         """Extract job responsibilities"""
@@ -203,15 +290,31 @@ class JobDescriptionParser:
     
     def _extract_keywords(self, text: str) -> List[str]:
         """Extract all technical keywords from JD"""
-        keywords = []
-        
-        for keyword in self.tech_keywords:
-            if keyword in text:
-                keywords.append(keyword)
+        keywords = self.keyword_matcher.find(text)
         
         # Extract years of experience
-        exp_matches = re.findall(r'(\d+)\+?\s*years?', text)
+        exp_matches = YEARS_PATTERN.findall(text)
         for match in exp_matches:
             keywords.append(f"{match}+ years")
         
-        return keywords
\ No newline at end of file
+        return keywords
+
+
+# Executor worker processes: each builds its own parsers on first use and
+# skips the cache, which the calling process consults before and after
+
+@lru_cache(maxsize=1)
+def _process_parsers() -> Tuple[ResumeParser, JobDescriptionParser]:
+    cache = ContentCache(redis_url="", max_items=1)
+    inline = Executors(threads=0, processes=0)
+    return ResumeParser(cache, inline), JobDescriptionParser(cache, inline)
+
+def parse_resume_uncached(resume_text: str) -> ParsedResume:
+    return _process_parsers()[0]._parse(resume_text)
+
+def parse_resumes_uncached(resume_texts: List[str]) -> List[ParsedResume]:
+    parser = _process_parsers()[0]
+    return [parser._parse(text) for text in resume_texts]
+
+def parse_job_description_uncached(job_description: str) -> ParsedJobDescription:
+    return _process_parsers()[1]._parse(job_description)
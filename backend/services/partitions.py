@@ -0,0 +1,137 @@
+from typing import Dict, List, Sequence, Tuple
+import faiss
+import numpy as np
+from app.services.index_factory import build_index, update_index
+from app.utils.profiles import UNKNOWN
+
+PartitionKey = Tuple[str, ...]
+
+class Partition:
+    """Reference resumes sharing one combination of profile values, with their own chunk index"""
+
+    def __init__(self, rows: np.ndarray, index: faiss.Index):
+        # Resume rows, and an index of their chunks labelled with the same slots as the main index
+        self.rows = rows
+        self.index = index
+
+class PartitionIndex:
+    """Chunk vectors split into one FAISS index per profile partition.
+
+    Resumes are grouped by the values of ``fields`` in their profile (e.g.
+    role_family and seniority) and each group's chunks indexed on their own,
+    built with the RAG_INDEX_MODE factory. A filtered query searches only
+    the partitions that match, so it reads as many vectors as can pass the
+    filter instead of scanning the corpus and dropping most of the hits.
+    The sub-indexes hold a second copy of the vectors.
+    """
+
+    def __init__(self, fields: Sequence[str], partitions: Dict[PartitionKey, Partition]):
+        self.fields = tuple(fields)
+        self.partitions = partitions
+
+    @classmethod
+    def build(
+        cls,
+        fields: Sequence[str],
+        profiles: List[Dict[str, str]],
+        chunk_starts: np.ndarray,
+        chunk_ends: np.ndarray,
+        embeddings: np.ndarray
+    ) -> 'PartitionIndex':
+        """Partition resumes by their profiles; resume row's chunks are embedding rows chunk_starts[row]:chunk_ends[row]"""
+        partitions = {}
+        for key, rows in group_rows(fields, profiles).items():
+            partition_slots = chunk_slots(chunk_starts[rows], chunk_ends[rows])
+            partitions[key] = Partition(rows, build_index(embeddings[partition_slots], ids=partition_slots))
+        return cls(fields, partitions)
+
+    def updated(
+        self,
+        profiles: List[Dict[str, str]],
+        chunk_starts: np.ndarray,
+        chunk_ends: np.ndarray,
+        embeddings: np.ndarray,
+        removed: Dict[PartitionKey, List[np.ndarray]],
+        added: Dict[PartitionKey, List[np.ndarray]]
+    ) -> 'PartitionIndex':
+        """The partitions after removing and adding chunk slots, keyed by partition.
+
+        Untouched partitions share their index with this one; touched ones
+        are updated on a copy, or rebuilt when their index type cannot
+        remove vectors. This object is left as it was.
+        """
+        partitions = {}
+        for key, rows in group_rows(self.fields, profiles).items():
+            previous = self.partitions.get(key)
+            if previous is not None and key not in removed and key not in added:
+                partitions[key] = Partition(rows, previous.index)
+                continue
+            index = None
+            if previous is not None:
+                index = update_index(
+                    previous.index,
+                    embeddings,
+                    _concat(removed.get(key, [])),
+                    _concat(added.get(key, []))
+                )
+            if index is None:
+                partition_slots = chunk_slots(chunk_starts[rows], chunk_ends[rows])
+                index = build_index(embeddings[partition_slots], ids=partition_slots)
+            partitions[key] = Partition(rows, index)
+        return PartitionIndex(self.fields, partitions)
+
+    def key(self, profile: Dict[str, str]) -> PartitionKey:
+        return tuple(profile.get(field, UNKNOWN) for field in self.fields)
+
+    def select(self, filters: Dict[str, str]) -> List[Partition]:
+        """Partitions whose profile has the given value for every filtered field"""
+        positions = [(self.fields.index(field), value) for field, value in filters.items()]
+        return [
+            partition for key, partition in self.partitions.items()
+            if all(key[position] == value for position, value in positions)
+        ]
+
+    @staticmethod
+    def search(partitions: List[Partition], queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """k nearest chunks per query across partitions: (distances, slots), -1 padded"""
+        distances, ids = [], []
+        for partition in partitions:
+            if not partition.index.ntotal:
+                continue
+            partition_distances, slots = partition.index.search(queries, min(k, partition.index.ntotal))
+            distances.append(np.where(slots >= 0, partition_distances, np.inf))
+            ids.append(slots)
+        if not ids:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype('float32'), empty.astype(np.int64)
+
+        merge = len(ids) > 1
+        distances, ids = np.hstack(distances), np.hstack(ids)
+        if merge:
+            order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+            distances = np.take_along_axis(distances, order, axis=1)
+            ids = np.take_along_axis(ids, order, axis=1)
+        return distances, ids
+
+    @property
+    def ntotal(self) -> int:
+        return sum(partition.index.ntotal for partition in self.partitions.values())
+
+def chunk_slots(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of the slot ranges starts[i]:ends[i]"""
+    lengths = ends - starts
+    if not lengths.sum():
+        return np.zeros(0, dtype=np.int64)
+    # Each slot's offset within its range, plus the range's start
+    offsets = np.arange(lengths.sum(), dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return offsets + np.repeat(starts, lengths)
+
+def group_rows(fields: Sequence[str], profiles: List[Dict[str, str]]) -> Dict[PartitionKey, np.ndarray]:
+    """Resume rows by their values of fields, rows ascending within each partition"""
+    groups: Dict[PartitionKey, List[int]] = {}
+    for row, profile in enumerate(profiles):
+        groups.setdefault(tuple(profile.get(field, UNKNOWN) for field in fields), []).append(row)
+    return {key: np.array(rows, dtype=np.int64) for key, rows in groups.items()}
+
+def _concat(arrays: List[np.ndarray]) -> np.ndarray:
+    return np.concatenate(list(arrays) + [np.zeros(0, dtype=np.int64)])
@@ -0,0 +1,171 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+from app.models import ParsedJobDescription
+
+# Upper bound on the per-request context (JD skills, gaps, reference patterns)
+PROMPT_CONTEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_CONTEXT_TOKEN_BUDGET", "800"))
+# The API ignores cache breakpoints on prefixes shorter than this (Sonnet/Opus)
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+# Rough size of a token in English prose; the API reports exact counts
+CHARS_PER_TOKEN = 4
+
+BULLET_INSTRUCTIONS = """You enhance resume bullet points for a specific job description by naturally incorporating relevant keywords and skills from it.
+
+Rules:
+1. Keep the core achievement/work intact
+2. Only add keywords that make logical sense
+3. Don't force keywords that don't fit
+4. Maintain professional tone
+5. Keep it under 2 lines
+6. Use action verbs
+7. Include metrics if possible"""
+
+BULLET_FORMAT = "Return only the enhanced bullet point, nothing else."
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count, for budgeting before a call"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+class BulletPrompt:
+    """Prompt shared by all bullet calls of one request.
+
+    The system prompt is the static instructions followed by the request's
+    context; only the bullet varies per call, so the system blocks form a
+    stable prefix. When that prefix is long enough to be cached by the API
+    it carries a cache breakpoint, and later calls read it from the cache.
+    """
+
+    def __init__(self, context: str, truncated: Dict[str, int]):
+        self.context = context
+        self.truncated = truncated
+        self.prefix_tokens = estimate_tokens(BULLET_INSTRUCTIONS) + estimate_tokens(context)
+        self.cacheable = self.prefix_tokens >= PROMPT_CACHE_MIN_TOKENS
+
+        context_block = {"type": "text", "text": context}
+        if self.cacheable:
+            context_block["cache_control"] = {"type": "ephemeral"}
+        self.system = [{"type": "text", "text": BULLET_INSTRUCTIONS}, context_block]
+        self.system_text = BULLET_INSTRUCTIONS + "\n\n" + context
+
+    def user_message(self, original_point: str) -> str:
+        return f"Original bullet point:\n{original_point}\n\n{BULLET_FORMAT}"
+
+    def batch_message(self, original_points: List[str], recommendation_context: Optional[str] = None) -> str:
+        """One message enhancing every bullet (and optionally asking for recommendations) as JSON"""
+        bullets = '\n'.join(f"{index}: {point}" for index, point in enumerate(original_points))
+        parts = [f"Enhance each of these bullet points, numbered from 0:\n{bullets}"]
+
+        recommendations_field = ''
+        if recommendation_context is not None:
+            parts.append(
+                "Also generate 3-5 specific, actionable recommendations for improving this resume based on:\n"
+                + recommendation_context
+            )
+            recommendations_field = ', "recommendations": ["<recommendation>", ...]'
+
+        parts.append(
+            "Return only a JSON object, no other text:\n"
+            '{"points": [{"index": <bullet number>, "enhanced": "<enhanced bullet point>"}, ...]'
+            + recommendations_field + '}'
+        )
+        return '\n\n'.join(parts)
+
+def parse_batch_response(text: str, n_points: int) -> Tuple[Dict[int, str], Optional[List[str]]]:
+    """Enhanced bullets by index, and the recommendations, from a batch_message reply.
+
+    Entries that do not map back to exactly one requested bullet are left
+    out so the caller can retry them one by one; recommendations are None
+    unless they are a list of strings. Raises ValueError when the reply
+    holds no JSON object at all.
+    """
+    start, end = text.find('{'), text.rfind('}')
+    if start < 0 or end < start:
+        raise ValueError("No JSON object in batch response")
+    data = json.loads(text[start:end + 1])
+    if not isinstance(data, dict):
+        raise ValueError("Batch response is not a JSON object")
+
+    enhanced = {}
+    points = data.get('points')
+    for item in points if isinstance(points, list) else []:
+        if not isinstance(item, dict):
+            continue
+        index, point = item.get('index'), item.get('enhanced')
+        valid_index = isinstance(index, int) and not isinstance(index, bool) and 0 <= index < n_points
+        if valid_index and index not in enhanced and isinstance(point, str) and point.strip():
+            enhanced[index] = point.strip()
+
+    recommendations = data.get('recommendations')
+    if isinstance(recommendations, list) and all(isinstance(r, str) for r in recommendations):
+        recommendations = [r.strip() for r in recommendations if r.strip()][:5]
+    else:
+        recommendations = None
+
+    return enhanced, recommendations
+
+class PromptBuilder:
+    """Builds the bullet-enhancement context once per request, within a token budget"""
+
+    def __init__(self, token_budget: int = PROMPT_CONTEXT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+
+    def bullet_prompt(
+        self,
+        parsed_jd: ParsedJobDescription,
+        similar_resumes: List[Dict],
+        gaps: Dict
+    ) -> BulletPrompt:
+        """Context for every bullet of a request, trimmed to the token budget.
+
+        Over budget, reference patterns are dropped first, then keywords,
+        missing skills and finally required skills, each from the end of
+        its list (the least relevant entries).
+        """
+        sections = {
+            'required_skills': list(parsed_jd.required_skills),
+            'keywords': list(parsed_jd.keywords[:10]),
+            'missing_skills': list(gaps.get('missing_skills', [])[:5]),
+            'patterns': self._enhancement_patterns(similar_resumes)
+        }
+        truncated = {name: 0 for name in sections}
+
+        context = self._render(sections)
+        while estimate_tokens(context) > self.token_budget:
+            name = next(
+                (name for name in ('patterns', 'keywords', 'missing_skills', 'required_skills') if sections[name]),
+                None
+            )
+            if name is None:
+                break
+            sections[name].pop()
+            truncated[name] += 1
+            context = self._render(sections)
+
+        return BulletPrompt(context, truncated)
+
+    def _render(self, sections: Dict[str, List[str]]) -> str:
+        patterns = '\n'.join(f"- {pattern}" for pattern in sections['patterns'])
+        return (
+            "Job Description Keywords:\n"
+            f"- Required: {', '.join(sections['required_skills'])}\n"
+            f"- Keywords: {', '.join(sections['keywords'])}\n\n"
+            "Missing skills to potentially incorporate:\n"
+            f"{', '.join(sections['missing_skills'])}\n\n"
+            "Patterns from successful resumes:\n"
+            f"{patterns or 'No specific patterns found'}"
+        )
+
+    def _enhancement_patterns(self, similar_resumes: List[Dict]) -> List[str]:
+        """Extract useful patterns from similar resumes"""
+        patterns = []
+
+        for resume_data in similar_resumes[:2]:  # Top 2 similar resumes
+            relevant = resume_data.get('relevant_sections', {})
+
+            # Extract strong action verbs and structures
+            for project in relevant.get('relevant_projects', [])[:3]:
+                if len(project) > 20:  # Meaningful bullets only
+                    patterns.append(project)
+
+        return patterns
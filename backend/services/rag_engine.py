@@ -1,160 +1,910 @@
+import asyncio
+import hashlib
+import logging
+import re
+import textwrap
+import uuid
 import numpy as np
-from typing import List, Dict
-import faiss
-import pickle
-from anthropic import Anthropic
+from functools import lru_cache
+from typing import List, Dict, Iterator, Optional, Tuple
 import os
 from app.models import ParsedResume, ParsedJobDescription
+from app.services.cache import ContentCache, get_cache
+from app.services.embedder import Embedder, create_embedder
+from app.services.index_factory import build_index, index_settings, update_index
+from app.services.executors import EXECUTOR_INLINE_MAX_VECTORS, Executors, get_executors
+from app.services.index_store import IndexStore
+from app.services.metrics import get_metrics
+from app.services.parser import ResumeParser
+from app.services.partitions import Partition, PartitionIndex, group_rows
+from app.services.reference_corpus import EmbeddingBuffer, ReferenceCorpus
+from app.services.shared_corpus import SharedCorpusStore
+from app.services.sparse_index import BM25Index, reciprocal_rank_fusion
+from app.utils.profiles import UNKNOWN, extract_profile
+from app.utils.text_processing import normalize_term, term_set
+
+logger = logging.getLogger(__name__)
+
+RESUME_DIR = "app/data/reference_resumes"
+# Files read and embedded per step when (re)building the corpus
+LOAD_CHUNK_SIZE = int(os.getenv("RAG_LOAD_CHUNK_SIZE", "512"))
+# Names accepted for reference files added through the API
+REFERENCE_NAME_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9._-]{0,254}')
+
+# Reference resumes are indexed one vector per line-level chunk; longer
+# lines are wrapped into chunks of at most this many characters
+MAX_CHUNK_CHARS = int(os.getenv("RAG_MAX_CHUNK_CHARS", "500"))
+# Chunk hits fetched from FAISS per resume wanted, before grouping them by resume
+CHUNK_SEARCH_FACTOR = int(os.getenv("RAG_CHUNK_SEARCH_FACTOR", "4"))
+# Best-matching bullets returned per similar resume
+MATCHING_BULLETS = int(os.getenv("RAG_MATCHING_BULLETS", "5"))
+
+# Fuse FAISS results with BM25 over the JD keywords; 0 ranks by embedding distance alone
+HYBRID_SEARCH = os.getenv("RAG_HYBRID", "1") == "1"
+# Candidates taken from each of the dense and sparse rankings before fusion
+CANDIDATE_DEPTH = int(os.getenv("RAG_CANDIDATE_DEPTH", "50"))
+# Reciprocal-rank fusion constant: higher flattens the weight of the top ranks
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+
+# Profile fields (see app.utils.profiles) reference resumes are partitioned
+# by; a query only retrieves resumes matching the JD on them. Empty disables
+PARTITION_FIELDS = [
+    field.strip() for field in os.getenv("RAG_PARTITION_FIELDS", "role_family,seniority").split(',')
+    if field.strip()
+]
+
+# local: each process loads (or builds) and updates its own corpus.
+# shared: map the read-only build published by `python -m
+# app.services.corpus_builder` (see SharedCorpusStore), so any number of
+# workers share one copy; updates go through the builder
+CORPUS_MODE = os.getenv("RAG_CORPUS_MODE", "local")
+# Seconds between scans of RESUME_DIR for added, changed or deleted files
+# (shared mode: between checks for a newer build); 0 disables the watcher
+WATCH_INTERVAL = float(os.getenv("RAG_WATCH_INTERVAL", "0"))
+# An update that would leave more than this share of embedding rows
+# belonging to removed chunks rebuilds and compacts the corpus instead
+REBUILD_DEAD_FRACTION = float(os.getenv("RAG_REBUILD_DEAD_FRACTION", "0.25"))
+# Updates are persisted as delta files on top of the stored build; once
+# there are this many, the next update writes the whole build again
+INDEX_MAX_DELTAS = int(os.getenv("RAG_INDEX_MAX_DELTAS", "32"))
+
+# Bumped when the per-resume metadata layout changes, forcing a rebuild
+METADATA_VERSION = 5
+
+@lru_cache(maxsize=256)
+def _read_reference_text(filename: str, sha256: str) -> str:
+    """Read a reference resume on demand; the hash in the key drops stale entries"""
+    with open(os.path.join(RESUME_DIR, filename), 'r') as f:
+        return f.read()
+
+def _write_reference_file(path: str, text: str):
+    """Write a reference file under a hidden name first, so a scan never reads half of it"""
+    tmp_path = os.path.join(RESUME_DIR, f".tmp-{uuid.uuid4().hex}")
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _chunk_category(chunk: Dict) -> str:
+    """The relevant_sections key a parsed chunk is reported under"""
+    if chunk['section'] == 'skills':
+        return 'matching_skills'
+    if chunk['bullet'] and chunk['section'] != 'education':
+        return 'relevant_projects'
+    return 'useful_patterns'
+
+def _place(metadata: List[Dict], start: int) -> List[Dict]:
+    """Copies of resume entries given consecutive chunk slots from start on"""
+    placed = []
+    for resume in metadata:
+        placed.append({**resume, 'chunk_start': start})
+        start += len(resume['chunk_index']['texts'])
+    return placed
+
+class ReadOnlyCorpusError(Exception):
+    """This process serves a shared build; the corpus builder applies changes"""
+
+def _log_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Reference index rebuild failed: {task.exception()!r}")
 
 class RAGEngine:
-    def __init__(self):
-        self.anthropic = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-        self.index = None
-        self.reference_resumes = []
-        self.embeddings_cache = {}
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        store: Optional[IndexStore] = None,
+        cache: Optional[ContentCache] = None,
+        executors: Optional[Executors] = None,
+        shared_store: Optional[SharedCorpusStore] = None,
+        read_only: Optional[bool] = None
+    ):
+        self.embedder = embedder or create_embedder()
+        self.store = store or IndexStore()
+        self.shared_store = shared_store or SharedCorpusStore()
+        # Shared mode: the corpus is mapped from the shared store and never changed here
+        self.read_only = CORPUS_MODE == 'shared' if read_only is None else read_only
+        self.cache = cache or get_cache()
+        self.executors = executors or get_executors()
+        self.parser = ResumeParser(self.cache, self.executors)
+        self.metrics = get_metrics()
+        # The version queries use; replaced as a whole by every update
+        self.corpus = self._build_corpus(0, np.zeros((0, self.embedder.dimension), dtype='float32'), [])
+        # Rows of the served embeddings plus room to append to; see _update_corpus
+        self._embedding_buffer: Optional[EmbeddingBuffer] = None
+        self.manifest = None
+        # Name of the shared build being served
+        self.build = None
+        # One update at a time; queries never wait for it
+        self._update_lock = asyncio.Lock()
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._watcher: Optional[asyncio.Task] = None
     
     async def initialize(self):
-        """Initialize FAISS index with reference resumes"""
-        # Load reference resumes
-        self.reference_resumes = self._load_reference_resumes()
-        
-        # Generate embeddings for reference resumes
-        embeddings = []
-        for resume in self.reference_resumes:
-            embedding = await self._generate_embedding(resume['text'])
-            embeddings.append(embedding)
-            self.embeddings_cache[resume['id']] = embedding
-        
-        # Create FAISS index
-        dimension = len(embeddings[0])
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(np.array(embeddings).astype('float32'))
-    
-    def _load_reference_resumes(self) -> List[Dict]:
-        """Load 10 high-quality technical resumes"""
-        resumes = []
-        resume_dir = "app/data/reference_resumes"
-        
-        for i, filename in enumerate(os.listdir(resume_dir)[:10]):
-            with open(os.path.join(resume_dir, filename), 'r') as f:
-                resumes.append({
-                    'id': f'resume_{i}',
-                    'text': f.read(),
-                    'filename': filename
-                })
-        
-        return resumes
+        """Load the persisted FAISS index, then apply the reference files that changed since.
+        
+        In shared mode, map the published build instead; there must be one.
+        """
+        if self.read_only:
+            if not await self.reload():
+                raise RuntimeError(
+                    f"No shared reference corpus in {self.shared_store.directory}; "
+                    f"publish one with python -m app.services.corpus_builder"
+                )
+            return
+        
+        signature = f"{self.embedder.signature}:{MAX_CHUNK_CHARS}:{METADATA_VERSION}"
+        manifest = self.store.load_manifest()
+        loaded = None
+        if manifest and manifest.get('embedder') == signature:
+            loaded = self.store.load(manifest)
+        if loaded is None:
+            # Missing, stale or half-written store: every file counts as new
+            self.manifest = {'embedder': signature, 'files': {}, 'next_id': 0, 'version': 0}
+            await self.sync(rebuild=True)
+            return
+        
+        index, embeddings, metadata = loaded
+        corpus = ReferenceCorpus(manifest.get('version', 0), index, embeddings, metadata)
+        # Index type changed: the stored vectors are still valid, only the index is rebuilt
+        rebuild = manifest.get('index') != index_settings()
+        if not rebuild:
+            await self.executors.run_in_thread(self._derive_indexes, corpus)
+        self.corpus, self.manifest = corpus, manifest
+        await self.sync(rebuild=rebuild)
     
-    async def _generate_embedding(self, text: str) -> np.ndarray:
-        """Generate embedding using Claude"""
-        # Note: In production, you'd use a dedicated embedding model
-        # This is a simplified approach for demonstration
-        
-        prompt = f"""
-        Analyze this resume and extract key technical concepts, skills, and patterns.
-        Represent it as a list of 384 numerical features (0-1 scale) covering:
-        - Technical skills presence and depth
-        - Experience level indicators
-        - Project complexity
-        - Industry alignment
-        
-        Resume:
-        {text[:2000]}  # Truncate for API limits
-        
-        Return only comma-separated numbers.
+    async def sync(self, rebuild: bool = False) -> Dict:
+        """Apply added, changed and deleted reference files to the index, without a restart.
+        
+        Files are compared with the manifest by size and mtime, then hash.
+        The changes go into a copy of the index (remove_ids / add_with_ids),
+        which is persisted and then published by swapping ``self.corpus``,
+        so queries in flight finish on the version they started with. With
+        ``rebuild``, or when the copy cannot be updated in place, the corpus
+        is rebuilt from the stored vectors instead, also off to the side.
+        Returns the files applied and the version now served.
+        """
+        self._check_writable()
+        async with self._update_lock:
+            return await self.executors.run_in_thread(self._sync, rebuild)
+    
+    def start_rebuild(self) -> bool:
+        """Start a full rebuild in the background; False if one is already running"""
+        self._check_writable()
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            return False
+        self._rebuild_task = asyncio.create_task(self.sync(rebuild=True))
+        self._rebuild_task.add_done_callback(_log_failure)
+        return True
+    
+    @property
+    def rebuilding(self) -> bool:
+        return self._rebuild_task is not None and not self._rebuild_task.done()
+    
+    def start_watcher(self, interval: float = WATCH_INTERVAL):
+        """Poll RESUME_DIR (or the shared store) every interval seconds and apply what changed; 0 leaves it off"""
+        if interval > 0:
+            self._watcher = asyncio.create_task(self._watch(interval))
+    
+    async def stop_watcher(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+    
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.read_only:
+                    await self.reload()
+                else:
+                    await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reference corpus sync failed: {e!r}")
+    
+    async def put_reference(self, filename: str, text: str) -> Dict:
+        """Add or replace a reference resume file and index it; returns sync's result"""
+        self._check_writable()
+        path = self._reference_path(filename)
+        await self.executors.run_in_thread(_write_reference_file, path, text)
+        return await self.sync()
+    
+    async def delete_reference(self, filename: str) -> Optional[Dict]:
+        """Delete a reference resume file and drop it from the index; None if there is no such file"""
+        self._check_writable()
+        path = self._reference_path(filename)
+        try:
+            await self.executors.run_in_thread(os.remove, path)
+        except FileNotFoundError:
+            return None
+        return await self.sync()
+    
+    async def reload(self) -> bool:
+        """Shared mode: switch to the latest published build if it is not the one served.
+        
+        Mapping a build takes milliseconds. Queries in flight finish on the
+        build they started with, whose files stay mapped until then.
+        Returns whether a build was loaded.
         """
+        current = self.shared_store.current()
+        if current is None or current['build'] == self.build:
+            return False
+        loaded = await self.executors.run_in_thread(self.shared_store.load, current['build'])
+        if loaded is None:
+            logger.warning(f"Shared reference build {current['build']} could not be loaded")
+            return False
+        
+        info, corpus = loaded
+        if info['embedder'] != self.embedder.signature:
+            raise RuntimeError(
+                f"Shared build {current['build']} was embedded with {info['embedder']}, "
+                f"this process embeds queries with {self.embedder.signature}"
+            )
+        if info['partition_fields'] != PARTITION_FIELDS:
+            raise RuntimeError(
+                f"Shared build {current['build']} is partitioned by {info['partition_fields']}, "
+                f"RAG_PARTITION_FIELDS is {PARTITION_FIELDS}"
+            )
+        if not HYBRID_SEARCH:
+            corpus.sparse_index = None
+        self.corpus, self.build = corpus, current['build']
+        logger.info(f"Serving shared reference build {self.build} (v{corpus.version})")
+        return True
+    
+    async def publish(self) -> Optional[str]:
+        """Write the corpus served here to the shared store for workers in shared mode.
+        
+        Returns the new build's name, or None when the current build already
+        holds this version.
+        """
+        async with self._update_lock:
+            current = self.shared_store.current()
+            if current is not None and current.get('source') == self.manifest.get('build_id'):
+                return None
+            return await self.executors.run_in_thread(self._publish)
+    
+    def _publish(self) -> str:
+        """Compact the corpus, lay it out partition by partition and write it as a shared build"""
+        corpus = self.corpus
+        groups = group_rows(PARTITION_FIELDS, [resume['profile'] for resume in corpus.reference_resumes])
+        order = np.concatenate([groups[key] for key in sorted(groups)] + [np.zeros(0, dtype=np.int64)])
+        layout = self._build_corpus(
+            corpus.version,
+            np.asarray(corpus.embeddings[corpus.resume_slots(order)], dtype='float32'),
+            [corpus.reference_resumes[row] for row in order]
+        )
+        return self.shared_store.publish(
+            layout,
+            self._get_text,
+            self.embedder.signature,
+            source=self.manifest.get('build_id')
+        )
+    
+    def _check_writable(self):
+        if self.read_only:
+            raise ReadOnlyCorpusError("The reference corpus is a shared build; update it through the corpus builder")
+    
+    @staticmethod
+    def _reference_path(filename: str) -> str:
+        if not REFERENCE_NAME_PATTERN.fullmatch(filename):
+            raise ValueError(f"Invalid reference file name: {filename!r}")
+        return os.path.join(RESUME_DIR, filename)
+    
+    def _sync(self, rebuild: bool) -> Dict:
+        corpus, manifest = self.corpus, self.manifest
+        files, new_names, new_embeddings, new_entries = self._scan_reference_files(manifest['files'])
+        removed = manifest['files'].keys() - files.keys()
+        result = {
+            'added': [name for name in new_names if name not in manifest['files']],
+            'updated': [name for name in new_names if name in manifest['files']],
+            'removed': sorted(removed),
+            'rebuilt': False
+        }
+        
+        if not rebuild and not new_names and not removed:
+            if files != manifest['files']:
+                # Touched but identical content: only the stat records move
+                self._save_delta({**manifest, 'files': files}, corpus, corpus, [])
+            return {**result, 'index_version': corpus.version}
         
-        response = self.anthropic.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=1000,
-            messages=[{"role": "user", "content": prompt}]
+        changed = set(new_names) | removed
+        keep, dropped = [], []
+        for row, resume in enumerate(corpus.reference_resumes):
+            (dropped if resume['filename'] in changed else keep).append(row)
+        known_ids = {resume['filename']: resume['id'] for resume in corpus.reference_resumes}
+        next_id = manifest.get('next_id', 0)
+        
+        new_resumes = []
+        for filename, entry in zip(new_names, new_entries):
+            resume_id = known_ids.get(filename)
+            if resume_id is None:
+                resume_id = f'resume_{next_id}'
+                next_id += 1
+            new_resumes.append({
+                'id': resume_id,
+                'filename': filename,
+                'sha256': files[filename]['sha256'],
+                **entry
+            })
+        
+        version = corpus.version + 1
+        next_corpus = None
+        if not rebuild:
+            next_corpus = self._update_corpus(corpus, version, keep, dropped, new_resumes, new_embeddings)
+        if next_corpus is None:
+            # Compact the kept vectors and append the new ones
+            embeddings = np.vstack([
+                np.asarray(corpus.embeddings[corpus.resume_slots(keep)], dtype='float32'),
+                new_embeddings
+            ])
+            metadata = [corpus.reference_resumes[row] for row in keep] + new_resumes
+            next_corpus = self._build_corpus(version, embeddings, metadata)
+            result['rebuilt'] = True
+        
+        manifest = {
+            **manifest,
+            'files': files,
+            'next_id': next_id,
+            'index': index_settings(),
+            'version': version
+        }
+        if result['rebuilt'] or self.store.deltas >= INDEX_MAX_DELTAS:
+            self.store.save(next_corpus.index, next_corpus.embeddings, next_corpus.reference_resumes, manifest)
+            self.manifest = manifest
+        else:
+            self._save_delta(manifest, corpus, next_corpus, dropped)
+        # Publish: queries starting from here on use the new version
+        self.corpus = next_corpus
+        logger.info(
+            f"Reference index v{version}: {len(result['added'])} added, {len(result['updated'])} updated, "
+            f"{len(result['removed'])} removed{', rebuilt' if result['rebuilt'] else ''}"
         )
+        return {**result, 'index_version': version}
+    
+    def _save_delta(
+        self,
+        manifest: Dict,
+        corpus: ReferenceCorpus,
+        next_corpus: ReferenceCorpus,
+        dropped: List[int]
+    ):
+        """Persist next_corpus (corpus updated in place, without rows dropped) as a delta file; adopt manifest"""
+        previous = self.manifest['files']
+        files = {name: record for name, record in manifest['files'].items() if previous.get(name) != record}
+        files.update((name, None) for name in previous.keys() - manifest['files'].keys())
+        self.store.save_delta(manifest, {
+            'manifest': {
+                **{key: value for key, value in manifest.items() if key not in ('files', 'build_id')},
+                'files': files
+            },
+            'removed_slots': corpus.resume_slots(dropped),
+            'removed_ids': [corpus.reference_resumes[row]['id'] for row in dropped],
+            # New rows and entries come after the existing and kept ones
+            'embeddings': np.asarray(next_corpus.embeddings[len(corpus.embeddings):]),
+            'resumes': next_corpus.reference_resumes[len(corpus.reference_resumes) - len(dropped):],
+            'vectors': next_corpus.index.ntotal,
+            'rows': len(next_corpus.embeddings)
+        })
+        self.manifest = manifest
+    
+    def _update_corpus(
+        self,
+        corpus: ReferenceCorpus,
+        version: int,
+        keep: List[int],
+        dropped: List[int],
+        new_resumes: List[Dict],
+        new_embeddings: np.ndarray
+    ) -> Optional[ReferenceCorpus]:
+        """The next version from removing and adding chunk vectors by id; None when a rebuild is due.
         
-        # Parse response to get embedding
-        # In production, use a proper embedding model
-        embedding_str = response.content[0].text.strip()
-        embedding = [float(x) for x in embedding_str.split(',')[:384]]
+        New chunks get slots after the existing ones and dropped chunks leave
+        their rows behind, so no other resume's slots move and the index,
+        and each touched partition, is only updated where it changed. New
+        rows go to the end of an EmbeddingBuffer the previous version's
+        embeddings are a view of, so only they are copied; after a load or
+        rebuild, the first update copies the rows into a buffer once.
+        """
+        dropped_slots = corpus.resume_slots(dropped)
+        start = len(corpus.embeddings)
+        if corpus.dead_vectors + len(dropped_slots) > REBUILD_DEAD_FRACTION * (start + len(new_embeddings)):
+            return None
+        
+        if self._embedding_buffer is None or self._embedding_buffer.rows is not corpus.embeddings:
+            self._embedding_buffer = EmbeddingBuffer(np.asarray(corpus.embeddings, dtype='float32'))
+        embeddings = self._embedding_buffer.append(new_embeddings)
+        added_slots = np.arange(start, len(embeddings), dtype=np.int64)
+        index = update_index(corpus.index, embeddings, dropped_slots, added_slots)
+        if index is None and self.manifest.get('build_id'):
+            # A memory-mapped index cannot be copied: read a private copy of
+            # the stored one (the same version) and update that instead
+            loaded = self.store.load(self.manifest, mmap=False)
+            if loaded is not None:
+                index = update_index(loaded[0], embeddings, dropped_slots, added_slots, copy=False)
+        if index is None:
+            return None
         
-        # Pad or truncate to ensure consistent dimension
-        if len(embedding) < 384:
-            embedding.extend([0.0] * (384 - len(embedding)))
+        metadata = [corpus.reference_resumes[row] for row in keep] + _place(new_resumes, start)
+        next_corpus = ReferenceCorpus(version, index, embeddings, metadata)
+        next_corpus.sparse_index = self._build_sparse_index(next_corpus)
+        if corpus.partitions is None:
+            next_corpus.partitions = self._build_partitions(next_corpus)
+            return next_corpus
+        
+        removed, added = {}, {}
+        for row in dropped:
+            key = corpus.partitions.key(corpus.reference_resumes[row]['profile'])
+            removed.setdefault(key, []).append(corpus.resume_slots([row]))
+        for row in range(len(keep), len(metadata)):
+            key = corpus.partitions.key(metadata[row]['profile'])
+            added.setdefault(key, []).append(next_corpus.resume_slots([row]))
+        next_corpus.partitions = corpus.partitions.updated(
+            [resume['profile'] for resume in metadata],
+            next_corpus.chunk_starts,
+            next_corpus.chunk_ends,
+            embeddings,
+            removed,
+            added
+        )
+        return next_corpus
+    
+    def _build_corpus(self, version: int, embeddings: np.ndarray, metadata: List[Dict]) -> ReferenceCorpus:
+        """A corpus built from scratch, resumes' chunks laid out in order (for IVF modes, trained)"""
+        index = build_index(embeddings, ids=np.arange(len(embeddings), dtype=np.int64))
+        corpus = ReferenceCorpus(version, index, embeddings, _place(metadata, 0))
+        self._derive_indexes(corpus)
+        return corpus
+    
+    def _derive_indexes(self, corpus: ReferenceCorpus):
+        """Build the BM25 index and the partitions, which are not persisted"""
+        corpus.sparse_index = self._build_sparse_index(corpus)
+        corpus.partitions = self._build_partitions(corpus)
+    
+    def _iter_reference_files(self, chunk_size: int = LOAD_CHUNK_SIZE) -> Iterator[List[os.DirEntry]]:
+        """Yield the corpus directory in name-ordered chunks without reading any file"""
+        with os.scandir(RESUME_DIR) as entries:
+            files = sorted(
+                (entry for entry in entries if entry.is_file() and not entry.name.startswith('.')),
+                key=lambda entry: entry.name
+            )
         
-        return np.array(embedding[:384])
+        for start in range(0, len(files), chunk_size):
+            yield files[start:start + chunk_size]
+    
+    def _scan_reference_files(
+        self,
+        known: Dict[str, Dict]
+    ) -> Tuple[Dict[str, Dict], List[str], np.ndarray, List[Dict]]:
+        """Stat the reference corpus, reading and hashing only files whose size or mtime moved.
+        
+        Added or changed files are chunked and profiled, and the chunks of a
+        whole batch of files embedded in one call, so at most a batch of
+        resume text is held in memory. Returns the new manifest records, the
+        names of the re-processed files, their chunk embeddings (in file
+        order) and their {'profile', 'chunk_index'} metadata.
+        """
+        files, new_names, new_embeddings, new_entries = {}, [], [], []
+        
+        for chunk in self._iter_reference_files():
+            texts = []
+            for entry in chunk:
+                stat = entry.stat()
+                previous = known.get(entry.name)
+                if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+                    files[entry.name] = previous
+                    continue
+                
+                with open(entry.path, 'r') as f:
+                    text = f.read()
+                sha256 = hashlib.sha256(text.encode('utf-8')).hexdigest()
+                if not previous or previous['sha256'] != sha256:
+                    chunk_index = self._build_chunk_index(text)
+                    new_names.append(entry.name)
+                    new_entries.append({'profile': extract_profile(text), 'chunk_index': chunk_index})
+                    texts.extend(chunk_index['texts'])
+                files[entry.name] = {
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'sha256': sha256
+                }
+            
+            if texts:
+                new_embeddings.append(self._generate_embeddings(texts))
+        
+        if not new_embeddings:
+            new_embeddings = [np.zeros((0, self.embedder.dimension), dtype='float32')]
+        return files, new_names, np.vstack(new_embeddings), new_entries
+    
+    def _build_chunk_index(self, text: str) -> Dict:
+        """Split one reference resume into the chunks that are embedded and returned.
+        
+        Chunks are the resume's lines as ResumeParser sections them, long
+        ones wrapped at MAX_CHUNK_CHARS, so no part of the text is left out.
+        Each gets its relevant_sections category, and every word n-gram maps
+        to the ids of the chunks containing it, so keyword matches are
+        dictionary lookups.
+        """
+        texts, sections, postings = [], [], {}
+        
+        for chunk in self.parser.chunk(text):
+            category = _chunk_category(chunk)
+            for piece in textwrap.wrap(chunk['text'], MAX_CHUNK_CHARS):
+                chunk_id = len(texts)
+                texts.append(piece)
+                sections.append(category)
+                for term in term_set(piece):
+                    postings.setdefault(term, []).append(chunk_id)
+        
+        return {'texts': texts, 'sections': sections, 'postings': postings}
+    
+    def _build_sparse_index(self, corpus: ReferenceCorpus) -> Optional[BM25Index]:
+        """BM25 over the reference corpus, built from the stored chunk postings.
+        
+        A term's frequency in a resume is the number of chunks containing
+        it, so no text is re-read and the index is never persisted.
+        """
+        if not HYBRID_SEARCH:
+            return None
+        return BM25Index.build([
+            {term: len(chunk_ids) for term, chunk_ids in resume['chunk_index']['postings'].items()}
+            for resume in corpus.reference_resumes
+        ])
+    
+    def _build_partitions(self, corpus: ReferenceCorpus) -> Optional[PartitionIndex]:
+        """Per-partition chunk indexes over PARTITION_FIELDS, built from the stored profiles.
+        
+        Like the BM25 index they are derived at load time and not persisted,
+        so changing RAG_PARTITION_FIELDS needs no re-embedding.
+        """
+        if not PARTITION_FIELDS:
+            return None
+        return PartitionIndex.build(
+            PARTITION_FIELDS,
+            [resume['profile'] for resume in corpus.reference_resumes],
+            corpus.chunk_starts,
+            corpus.chunk_ends,
+            corpus.embeddings
+        )
+    
+    def _get_text(self, resume: Dict) -> str:
+        """Text of a reference resume, loaded lazily from the corpus directory"""
+        if 'text' in resume:
+            # Shared builds carry the text
+            return resume['text']
+        try:
+            return _read_reference_text(resume['filename'], resume['sha256'])
+        except FileNotFoundError:
+            # Deleted while a query on the previous version was running
+            return ''
+    
+    def _generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts with the local embedder"""
+        if not texts:
+            return np.zeros((0, self.embedder.dimension), dtype='float32')
+        return self.embedder.embed(texts)
+    
+    async def _generate_embedding(self, text: str) -> np.ndarray:
+        """Embed a single query text (cached by content hash)"""
+        async def compute() -> np.ndarray:
+            return self._generate_embeddings([text])[0]
+        
+        return await self.cache.aget_or_compute('embedding', self.embedder.signature, (text,), compute)
     
     async def find_similar_resumes(
-        self, 
-        parsed_resume: ParsedResume, 
+        self,
+        parsed_resume: ParsedResume,
         parsed_jd: ParsedJobDescription,
-        k: int = 3
+        k: int = 3,
+        corpus: Optional[ReferenceCorpus] = None,
+        relax_filters: bool = False
     ) -> List[Dict]:
-        """Find k most similar resumes using FAISS"""
+        """Find k most similar resumes by their best-matching chunks, fused with BM25 over the JD keywords.
+        
+        Only resumes in the partitions matching the JD's profile are searched,
+        so fewer than k may come back; ``relax_filters`` allows widening the
+        filter instead (see _select_partitions), and every result lists the
+        fields dropped under 'relaxed_filters'. Pass ``corpus`` (e.g.
+        ``self.corpus`` read earlier) to know which index version answered;
+        by default the current one is used.
+        """
+        if corpus is None:
+            corpus = self.corpus
+        if not corpus.index.ntotal:
+            return []
+        partitions, relaxed = self._select_partitions(corpus, parsed_jd, k, relax_filters)
+        if partitions == []:
+            return []
+        
         # Create query embedding combining resume and JD
-        query_text = self._create_query_text(parsed_resume, parsed_jd)
-        query_embedding = await self._generate_embedding(query_text)
+        with self.metrics.stage('rag_embed'):
+            query_text = self._create_query_text(parsed_resume, parsed_jd)
+            query_embedding = await self._generate_embedding(query_text)
         
         # Search in FAISS
-        distances, indices = self.index.search(
-            np.array([query_embedding]).astype('float32'), 
-            k
+        # FAISS releases the GIL, so large searches overlap with the event loop in a thread
+        with self.metrics.stage('rag_search'):
+            indices = await self.executors.run_in_thread(
+                self._search_chunks,
+                corpus,
+                query_embedding.reshape(1, -1),
+                self._chunk_search_depth(corpus, k),
+                partitions,
+                inline=self._searched_vectors(corpus, partitions) <= EXECUTOR_INLINE_MAX_VECTORS
+            )
+        
+        sparse_ids = None
+        if corpus.sparse_index is not None:
+            with self.metrics.stage('rag_sparse'):
+                sparse_ids = self._search_sparse(corpus, parsed_jd, k, partitions)
+        with self.metrics.stage('rag_sections'):
+            rows = self._rank_resumes(corpus, indices[0], sparse_ids, k)
+            return self._collect_similar(corpus, rows, query_embedding, parsed_jd.keywords, relaxed)
+    
+    async def find_similar_resumes_batch(
+        self,
+        parsed_resumes: List[ParsedResume],
+        parsed_jd: ParsedJobDescription,
+        k: int = 3,
+        corpus: Optional[ReferenceCorpus] = None,
+        relax_filters: bool = False
+    ) -> List[List[Dict]]:
+        """find_similar_resumes for many resumes: one embedding call and one FAISS search"""
+        if corpus is None:
+            corpus = self.corpus
+        if not corpus.index.ntotal or not parsed_resumes:
+            return [[] for _ in parsed_resumes]
+        # The partitions and the sparse query only depend on the JD, so they serve every resume
+        partitions, relaxed = self._select_partitions(corpus, parsed_jd, k, relax_filters)
+        if partitions == []:
+            return [[] for _ in parsed_resumes]
+        
+        with self.metrics.stage('rag_embed'):
+            query_embeddings = await self.executors.run_in_thread(
+                self._generate_embeddings,
+                [self._create_query_text(parsed_resume, parsed_jd) for parsed_resume in parsed_resumes],
+                inline=len(parsed_resumes) == 1
+            )
+        with self.metrics.stage('rag_search'):
+            indices = await self.executors.run_in_thread(
+                self._search_chunks,
+                corpus,
+                query_embeddings,
+                self._chunk_search_depth(corpus, k),
+                partitions,
+                inline=len(parsed_resumes) * self._searched_vectors(corpus, partitions) <= EXECUTOR_INLINE_MAX_VECTORS
+            )
+        
+        sparse_ids = None
+        if corpus.sparse_index is not None:
+            with self.metrics.stage('rag_sparse'):
+                sparse_ids = self._search_sparse(corpus, parsed_jd, k, partitions)
+        with self.metrics.stage('rag_sections'):
+            return [
+                self._collect_similar(
+                    corpus,
+                    self._rank_resumes(corpus, row_indices, sparse_ids, k),
+                    query_embedding,
+                    parsed_jd.keywords,
+                    relaxed
+                )
+                for query_embedding, row_indices in zip(query_embeddings, indices)
+            ]
+    
+    def _select_partitions(
+        self,
+        corpus: ReferenceCorpus,
+        parsed_jd: ParsedJobDescription,
+        k: int,
+        relax: bool = False
+    ) -> Tuple[Optional[List[Partition]], List[str]]:
+        """Partitions matching the JD's profile (None: the whole corpus), and the fields relaxed.
+        
+        Fields the JD gives no evidence for are not filtered on. A rare
+        combination yields fewer than k resumes, or none, unless ``relax``
+        is set: then, while the matching partitions hold fewer than k
+        resumes, the last remaining field is dropped (seniority before role
+        family by default) and reported. The full index serves a filter that
+        keeps every resume.
+        """
+        if corpus.partitions is None:
+            return None, []
+        fields = [field for field in PARTITION_FIELDS if parsed_jd.profile.get(field, UNKNOWN) != UNKNOWN]
+        relaxed = []
+        while fields:
+            selected = corpus.partitions.select({field: parsed_jd.profile[field] for field in fields})
+            resumes = sum(len(partition.rows) for partition in selected)
+            if resumes == len(corpus.reference_resumes):
+                return None, relaxed
+            if resumes >= k or not relax:
+                return selected, relaxed
+            relaxed.insert(0, fields.pop())
+        return None, relaxed
+    
+    def _search_chunks(
+        self,
+        corpus: ReferenceCorpus,
+        queries: np.ndarray,
+        depth: int,
+        partitions: Optional[List[Partition]]
+    ) -> np.ndarray:
+        """Slots of the depth nearest chunks per query, in the given partitions or the full index"""
+        if partitions is None:
+            return corpus.index.search(queries, depth)[1]
+        return PartitionIndex.search(partitions, queries, depth)[1]
+    
+    def _searched_vectors(self, corpus: ReferenceCorpus, partitions: Optional[List[Partition]]) -> int:
+        if partitions is None:
+            return corpus.index.ntotal
+        return sum(partition.index.ntotal for partition in partitions)
+    
+    def _search_depth(self, corpus: ReferenceCorpus, k: int) -> int:
+        """Resumes to rank by embedding: the fusion depth when hybrid, else just k"""
+        return max(k, CANDIDATE_DEPTH) if corpus.sparse_index is not None else k
+    
+    def _chunk_search_depth(self, corpus: ReferenceCorpus, k: int) -> int:
+        """Chunk hits to fetch so that enough distinct resumes come back"""
+        return min(self._search_depth(corpus, k) * CHUNK_SEARCH_FACTOR, corpus.index.ntotal)
+    
+    def _dense_ranking(self, corpus: ReferenceCorpus, chunk_ids: np.ndarray) -> np.ndarray:
+        """Resume rows in order of their best chunk hit (max-sim), from hits sorted by distance"""
+        rows = corpus.slot_resume[chunk_ids[chunk_ids >= 0]]
+        _, first_hit = np.unique(rows, return_index=True)
+        return rows[np.sort(first_hit)]
+    
+    def _search_sparse(
+        self,
+        corpus: ReferenceCorpus,
+        parsed_jd: ParsedJobDescription,
+        k: int,
+        partitions: Optional[List[Partition]] = None
+    ) -> np.ndarray:
+        """Reference rows ranked by BM25 over the JD keywords, to the fusion depth, within the partitions"""
+        rows = None
+        if partitions is not None:
+            rows = np.concatenate([partition.rows for partition in partitions])
+        ids, _ = corpus.sparse_index.search(
+            (normalize_term(keyword) for keyword in parsed_jd.keywords),
+            max(k, CANDIDATE_DEPTH),
+            rows
         )
+        return ids
+    
+    def _rank_resumes(
+        self,
+        corpus: ReferenceCorpus,
+        chunk_ids: np.ndarray,
+        sparse_ids: Optional[np.ndarray],
+        k: int
+    ) -> np.ndarray:
+        """Top-k resume rows: max-sim order, fused with the BM25 ranking when there is one"""
+        dense = self._dense_ranking(corpus, chunk_ids)[:self._search_depth(corpus, k)]
+        if sparse_ids is None:
+            return dense[:k]
+        return np.array(
+            reciprocal_rank_fusion([dense.tolist(), sparse_ids.tolist()], k, RRF_K),
+            dtype=np.int64
+        )
+    
+    def _collect_similar(
+        self,
+        corpus: ReferenceCorpus,
+        rows: np.ndarray,
+        query_embedding: np.ndarray,
+        keywords: List[str],
+        relaxed_filters: List[str]
+    ) -> List[Dict]:
+        """Similar resumes with their max-sim score and best-matching chunks.
         
-        # Return similar resumes with scores
+        Every chunk of a returned resume is scored exactly against the query,
+        so the score and bullets do not depend on how deep FAISS searched or
+        on an approximate index's distances.
+        """
         similar_resumes = []
-        for idx, distance in zip(indices[0], distances[0]):
+        for row in rows:
+            resume = corpus.reference_resumes[row]
+            chunk_vectors = np.asarray(
+                corpus.embeddings[corpus.chunk_starts[row]:corpus.chunk_ends[row]],
+                dtype='float32'
+            )
+            difference = chunk_vectors - query_embedding
+            distances = np.einsum('ij,ij->i', difference, difference)
             similar_resumes.append({
-                'resume': self.reference_resumes[idx],
-                'similarity_score': 1 / (1 + distance),  # Convert distance to similarity
+                'resume': {
+                    'id': resume['id'],
+                    'filename': resume['filename'],
+                    'profile': resume['profile'],
+                    'text': self._get_text(resume)
+                },
+                # Convert the best chunk's distance to similarity
+                'similarity_score': 1 / (1 + distances.min()) if len(distances) else 0.0,
                 'relevant_sections': self._extract_relevant_sections(
-                    self.reference_resumes[idx]['text'],
-                    parsed_jd.keywords
-                )
+                    resume['chunk_index'],
+                    distances,
+                    keywords
+                ),
+                'relaxed_filters': relaxed_filters
             })
         
         return similar_resumes
     
     def _create_query_text(
-        self, 
-        resume: ParsedResume, 
+        self,
+        resume: ParsedResume,
         jd: ParsedJobDescription
     ) -> str:
-        """Create query text combining resume and JD for embedding"""
+        """Create query text combining resume and JD for embedding.
+        
+        It is matched against single lines, so it describes what a useful
+        line holds: the candidate's skills and the role's requirements. The
+        candidate's own bullets are left out, as they would pull in
+        reference bullets that share only their phrasing.
+        """
         skills = ' '.join(resume.skills)
-        projects = ' '.join([p['description'] for p in resume.projects[:3]])
         jd_keywords = ' '.join(jd.keywords)
         required_skills = ' '.join(jd.required_skills)
         
         return f"""
         Current Skills: {skills}
-        Projects: {projects}
         Target Role Requirements: {required_skills}
         Key Technologies: {jd_keywords}
         """
     
     def _extract_relevant_sections(
-        self, 
-        resume_text: str, 
+        self,
+        chunk_index: Dict,
+        distances: np.ndarray,
         keywords: List[str]
     ) -> Dict[str, List[str]]:
-        """Extract sections from reference resume relevant to JD keywords"""
+        """Extract sections from reference resume relevant to the query and JD keywords.
+        
+        relevant_projects are the best-matching bullets: those containing a
+        JD keyword first, each group closest to the query embedding first.
+        Skill and other lines are those containing a keyword, in resume order.
+        """
         relevant_sections = {
             'matching_skills': [],
             'relevant_projects': [],
             'useful_patterns': []
         }
+        texts, sections = chunk_index['texts'], chunk_index['sections']
+        
+        # Chunks containing any keyword, straight from the precomputed postings
+        postings = chunk_index['postings']
+        matched = set()
+        for keyword in keywords:
+            matched.update(postings.get(normalize_term(keyword), ()))
+        
+        bullets = [chunk_id for chunk_id, section in enumerate(sections) if section == 'relevant_projects']
+        bullets.sort(key=lambda chunk_id: (chunk_id not in matched, distances[chunk_id]))
+        relevant_sections['relevant_projects'] = [texts[chunk_id] for chunk_id in bullets[:MATCHING_BULLETS]]
+        
+        for chunk_id in sorted(matched):
+            if sections[chunk_id] != 'relevant_projects':
+                relevant_sections[sections[chunk_id]].append(texts[chunk_id])
         
-        lines = resume_text.split('\n')
-        
-        for line in lines:
-            line_lower = line.lower()
-            # Check if line contains relevant keywords
-            for keyword in keywords:
-                if keyword.lower() in line_lower:
-                    if any(indicator in line_lower for indicator in ['built', 'developed', 'created', 'implemented']):
-                        relevant_sections['relevant_projects'].append(line.strip())
-                    elif any(indicator in line_lower for indicator in ['skills', 'technologies', 'tools']):
-                        relevant_sections['matching_skills'].append(line.strip())
-                    else:
-                        relevant_sections['useful_patterns'].append(line.strip())
-                    break
-        
-        return relevant_sections
\ No newline at end of file
+        return relevant_sections
@@ -0,0 +1,118 @@
+import os
+import numpy as np
+from typing import List, Optional, Sequence
+from app.models import ParsedResume, ParsedJobDescription, RankedCandidate
+from app.services.analyzer import GapAnalyzer
+from app.services.cache import ContentCache
+from app.services.embedder import Embedder, create_embedder
+from app.services.metrics import get_metrics
+from app.services.parser import ResumeParser, JobDescriptionParser
+
+# Relative weights of the score components; normalized to sum to 1
+RANK_WEIGHT_SKILLS = float(os.getenv("RANK_WEIGHT_SKILLS", "0.5"))
+RANK_WEIGHT_KEYWORDS = float(os.getenv("RANK_WEIGHT_KEYWORDS", "0.3"))
+RANK_WEIGHT_SIMILARITY = float(os.getenv("RANK_WEIGHT_SIMILARITY", "0.2"))
+
+# Only the head of each candidate resume is embedded
+MAX_EMBED_CHARS = 2000
+
+# Candidate parses, term sets and embeddings go to a cache of their own, in
+# process: one bulk request would otherwise evict the shared cache's hot
+# /enhance entries. Three items per resume, ~9KB together; 0 disables it
+RANK_CACHE_ITEMS = int(os.getenv("RANK_CACHE_ITEMS", "15000"))
+
+class RankingEngine:
+    """Shortlists resumes for a job description without calling the LLM.
+
+    Every resume gets three 0-100 components, computed for the whole batch
+    at once: required/preferred skill match and JD keyword coverage from
+    GapAnalyzer.score_batch, and cosine similarity between resume and JD
+    embeddings (one matrix-vector product). The weighted sum is ranked with
+    a partial sort, so only the top k are ever ordered.
+
+    Only the job description is parsed through the given jd_parser; by
+    default everything cached per candidate stays in ``self.cache``.
+    """
+
+    def __init__(
+        self,
+        resume_parser: Optional[ResumeParser] = None,
+        jd_parser: Optional[JobDescriptionParser] = None,
+        gap_analyzer: Optional[GapAnalyzer] = None,
+        embedder: Optional[Embedder] = None,
+        cache: Optional[ContentCache] = None
+    ):
+        self.cache = cache or ContentCache(redis_url="", max_items=RANK_CACHE_ITEMS)
+        self.resume_parser = resume_parser or ResumeParser(self.cache)
+        self.jd_parser = jd_parser or JobDescriptionParser()
+        self.gap_analyzer = gap_analyzer or GapAnalyzer(cache=self.cache)
+        self.embedder = embedder or create_embedder()
+        self.metrics = get_metrics()
+
+        weights = np.array([RANK_WEIGHT_SKILLS, RANK_WEIGHT_KEYWORDS, RANK_WEIGHT_SIMILARITY])
+        self.weights = weights / weights.sum()
+
+    def rank(self, resume_texts: Sequence[str], job_description: str, top_k: int = 10) -> List[RankedCandidate]:
+        """Top k resumes for the job description, best first"""
+        with self.metrics.stage('rank_parse'):
+            parsed_jd = self.jd_parser.parse(job_description)
+            parsed_resumes = self.resume_parser.parse_many(resume_texts)
+        return self.rank_parsed(parsed_resumes, resume_texts, parsed_jd, job_description, top_k)
+
+    def rank_parsed(
+        self,
+        parsed_resumes: Sequence[ParsedResume],
+        resume_texts: Sequence[str],
+        parsed_jd: ParsedJobDescription,
+        job_description: str,
+        top_k: int = 10
+    ) -> List[RankedCandidate]:
+        """rank() for inputs that are already parsed"""
+        if not parsed_resumes or top_k <= 0:
+            return []
+
+        with self.metrics.stage('rank_skills'):
+            skill_scores = self.gap_analyzer.score_batch(parsed_resumes, parsed_jd)
+
+        # Embeddings are L2-normalized, so the dot product is the cosine
+        with self.metrics.stage('rank_embed'):
+            resume_embeddings = np.vstack(self._embed(resume_texts))
+            jd_embedding = self._embed([job_description])[0]
+            similarity = np.clip(resume_embeddings @ jd_embedding, 0, 1) * 100
+
+        # n x 3 component matrix, one weighted sum per row
+        components = np.column_stack([
+            skill_scores['match_percentage'],
+            skill_scores['keyword_coverage'],
+            similarity
+        ])
+        scores = components @ self.weights
+
+        # Partial sort: select the top k in O(n), then order just those
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(k)
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        return [
+            RankedCandidate(
+                index=int(index),
+                score=round(float(scores[index]), 2),
+                skill_match=round(float(components[index, 0]), 1),
+                keyword_coverage=round(float(components[index, 1]), 1),
+                similarity=round(float(components[index, 2]), 1)
+            )
+            for index in top
+        ]
+
+    def _embed(self, texts: Sequence[str]) -> List[np.ndarray]:
+        """Embeddings of texts, cached by content hash; misses are embedded in one call"""
+        return self.cache.get_or_compute_many(
+            'embedding',
+            f"{self.embedder.signature}:{MAX_EMBED_CHARS}",
+            [(text,) for text in texts],
+            # Copy rows so a cached vector does not keep the whole batch matrix alive
+            lambda missing: [
+                row.copy()
+                for row in self.embedder.embed([texts[position][:MAX_EMBED_CHARS] for position in missing])
+            ]
+        )
@@ -0,0 +1,89 @@
+from typing import Dict, List, Optional
+import faiss
+import numpy as np
+from app.services.partitions import PartitionIndex, chunk_slots
+from app.services.sparse_index import BM25Index
+
+class ReferenceCorpus:
+    """One version of the reference index and everything derived from it.
+
+    Chunk vectors live in ``embeddings`` and the FAISS index is ID-mapped
+    with their row numbers ("slots"), so updates can add and remove
+    vectors by id. A resume's chunks take a contiguous range of slots;
+    removed chunks leave their rows behind until the next full rebuild.
+
+    A corpus is not modified once the engine publishes it. Queries take the
+    current one once and use only it, while updates build the next version
+    on the side and publish it with one assignment, so a query never sees
+    an index that is half updated or mixes two versions.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        index: faiss.Index,
+        embeddings: np.ndarray,
+        metadata: List[Dict],
+        sparse_index: Optional[BM25Index] = None,
+        partitions: Optional[PartitionIndex] = None,
+        chunk_starts: Optional[np.ndarray] = None,
+        chunk_ends: Optional[np.ndarray] = None
+    ):
+        self.version = version
+        self.index = index
+        self.embeddings = embeddings
+        # [{'id', 'filename', 'sha256', 'profile', 'chunk_start', 'chunk_index'}],
+        # or a PackedMetadata table giving the same entries
+        self.reference_resumes = metadata
+        # Slots of resume row r are chunk_starts[r]:chunk_ends[r]; slot_resume
+        # maps a slot back to its row, -1 for removed chunks
+        if chunk_starts is None:
+            chunk_starts = np.array([resume['chunk_start'] for resume in metadata], dtype=np.int64)
+            chunk_ends = chunk_starts + np.array(
+                [len(resume['chunk_index']['texts']) for resume in metadata],
+                dtype=np.int64
+            )
+        self.chunk_starts = chunk_starts
+        self.chunk_ends = chunk_ends
+        self.slot_resume = np.full(len(embeddings), -1, dtype=np.int32)
+        self.slot_resume[chunk_slots(self.chunk_starts, self.chunk_ends)] = np.repeat(
+            np.arange(len(metadata), dtype=np.int32),
+            self.chunk_ends - self.chunk_starts
+        )
+        self.sparse_index = sparse_index
+        self.partitions = partitions
+
+    @property
+    def dead_vectors(self) -> int:
+        """Embedding rows of removed chunks, reclaimed by a rebuild"""
+        return len(self.embeddings) - self.index.ntotal
+
+    def resume_slots(self, rows) -> np.ndarray:
+        """Slots of the chunks of the given resume rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        return chunk_slots(self.chunk_starts[rows], self.chunk_ends[rows])
+
+class EmbeddingBuffer:
+    """Append-only float32 rows with spare capacity behind them.
+
+    ``append`` copies just the new rows and returns a view of all rows so
+    far. Rows are never written twice, so views handed out earlier (the
+    embeddings of published corpora) stay valid and unchanged. When the
+    capacity runs out, the rows move to a buffer twice the size, which
+    keeps appending amortized O(rows added).
+    """
+
+    def __init__(self, rows: np.ndarray):
+        self._data = np.empty((max(2 * len(rows), 1024), rows.shape[1]), dtype='float32')
+        self._data[:len(rows)] = rows
+        self.rows = self._data[:len(rows)]
+
+    def append(self, rows: np.ndarray) -> np.ndarray:
+        start, end = len(self.rows), len(self.rows) + len(rows)
+        if end > len(self._data):
+            data = np.empty((2 * end, self._data.shape[1]), dtype='float32')
+            data[:start] = self.rows
+            self._data = data
+        self._data[start:end] = rows
+        self.rows = self._data[:end]
+        return self.rows
@@ -0,0 +1,122 @@
+import asyncio
+import math
+import os
+import re
+from typing import Dict, List, Optional, Set
+from app.models import ParsedJobDescription, ParsedResume
+from app.services.prompts import BulletPrompt, estimate_tokens
+from app.utils.keywords import get_tech_keyword_matcher, normalize_keyword
+
+# Estimated tokens (prompt plus maximum output) the bullets of one request may use
+ENHANCE_TOKEN_BUDGET = int(os.getenv("ENHANCE_TOKEN_BUDGET", "8000"))
+# Seconds the bullets of one request may take; unfinished ones keep their text (0: no limit)
+ENHANCE_LATENCY_BUDGET = float(os.getenv("ENHANCE_LATENCY_BUDGET", "15"))
+# Output tokens allowed per enhanced bullet
+BULLET_MAX_TOKENS = 150
+# Cache reads of the shared prefix are billed at a tenth of the input price
+CACHE_READ_COST = 0.1
+
+BULLET_SECTIONS = ('projects', 'experience')
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*")
+
+class BulletPlan:
+    """The bullets of one resume and which of them to enhance.
+
+    ``bullets`` holds every project and experience bullet in resume order as
+    {'section', 'text'} dicts; ``order`` lists the indices to enhance,
+    highest expected impact first. The rest are returned unmodified.
+    """
+
+    def __init__(self, bullets: List[Dict[str, str]], order: List[int], estimated_tokens: int):
+        self.bullets = bullets
+        self.order = order
+        self.estimated_tokens = estimated_tokens
+
+class BulletScheduler:
+    """Chooses which bullets get an LLM call within a request's budgets.
+
+    Bullets are ranked by how much the JD gap can be closed through them:
+    missing skills and keywords that share a word with the bullet count
+    double, JD terms it already mentions (so new ones fit naturally) once;
+    ties keep resume order. They are then taken greedily in that order while
+    their estimated prompt and output tokens fit the token budget. The
+    latency budget is a deadline the enhancer applies to the calls.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = ENHANCE_TOKEN_BUDGET,
+        latency_budget: float = ENHANCE_LATENCY_BUDGET
+    ):
+        self.token_budget = token_budget
+        self.latency_budget = latency_budget
+        self.keyword_matcher = get_tech_keyword_matcher()
+
+    def deadline(self) -> Optional[float]:
+        """Event loop time by which the bullets of a request starting now must finish"""
+        if self.latency_budget <= 0:
+            return None
+        return asyncio.get_running_loop().time() + self.latency_budget
+
+    def plan(
+        self,
+        parsed_resume: ParsedResume,
+        parsed_jd: ParsedJobDescription,
+        gaps: Dict,
+        prompt: BulletPrompt,
+        batched: bool = False
+    ) -> BulletPlan:
+        """Bullets of the resume, with those worth enhancing in priority order"""
+        bullets = [
+            {'section': section, 'text': entry['description']}
+            for section in BULLET_SECTIONS
+            for entry in getattr(parsed_resume, section)
+        ]
+
+        jd_terms = {
+            normalize_keyword(term)
+            for term in parsed_jd.required_skills + parsed_jd.preferred_skills + parsed_jd.keywords
+        }
+        # Word -> missing terms containing it, so a bullet costs one lookup per word
+        missing_terms: Dict[str, Set[int]] = {}
+        for term_id, term in enumerate(
+            gaps.get('missing_skills', [])
+            + gaps.get('missing_preferred', [])
+            + gaps.get('keyword_coverage', {}).get('missing_keywords', [])
+        ):
+            for word in WORD_PATTERN.findall(normalize_keyword(term)):
+                if len(word) > 3:
+                    missing_terms.setdefault(word, set()).add(term_id)
+        impact = [self._impact(bullet['text'], jd_terms, missing_terms) for bullet in bullets]
+        ranked = sorted(range(len(bullets)), key=lambda index: -impact[index])
+
+        # Batched mode pays for the shared prefix once; per-bullet calls each
+        # send it, at the cache-read price after the first when cacheable
+        spent = prompt.prefix_tokens + estimate_tokens(prompt.batch_message([])) if batched else 0
+        order = []
+        for index in ranked:
+            text = bullets[index]['text']
+            if batched:
+                cost = estimate_tokens(f"{index}: {text}\n") + BULLET_MAX_TOKENS
+            else:
+                prefix = prompt.prefix_tokens
+                if order and prompt.cacheable:
+                    prefix = math.ceil(prefix * CACHE_READ_COST)
+                cost = prefix + estimate_tokens(prompt.user_message(text)) + BULLET_MAX_TOKENS
+
+            # A cheaper, lower-priority bullet may still fit after one that does not
+            if spent + cost <= self.token_budget:
+                order.append(index)
+                spent += cost
+
+        return BulletPlan(bullets, order, spent if order else 0)
+
+    def _impact(self, text: str, jd_terms: Set[str], missing_terms: Dict[str, Set[int]]) -> int:
+        """Expected gain from enhancing one bullet"""
+        # Missing terms the bullet is about, e.g. "distributed systems" for a bullet on distributed caching
+        matched = set()
+        for word in set(WORD_PATTERN.findall(text.lower())):
+            matched.update(missing_terms.get(word, ()))
+        missing = len(matched)
+        mentioned = len(jd_terms.intersection(self.keyword_matcher.find_set(text)))
+        return 2 * missing + mentioned
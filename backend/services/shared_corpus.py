@@ -0,0 +1,333 @@
+import json
+import os
+import shutil
+import uuid
+from collections.abc import Sequence
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import faiss
+import numpy as np
+from app.services.index_factory import MappedFlatIndex, configure_search, is_flat
+from app.services.partitions import Partition, PartitionIndex
+from app.services.reference_corpus import ReferenceCorpus
+from app.services.sparse_index import BM25Index, TermTable
+from app.utils.profiles import PROFILE_FIELDS, UNKNOWN
+
+SHARED_DIR = os.getenv("RAG_SHARED_DIR", "app/data/shared")
+# Builds kept on disk, the current one included; a worker still mapping
+# an older one keeps serving it until it reloads
+KEEP_BUILDS = int(os.getenv("RAG_SHARED_KEEP_BUILDS", "2"))
+
+# Chunk categories, stored as their position here
+SECTIONS = ('matching_skills', 'relevant_projects', 'useful_patterns')
+# Strings stored per resume, in this order
+RESUME_FIELDS = ('id', 'filename', 'sha256')
+
+class TextStore:
+    """Strings packed end to end in one UTF-8 file; string i is bytes offsets[i]:offsets[i + 1]"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def open(cls, path: str) -> 'TextStore':
+        offsets = np.load(f"{path}.offsets.npy", mmap_mode='r')
+        # numpy cannot map an empty file
+        if not offsets[-1]:
+            return cls(np.zeros(0, dtype=np.uint8), offsets)
+        return cls(np.memmap(f"{path}.bin", dtype=np.uint8, mode='r'), offsets)
+
+    @staticmethod
+    def write(path: str, strings: Iterable[str]):
+        offsets = [0]
+        with open(f"{path}.bin", 'wb') as f:
+            for string in strings:
+                encoded = string.encode('utf-8')
+                f.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+        np.save(f"{path}.offsets.npy", np.array(offsets, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+class ResumePostings:
+    """One resume's term -> chunk ids postings, looked up in the packed arrays"""
+
+    def __init__(self, terms: TermTable, term_ids: np.ndarray, chunk_ids: np.ndarray):
+        # Sorted by term id, then chunk id
+        self.terms = terms
+        self.term_ids = term_ids
+        self.chunk_ids = chunk_ids
+
+    def get(self, term: str, default=()):
+        term_id = self.terms.get(term)
+        if term_id is None:
+            return default
+        start, end = np.searchsorted(self.term_ids, [term_id, term_id + 1])
+        return self.chunk_ids[start:end].tolist() if end > start else default
+
+class PackedMetadata(Sequence):
+    """The reference_resumes table of a shared build, read from memory-mapped arrays.
+
+    Indexing builds one resume's entry, with the keys of the engine's
+    metadata dicts plus 'text', so only the resumes a query returns are
+    turned into Python objects.
+    """
+
+    def __init__(self, directory: str, profile_values: Dict[str, List[str]], terms: TermTable):
+        self.chunk_starts = _load(directory, 'chunk_starts.npy')
+        self.chunk_ends = _load(directory, 'chunk_ends.npy')
+        self.sections = _load(directory, 'chunk_sections.npy')
+        self.profiles = _load(directory, 'profiles.npy')
+        self.posting_offsets = _load(directory, 'posting_offsets.npy')
+        self.posting_terms = _load(directory, 'posting_terms.npy')
+        self.posting_chunks = _load(directory, 'posting_chunks.npy')
+        self.chunks = TextStore.open(os.path.join(directory, 'chunks'))
+        self.texts = TextStore.open(os.path.join(directory, 'texts'))
+        self.fields = TextStore.open(os.path.join(directory, 'resume_fields'))
+        self.profile_values = profile_values
+        self.terms = terms
+
+    def __len__(self) -> int:
+        return len(self.chunk_starts)
+
+    def __getitem__(self, row: int) -> Dict:
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        start, end = int(self.chunk_starts[row]), int(self.chunk_ends[row])
+        postings = slice(self.posting_offsets[row], self.posting_offsets[row + 1])
+        return {
+            **{
+                field: self.fields[row * len(RESUME_FIELDS) + position]
+                for position, field in enumerate(RESUME_FIELDS)
+            },
+            'profile': {
+                field: self.profile_values[field][code]
+                for field, code in zip(PROFILE_FIELDS, self.profiles[row])
+            },
+            'chunk_start': start,
+            'chunk_index': {
+                'texts': [self.chunks[slot] for slot in range(start, end)],
+                'sections': [SECTIONS[code] for code in self.sections[start:end]],
+                'postings': ResumePostings(self.terms, self.posting_terms[postings], self.posting_chunks[postings])
+            },
+            'text': self.texts[row]
+        }
+
+class SharedCorpusStore:
+    """Read-only builds of the reference corpus that any number of processes memory-map.
+
+    A builder process writes each version to its own directory under
+    ``builds`` and then points ``current.json`` at it, so a build is never
+    changed once readers can see it. It holds everything queries read as
+    flat arrays and packed text: embeddings, chunk texts and sections,
+    resume texts and profiles, the BM25 arrays and the keyword postings.
+    Workers map those files instead of unpickling and indexing their own
+    copy, so they share one copy in the page cache and start in
+    milliseconds.
+
+    Resumes are written partition by partition, so each partition is one
+    range of rows and of chunk slots. Flat indexes, the main one or a
+    partition's, are not written: the mapped embeddings serve them
+    (MappedFlatIndex). IVF indexes are read with IO_FLAG_MMAP, which
+    shares their lists too; HNSW graphs cannot be mapped by FAISS and are
+    read into every process.
+    """
+    CURRENT_FILE = 'current.json'
+    BUILD_FILE = 'build.json'
+
+    def __init__(self, directory: str = SHARED_DIR):
+        self.directory = directory
+
+    def _path(self, *names: str) -> str:
+        return os.path.join(self.directory, *names)
+
+    def current(self) -> Optional[Dict]:
+        """{'build', 'version', 'source'} of the published build, or None"""
+        try:
+            with open(self._path(self.CURRENT_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def publish(
+        self,
+        corpus: ReferenceCorpus,
+        get_text: Callable[[Dict], str],
+        embedder: str,
+        source: Optional[str] = None
+    ) -> str:
+        """Write a corpus as a new build and make it the current one; returns the build name.
+
+        The corpus must be laid out partition by partition, without removed
+        chunks, as RAGEngine.publish prepares it. ``source`` identifies what
+        it was built from, so an unchanged corpus need not be published again.
+        """
+        name = f"v{corpus.version}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self._path('builds'), exist_ok=True)
+        tmp_path = self._path('builds', f".tmp-{name}")
+        os.makedirs(tmp_path)
+        try:
+            self._write(tmp_path, corpus, get_text, {'version': corpus.version, 'embedder': embedder})
+            os.rename(tmp_path, self._path('builds', name))
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path)
+
+        current_path = self._path(f".tmp-{uuid.uuid4().hex}-{self.CURRENT_FILE}")
+        with open(current_path, 'w') as f:
+            json.dump({'build': name, 'version': corpus.version, 'source': source}, f)
+        os.replace(current_path, self._path(self.CURRENT_FILE))
+        self._remove_old_builds(name)
+        return name
+
+    def load(self, build: str) -> Optional[Tuple[Dict, ReferenceCorpus]]:
+        """Map a published build: its build.json and the corpus; None if it is gone or incomplete"""
+        directory = self._path('builds', build)
+        try:
+            with open(os.path.join(directory, self.BUILD_FILE), 'r') as f:
+                info = json.load(f)
+            return info, self._read(directory, info)
+        except (OSError, KeyError, ValueError, RuntimeError):
+            return None
+
+    def _write(self, directory: str, corpus: ReferenceCorpus, get_text: Callable[[Dict], str], info: Dict):
+        def path(name: str) -> str:
+            return os.path.join(directory, name)
+
+        resumes = corpus.reference_resumes
+        np.save(path('embeddings.npy'), np.asarray(corpus.embeddings, dtype='float32'))
+        np.save(path('chunk_starts.npy'), corpus.chunk_starts)
+        np.save(path('chunk_ends.npy'), corpus.chunk_ends)
+        np.save(path('chunk_sections.npy'), np.array(
+            [SECTIONS.index(section) for resume in resumes for section in resume['chunk_index']['sections']],
+            dtype=np.int8
+        ))
+        TextStore.write(path('chunks'), (text for resume in resumes for text in resume['chunk_index']['texts']))
+        TextStore.write(path('texts'), (get_text(resume) for resume in resumes))
+        TextStore.write(path('resume_fields'), (resume[field] for resume in resumes for field in RESUME_FIELDS))
+
+        profile_values = {
+            field: sorted({resume['profile'].get(field, UNKNOWN) for resume in resumes} | {UNKNOWN})
+            for field in PROFILE_FIELDS
+        }
+        codes = {field: {value: code for code, value in enumerate(values)} for field, values in profile_values.items()}
+        np.save(path('profiles.npy'), np.array(
+            [[codes[field][resume['profile'].get(field, UNKNOWN)] for field in PROFILE_FIELDS] for resume in resumes],
+            dtype=np.int16
+        ).reshape(len(resumes), len(PROFILE_FIELDS)))
+
+        # The BM25 index and the keyword postings share one term numbering
+        terms = dict(corpus.sparse_index.terms) if corpus.sparse_index is not None else {}
+        posting_offsets, posting_terms, posting_chunks = [0], [], []
+        for resume in resumes:
+            pairs = sorted(
+                (terms.setdefault(term, len(terms)), chunk_id)
+                for term, chunk_ids in resume['chunk_index']['postings'].items()
+                for chunk_id in chunk_ids
+            )
+            posting_terms.extend(term_id for term_id, _ in pairs)
+            posting_chunks.extend(chunk_id for _, chunk_id in pairs)
+            posting_offsets.append(len(posting_terms))
+        term_table = TermTable.build(terms)
+        np.save(path('term_hashes.npy'), term_table.hashes)
+        np.save(path('term_ids.npy'), term_table.ids)
+        np.save(path('posting_offsets.npy'), np.array(posting_offsets, dtype=np.int64))
+        np.save(path('posting_terms.npy'), np.array(posting_terms, dtype=np.int64))
+        np.save(path('posting_chunks.npy'), np.array(posting_chunks, dtype=np.int32))
+
+        sparse = corpus.sparse_index
+        if sparse is not None:
+            for name in ('offsets', 'doc_ids', 'impacts', 'dense_rows', 'dense_impacts'):
+                np.save(path(f'bm25_{name}.npy'), getattr(sparse, name))
+
+        if not is_flat(corpus.index):
+            faiss.write_index(corpus.index, path('reference.index'))
+        partitions = []
+        if corpus.partitions is not None:
+            for number, (key, partition) in enumerate(corpus.partitions.partitions.items()):
+                index_file = None
+                if not is_flat(partition.index):
+                    index_file = f'partition-{number}.index'
+                    faiss.write_index(partition.index, path(index_file))
+                first, last = int(partition.rows[0]), int(partition.rows[-1])
+                partitions.append({
+                    'key': list(key),
+                    'rows': [first, last + 1],
+                    'slots': [int(corpus.chunk_starts[first]), int(corpus.chunk_ends[last])],
+                    'index': index_file
+                })
+
+        info = {
+            **info,
+            'resumes': len(resumes),
+            'vectors': int(corpus.index.ntotal),
+            'index': None if is_flat(corpus.index) else 'reference.index',
+            'sparse': sparse is not None,
+            'profile_values': profile_values,
+            'partition_fields': list(corpus.partitions.fields) if corpus.partitions is not None else [],
+            'partitions': partitions
+        }
+        with open(path(self.BUILD_FILE), 'w') as f:
+            json.dump(info, f)
+
+    def _read(self, directory: str, info: Dict) -> ReferenceCorpus:
+        embeddings = _load(directory, 'embeddings.npy')
+        terms = TermTable(_load(directory, 'term_hashes.npy'), _load(directory, 'term_ids.npy'))
+        metadata = PackedMetadata(directory, info['profile_values'], terms)
+
+        index = MappedFlatIndex(embeddings)
+        if info['index'] is not None:
+            index = _read_index(os.path.join(directory, info['index']))
+
+        sparse_index = None
+        if info['sparse']:
+            sparse_index = BM25Index(terms, *(
+                _load(directory, f'bm25_{name}.npy')
+                for name in ('offsets', 'doc_ids', 'impacts', 'dense_rows', 'dense_impacts')
+            ))
+
+        partitions = None
+        if info['partition_fields']:
+            partitions = {}
+            for partition in info['partitions']:
+                first, last = partition['slots']
+                partition_index = MappedFlatIndex(embeddings[first:last], first)
+                if partition['index'] is not None:
+                    partition_index = _read_index(os.path.join(directory, partition['index']))
+                partitions[tuple(partition['key'])] = Partition(np.arange(*partition['rows']), partition_index)
+            partitions = PartitionIndex(info['partition_fields'], partitions)
+
+        if index.ntotal != info['vectors'] or len(metadata) != info['resumes']:
+            raise ValueError(f"Incomplete shared build {directory}")
+        return ReferenceCorpus(
+            info['version'],
+            index,
+            embeddings,
+            metadata,
+            sparse_index,
+            partitions,
+            chunk_starts=metadata.chunk_starts,
+            chunk_ends=metadata.chunk_ends
+        )
+
+    def _remove_old_builds(self, current: str):
+        builds = [
+            entry for entry in os.scandir(self._path('builds'))
+            if entry.is_dir() and not entry.name.startswith('.') and entry.name != current
+        ]
+        builds.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+        # Mapped files stay readable after removal, so workers on an old build are unaffected
+        for entry in builds[max(KEEP_BUILDS - 1, 0):]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+def _load(directory: str, name: str) -> np.ndarray:
+    return np.load(os.path.join(directory, name), mmap_mode='r')
+
+def _read_index(path: str) -> faiss.Index:
+    index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    configure_search(index)
+    return index
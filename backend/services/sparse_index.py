@@ -0,0 +1,185 @@
+import hashlib
+import heapq
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+# BM25 term-frequency saturation and document-length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Terms in at least this share of documents are stored as a dense impact row:
+# adding one row beats scattering that many postings, for at most 4x their bytes
+DENSE_TERM_FRACTION = 0.125
+# Stride of the score sample that picks a cut-off before selecting the top k
+TOP_K_SAMPLE_STEP = 8
+
+class TermTable:
+    """Term -> id lookup held in two arrays, so it can be memory-mapped.
+
+    Terms are stored as 64-bit hashes, sorted, with the id of each; a
+    lookup is a binary search. Used in place of the vocabulary dict where
+    many processes share one corpus.
+    """
+
+    def __init__(self, hashes: np.ndarray, ids: np.ndarray):
+        self.hashes = hashes
+        self.ids = ids
+
+    @classmethod
+    def build(cls, terms: Dict[str, int]) -> 'TermTable':
+        hashes = np.array([term_hash(term) for term in terms], dtype=np.uint64)
+        ids = np.array(list(terms.values()), dtype=np.int64)
+        order = np.argsort(hashes, kind='stable')
+        return cls(hashes[order], ids[order])
+
+    def get(self, term: str, default: Optional[int] = None) -> Optional[int]:
+        value = np.uint64(term_hash(term))
+        position = int(np.searchsorted(self.hashes, value))
+        if position < len(self.hashes) and self.hashes[position] == value:
+            return int(self.ids[position])
+        return default
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+class BM25Index:
+    """BM25 over a fixed corpus, stored as postings arrays with precomputed impacts.
+
+    Each posting carries the document's full BM25 contribution for the
+    term (idf times saturated, length-normalised tf), so a query only adds
+    up the impacts of its terms and partially sorts the totals. Term t
+    occupies ``doc_ids[offsets[t]:offsets[t + 1]]`` and the matching
+    ``impacts``, unless it is frequent enough to be kept as row
+    ``dense_rows[t]`` of ``dense_impacts`` (one float per document).
+    ``terms`` maps a term to t, as a dict or a TermTable.
+    """
+
+    def __init__(
+        self,
+        terms: Union[Dict[str, int], TermTable],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        impacts: np.ndarray,
+        dense_rows: np.ndarray,
+        dense_impacts: np.ndarray
+    ):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.impacts = impacts
+        self.dense_rows = dense_rows
+        self.dense_impacts = dense_impacts
+        self.n_docs = dense_impacts.shape[1]
+
+    @classmethod
+    def build(
+        cls,
+        documents: List[Dict[str, int]],
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+        dense_fraction: float = DENSE_TERM_FRACTION
+    ) -> 'BM25Index':
+        """Index documents given as term -> frequency dicts, row-aligned with the corpus"""
+        terms: Dict[str, int] = {}
+        term_ids, frequencies, lengths = [], [], []
+        for counts in documents:
+            term_ids.extend(terms.setdefault(term, len(terms)) for term in counts)
+            frequencies.extend(counts.values())
+            lengths.append(len(counts))
+
+        n_docs = len(documents)
+        lengths = np.array(lengths, dtype=np.int64)
+        term_ids = np.array(term_ids, dtype=np.int64)
+        posting_docs = np.repeat(np.arange(n_docs, dtype=np.int32), lengths)
+        tf = np.array(frequencies, dtype=np.float64)
+        doc_lengths = np.array([sum(counts.values()) for counts in documents], dtype=np.float64)
+        average_length = doc_lengths.mean() if n_docs and doc_lengths.mean() > 0 else 1.0
+
+        df = np.bincount(term_ids, minlength=len(terms))
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * doc_lengths[posting_docs] / average_length)
+        impacts = (idf[term_ids] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+
+        dense = df >= max(1.0, dense_fraction * n_docs)
+        dense_rows = np.full(len(terms), -1, dtype=np.int32)
+        dense_rows[dense] = np.arange(int(dense.sum()), dtype=np.int32)
+        dense_impacts = np.zeros((int(dense.sum()), n_docs), dtype=np.float32)
+        in_row = dense[term_ids]
+        dense_impacts[dense_rows[term_ids[in_row]], posting_docs[in_row]] = impacts[in_row]
+
+        # Group the remaining postings by term, documents ascending within each
+        order = np.argsort(term_ids[~in_row], kind='stable')
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.where(dense, 0, df), out=offsets[1:])
+        return cls(
+            terms,
+            offsets,
+            posting_docs[~in_row][order],
+            impacts[~in_row][order],
+            dense_rows,
+            dense_impacts
+        )
+
+    def search(
+        self,
+        query_terms: Iterable[str],
+        k: int,
+        rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids and scores of the k best-scoring documents, best first; only documents matching a term.
+
+        ``rows`` restricts the result to those document ids.
+        """
+        scores = None
+        for term in dict.fromkeys(query_terms):
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            if scores is None:
+                scores = np.zeros(self.n_docs, dtype=np.float32)
+            row = self.dense_rows[term_id]
+            if row >= 0:
+                scores += self.dense_impacts[row]
+            else:
+                # A term lists each document once, so the scatter-add has no collisions
+                postings = slice(self.offsets[term_id], self.offsets[term_id + 1])
+                scores[self.doc_ids[postings]] += self.impacts[postings]
+        if scores is None or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if rows is not None:
+            scores = scores[rows]
+        top = _top_k(scores, k) if k < len(scores) else np.arange(len(scores))
+        top = top[scores[top] > 0]
+        order = top[np.argsort(-scores[top], kind='stable')]
+        return (order if rows is None else rows[order]), scores[order]
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.doc_ids.nbytes + self.impacts.nbytes + self.dense_impacts.nbytes
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k largest scores, unordered.
+
+    argpartition slows down sharply past ~10k entries, so a cut-off is
+    first read from a strided sample, set to let about 4k entries through,
+    and only those are partitioned. When fewer than k pass, the full
+    partition runs instead, so the result is always exact.
+    """
+    sample = scores[::TOP_K_SAMPLE_STEP]
+    position = len(sample) - 4 * k // TOP_K_SAMPLE_STEP - 1
+    if position > 0:
+        candidates = np.flatnonzero(scores >= np.partition(sample, position)[position])
+        if len(candidates) >= k:
+            return candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    return np.argpartition(-scores, k - 1)[:k]
+
+def reciprocal_rank_fusion(rankings: List[Sequence[int]], k: int, rrf_k: int) -> List[int]:
+    """Top-k ids by summed 1 / (rrf_k + rank) over the rankings, ties in first-seen order"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, rrf_k + 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / rank
+    return heapq.nlargest(k, scores, key=scores.__getitem__)
@@ -0,0 +1,74 @@
+"""Test setup: the backend imported as the ``app`` package.
+
+The code imports app.main (config/main.py), app.models (models/models.py),
+app.services and app.utils; here that package is assembled from the source
+tree. Tests never reach the real API: the SDK is pointed at an unroutable
+address, and tests that need answers serve them in process from
+benchmarks.stub_llm_server. Nor do they reach Redis, unless given a client.
+"""
+import importlib.util
+import os
+import sys
+import types
+
+import httpx
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ['ANTHROPIC_BASE_URL'] = 'http://127.0.0.1:1'
+os.environ['ANTHROPIC_API_KEY'] = 'test'
+# Caches stay in process, even where the environment configures Redis
+os.environ['REDIS_URL'] = ''
+
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+if 'app' not in sys.modules:
+    # app.services and app.utils resolve to the source directories, app.main to config/main.py
+    package = types.ModuleType('app')
+    package.__path__ = [BACKEND, os.path.join(BACKEND, 'config')]
+    sys.modules['app'] = package
+
+    spec = importlib.util.spec_from_file_location('app.models', os.path.join(BACKEND, 'models', 'models.py'))
+    models = importlib.util.module_from_spec(spec)
+    sys.modules['app.models'] = models
+    spec.loader.exec_module(models)
+    package.models = models
+
+
+@pytest.fixture
+def stub_client():
+    """Factory of AsyncAnthropic clients answered by a stub LLM app, without a socket.
+
+    ``stub_client(stub_app)``; the app is a
+    benchmarks.stub_llm_server.create_app() or any ASGI app serving
+    /v1/messages. Only non-streaming calls are supported.
+    """
+    from anthropic import AsyncAnthropic
+
+    def make(stub_app) -> AsyncAnthropic:
+        return AsyncAnthropic(
+            api_key='test',
+            base_url='http://stub',
+            max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_app), base_url='http://stub')
+        )
+
+    return make
+
+
+@pytest.fixture
+def stub_gateway(stub_client):
+    """Factory of LLMGateways whose client is a stub_client.
+
+    ``stub_gateway(stub_app, **gateway_kwargs)``
+    """
+    from app.services.llm_gateway import LLMGateway
+
+    def make(stub_app, **kwargs) -> LLMGateway:
+        gateway = LLMGateway(**kwargs)
+        gateway.client = stub_client(stub_app)
+        return gateway
+
+    return make
@@ -0,0 +1,52 @@
+from app.models import ParsedJobDescription, ParsedResume
+from app.services import cache as cache_module
+from app.services.analyzer import GapAnalyzer
+
+
+def _resume(skills, bullets):
+    return ParsedResume(
+        projects=[{'description': text, 'type': 'project_point'} for text in bullets],
+        skills=skills,
+        experience=[]
+    )
+
+
+JD = ParsedJobDescription(
+    required_skills=['Python', 'Kubernetes', 'PostgreSQL'],
+    preferred_skills=['Terraform'],
+    responsibilities=[],
+    keywords=['python', 'kubernetes', 'docker', '5+ years']
+)
+
+
+def test_gaps():
+    resume = _resume(['Python', 'Docker'], ['Deployed services on Kubernetes with Docker'])
+
+    gaps = GapAnalyzer().analyze(resume, JD, [])
+
+    assert gaps['missing_skills'] == ['kubernetes', 'postgresql']
+    assert gaps['missing_preferred'] == ['terraform']
+    assert gaps['current_skills'] == ['python', 'docker']
+    assert gaps['keyword_coverage']['missing_keywords'] == ['5+ years']
+
+
+def test_batch_matches_single_analyses():
+    resumes = [
+        _resume(['Python', 'PostgreSQL', 'Kubernetes'], ['Built APIs in Python']),
+        _resume(['Terraform'], ['Managed infrastructure']),
+    ]
+    analyzer = GapAnalyzer()
+
+    assert analyzer.analyze_batch(resumes, JD, [[], []]) == [analyzer.analyze(resume, JD, []) for resume in resumes]
+
+
+def test_term_sets_are_cached_in_process_only(monkeypatch):
+    # Even where the shared cache uses Redis, analyses that run inline on the
+    # event loop must not wait on it
+    monkeypatch.setattr(cache_module, '_cache', cache_module.ContentCache(redis_url='redis://127.0.0.1:1/0'))
+    analyzer = GapAnalyzer()
+
+    analyzer.analyze(_resume(['Python'], ['Built APIs in Python']), JD, [])
+
+    assert analyzer.cache.redis is None
+    assert analyzer.cache.stats()['resume_terms']['misses'] == 1
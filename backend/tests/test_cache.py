@@ -0,0 +1,200 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services import cache as cache_module
+from app.services.cache import ContentCache
+
+
+class Clock:
+    """Stands in for the time module in app.services.cache"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """The subset of redis.Redis the cache uses, expiring keys on the given clock.
+
+    Every round-trip sleeps ``latency`` seconds, blocking like a socket read.
+    """
+
+    def __init__(self, clock: Clock, latency: float = 0):
+        self.clock = clock
+        self.latency = latency
+        self.data = {}
+        self.round_trips = 0
+
+    def _entry(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] <= self.clock.now:
+            del self.data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        entry = self._entry(key)
+        return entry and entry[0]
+
+    def ttl(self, key) -> int:
+        entry = self._entry(key)
+        return int(entry[1] - self.clock.now) if entry else -2
+
+    def set(self, key, value, ex: int):
+        self.data[key] = (value, self.clock.now + ex)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def pipeline(self, transaction: bool = True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    def get(self, key):
+        self.commands.append((self.redis.get, (key,), {}))
+
+    def ttl(self, key):
+        self.commands.append((self.redis.ttl, (key,), {}))
+
+    def set(self, key, value, ex: int):
+        self.commands.append((self.redis.set, (key, value), {'ex': ex}))
+
+    def execute(self):
+        self.redis.round_trips += 1
+        time.sleep(self.redis.latency)
+        return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, 'time', clock)
+    return clock
+
+
+def _counters(cache: ContentCache, namespace: str = 'test') -> dict:
+    counters = cache.stats()[namespace]
+    return {event: counters[event] for event in ('local_hits', 'redis_hits', 'misses', 'redis_errors')}
+
+
+def test_entries_expire_in_both_tiers(clock):
+    redis = FakeRedis(clock)
+    cache = ContentCache(redis_client=redis)
+    cache.set('test', 'key', 'value', ttl=10)
+
+    clock.now += 9
+    assert cache.get('test', 'key') == (True, 'value')
+    clock.now += 2
+    assert cache.get('test', 'key') == (False, None)
+    assert redis.data == {}
+    assert _counters(cache) == {'local_hits': 1, 'redis_hits': 0, 'misses': 1, 'redis_errors': 0}
+
+
+def test_redis_hit_fills_local_tier_with_remaining_ttl(clock):
+    redis = FakeRedis(clock)
+    ContentCache(redis_client=redis).set('test', 'key', 'value', ttl=10)
+    clock.now += 4
+
+    # Another process: empty local tier, same Redis
+    cache = ContentCache(redis_client=redis)
+    assert cache.get('test', 'key') == (True, 'value')
+    assert cache.get('test', 'key') == (True, 'value')
+    assert _counters(cache) == {'local_hits': 1, 'redis_hits': 1, 'misses': 0, 'redis_errors': 0}
+
+    # The local copy expires with the Redis entry, not a fresh default TTL
+    clock.now += 7
+    redis.data.clear()
+    assert cache.get('test', 'key') == (False, None)
+
+
+def test_hit_and_miss_counters(clock):
+    cache = ContentCache(redis_client=FakeRedis(clock))
+    keys = [cache.make_key('test', 'v1', (text,)) for text in ('a', 'b', 'c')]
+    cache.set_many('test', [(keys[0], 1), (keys[1], 2)])
+    cache.local = cache_module.LRUCache()
+    cache.set('test', keys[1], 2)
+
+    assert cache.get_many('test', keys) == [(True, 1), (True, 2), (False, None)]
+    assert _counters(cache) == {'local_hits': 1, 'redis_hits': 1, 'misses': 1, 'redis_errors': 0}
+    assert cache.stats()['test']['hit_rate'] == round(2 / 3, 4)
+
+
+def test_falls_back_to_local_tier_when_redis_is_unreachable():
+    # Nothing listens on port 1, so every Redis call fails at once
+    cache = ContentCache(redis_url='redis://127.0.0.1:1/0')
+    cache.set('test', 'key', 'value')
+
+    assert cache.get('test', 'key') == (True, 'value')
+    assert cache.get('test', 'other') == (False, None)
+    # The first error takes Redis out of use for REDIS_RETRY_SECONDS
+    assert _counters(cache) == {'local_hits': 1, 'redis_hits': 0, 'misses': 1, 'redis_errors': 1}
+
+
+def test_async_calls_do_not_block_the_event_loop():
+    redis = FakeRedis(Clock(), latency=0.2)
+    cache = ContentCache(redis_client=redis)
+
+    async def compute():
+        return 'value'
+
+    async def ticker(ticks: list):
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def run():
+        ticks = []
+        task = asyncio.create_task(ticker(ticks))
+        await asyncio.sleep(0)
+        value = await cache.aget_or_compute('test', 'v1', ('text',), compute)
+        task.cancel()
+        return value, ticks
+
+    value, ticks = asyncio.run(run())
+    assert value == 'value'
+    # A miss and a store: two round-trips, during which the loop kept running
+    assert redis.round_trips == 2
+    assert len(ticks) > 20
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.1
+
+
+def test_async_local_hit_skips_redis():
+    redis = FakeRedis(Clock())
+    cache = ContentCache(redis_client=redis)
+    cache.set('test', 'key', 'value')
+    round_trips = redis.round_trips
+
+    assert asyncio.run(cache.aget('test', 'key')) == (True, 'value')
+    assert asyncio.run(cache.aget_many('test', ['key', 'missing'])) == [(True, 'value'), (False, None)]
+    assert redis.round_trips == round_trips + 1
+    assert _counters(cache) == {'local_hits': 2, 'redis_hits': 0, 'misses': 1, 'redis_errors': 0}
+
+
+def test_unreadable_entries_are_dropped_and_recomputed(clock):
+    redis = FakeRedis(clock)
+    cache = ContentCache(redis_client=redis)
+    keys = [cache.make_key('test', 'v1', (text,)) for text in ('a', 'b')]
+    # Truncated pickle, and one of a class that no longer exists
+    redis.set(keys[0], b'\x80\x05\x95', ex=60)
+    redis.set(keys[1], b'capp.gone\nGone\n)\x81.', ex=60)
+
+    assert cache.get('test', keys[0]) == (False, None)
+    assert keys[0] not in redis.data
+    assert cache.get_many('test', keys) == [(False, None), (False, None)]
+    assert keys[1] not in redis.data
+
+    async def compute():
+        return 'value'
+
+    assert asyncio.run(cache.aget_or_compute('test', 'v1', ('a',), compute)) == 'value'
+    assert ContentCache(redis_client=redis).get('test', keys[0]) == (True, 'value')
+    assert _counters(cache) == {'local_hits': 0, 'redis_hits': 0, 'misses': 4, 'redis_errors': 0}
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from app.services.embedder import EMBEDDING_DIMENSION, Embedder, HashingEmbedder
+
+
+def test_incomplete_backend_fails_when_created():
+    class NoSignature(Embedder):
+        def embed(self, texts):
+            return np.zeros((len(texts), self.dimension), dtype='float32')
+
+    with pytest.raises(TypeError):
+        NoSignature()
+
+
+def test_hashing_embedder_vectors():
+    embedder = HashingEmbedder()
+    vectors = embedder.embed(['Built a distributed cache in Go', 'Built a distributed cache in Go', ''])
+
+    assert vectors.shape == (3, EMBEDDING_DIMENSION)
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:2], axis=1), 1)
+    assert np.array_equal(vectors[0], vectors[1])
+    assert embedder.signature == HashingEmbedder().signature
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from app.models import ParsedJobDescription, ParsedResume
+from app.services import enhancer
+from app.services.cache import ContentCache
+from app.services.scheduler import BulletScheduler
+from benchmarks.stub_llm_server import create_app
+
+LATENCY = 0.3
+
+
+@pytest.fixture(autouse=True)
+def no_prefix_warmup(monkeypatch):
+    # One round of calls, so wall times compare to a single latency
+    monkeypatch.setattr(enhancer, 'PREFIX_WARMUP', False)
+
+
+def _resume(bullets):
+    return ParsedResume(
+        projects=[{'title': f'Project {i}', 'description': text} for i, text in enumerate(bullets)],
+        skills=['python'],
+        experience=[]
+    )
+
+
+def _job_description():
+    return ParsedJobDescription(
+        required_skills=['python', 'kubernetes'],
+        preferred_skills=[],
+        responsibilities=[],
+        keywords=['distributed systems']
+    )
+
+
+def _enhance(resume_enhancer, bullets):
+    async def run():
+        start = time.perf_counter()
+        points = await resume_enhancer.enhance_points(_resume(bullets), _job_description(), [], {})
+        return points, time.perf_counter() - start
+    return asyncio.run(run())
+
+
+def _enhancer(gateway, latency_budget: float = 0):
+    return enhancer.ResumeEnhancer(
+        cache=ContentCache(redis_url=""),
+        scheduler=BulletScheduler(latency_budget=latency_budget),
+        gateway=gateway
+    )
+
+
+def test_bullets_are_enhanced_concurrently(stub_gateway):
+    stub = create_app(latency=LATENCY)
+    bullets = [f'Built service {i} in Python' for i in range(6)]
+
+    points, elapsed = _enhance(_enhancer(stub_gateway(stub, max_concurrency=8)), bullets)
+
+    assert [point.enhanced for point in points] == [True] * 6
+    assert points[0].enhanced_point == 'Enhanced: Built service 0 in Python'
+    assert stub.state.max_in_flight == 6
+    # One round trip, not six
+    assert elapsed < 2 * LATENCY
+
+
+def test_slow_call_is_cut_at_call_timeout(stub_gateway):
+    stub = create_app(latency=LATENCY, slow_latency=30)
+    gateway = stub_gateway(stub, call_timeout=1, max_retries=0)
+    bullets = ['Built service 0 in Python', 'Built SLOW service 1', 'Built service 2 in Python']
+
+    points, elapsed = _enhance(_enhancer(gateway), bullets)
+
+    assert [point.enhanced for point in points] == [True, False, True]
+    assert points[1].enhanced_point == bullets[1]
+    assert 1 <= elapsed < 2
+
+
+def test_latency_budget_returns_partial_results(stub_gateway):
+    stub = create_app(latency=LATENCY, slow_latency=30)
+    gateway = stub_gateway(stub, call_timeout=20, max_retries=0)
+    bullets = ['Built SLOW service 0', 'Built service 1 in Python', 'Built service 2 in Python']
+
+    points, elapsed = _enhance(_enhancer(gateway, latency_budget=1), bullets)
+
+    assert [point.enhanced for point in points] == [False, True, True]
+    assert [point.original_point for point in points] == bullets
+    assert elapsed < 2
+    # The call cut by the deadline was cancelled, not left running
+    assert stub.state.in_flight == 0
+
+
+def test_failed_recommendations_give_an_empty_list(stub_gateway):
+    stub = create_app(latency=LATENCY, slow_latency=30, slow_marker='recommendations')
+    resume_enhancer = _enhancer(stub_gateway(stub, call_timeout=0.5, max_retries=0))
+
+    recommendations = asyncio.run(resume_enhancer.generate_recommendations({}, [], _job_description()))
+
+    assert recommendations == []
+
+
+def test_gather_until_gives_none_for_cancelled_calls(stub_gateway):
+    resume_enhancer = _enhancer(stub_gateway(create_app()))
+
+    async def answer():
+        return 'ok'
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    async def failed():
+        raise ValueError('bad request')
+
+    async def run():
+        return await resume_enhancer._gather_until(None, [answer(), cancelled(), failed()])
+
+    answered, cancelled_result, failed_result = asyncio.run(run())
+    assert answered == 'ok'
+    assert cancelled_result is None
+    assert isinstance(failed_result, ValueError)
@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+import pytest
+from anthropic import InternalServerError
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.services import llm_gateway
+from app.services.llm_gateway import CircuitBreaker, LLMUnavailableError
+
+REQUEST = {'model': 'stub', 'max_tokens': 16, 'messages': [{'role': 'user', 'content': 'Built a cache'}]}
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm_gateway, 'LLM_BACKOFF_BASE', 0.01)
+
+
+def scripted_app(statuses, retry_after: str = '0', latency: float = 0) -> FastAPI:
+    """Messages API answering with the given statuses in turn, then 200s.
+
+    ``app.state.calls`` records the arrival time of every request.
+    """
+    app = FastAPI()
+    app.state.calls = []
+    statuses = list(statuses)
+
+    @app.post('/v1/messages')
+    async def messages(request: Request):
+        body = await request.json()
+        app.state.calls.append(time.monotonic())
+        await asyncio.sleep(latency)
+        status = statuses.pop(0) if statuses else 200
+        if status != 200:
+            return JSONResponse(
+                status_code=status,
+                headers={'retry-after': retry_after},
+                content={'type': 'error', 'error': {'type': 'api_error', 'message': f'Scripted {status}'}}
+            )
+        return {
+            'id': 'msg_test',
+            'type': 'message',
+            'role': 'assistant',
+            'model': body['model'],
+            'content': [{'type': 'text', 'text': f"Enhanced: {body['messages'][-1]['content']}"}],
+            'stop_reason': 'end_turn',
+            'stop_sequence': None,
+            'usage': {'input_tokens': 4, 'output_tokens': 4}
+        }
+
+    return app
+
+
+def _open_breaker(gateway, reset_timeout: float):
+    gateway.breaker = CircuitBreaker(threshold=1, reset_timeout=reset_timeout)
+    gateway.breaker.record_failure()
+    assert gateway.breaker.state == 'open'
+
+
+def test_retry_honours_retry_after(stub_gateway):
+    app = scripted_app([429], retry_after='0.3')
+    gateway = stub_gateway(app, max_retries=2)
+
+    message = asyncio.run(gateway.create('test', REQUEST))
+
+    assert message.content[0].text == 'Enhanced: Built a cache'
+    assert len(app.state.calls) == 2
+    assert app.state.calls[1] - app.state.calls[0] >= 0.3
+    assert gateway.counters['rate_limited'] == 1
+    assert gateway.counters['retries'] == 1
+
+
+def test_identical_in_flight_calls_share_one_api_call(stub_gateway):
+    app = scripted_app([], latency=0.2)
+    gateway = stub_gateway(app)
+    other = {**REQUEST, 'messages': [{'role': 'user', 'content': 'Wrote a CLI'}]}
+
+    async def run():
+        return await asyncio.gather(
+            gateway.create('test', REQUEST),
+            gateway.create('test', REQUEST),
+            gateway.create('test', REQUEST),
+            gateway.create('test', other)
+        )
+
+    first, second, third, fourth = asyncio.run(run())
+
+    assert first is second is third
+    assert fourth.content[0].text == 'Enhanced: Wrote a CLI'
+    assert len(app.state.calls) == 2
+    assert gateway.counters['deduplicated'] == 2
+    assert gateway._in_flight == {}
+
+
+def test_breaker_opens_and_closes_after_a_successful_trial(stub_gateway):
+    app = scripted_app([500, 500])
+    gateway = stub_gateway(app, max_retries=0, breaker=CircuitBreaker(threshold=2, reset_timeout=0.2))
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(InternalServerError):
+                await gateway.create('test', REQUEST)
+        assert gateway.breaker.state == 'open'
+        # Rejected without reaching the API
+        with pytest.raises(LLMUnavailableError):
+            await gateway.create('test', REQUEST)
+        assert len(app.state.calls) == 2
+
+        await asyncio.sleep(0.2)
+        assert gateway.breaker.state == 'half_open'
+        await gateway.create('test', REQUEST)
+
+    asyncio.run(run())
+    assert gateway.breaker.state == 'closed'
+    assert gateway.counters['rejected'] == 1
+
+
+def test_failed_trial_reopens_the_breaker(stub_gateway):
+    app = scripted_app([500, 500], latency=0.1)
+    gateway = stub_gateway(app, max_retries=1)
+    _open_breaker(gateway, reset_timeout=0.1)
+
+    async def run():
+        await asyncio.sleep(0.1)
+        trial = asyncio.create_task(gateway.create('test', {**REQUEST, 'max_tokens': 17}))
+        await asyncio.sleep(0.05)
+        # Only one trial at a time, including while it retries
+        with pytest.raises(LLMUnavailableError):
+            await gateway.create('test', REQUEST)
+        with pytest.raises(InternalServerError):
+            await trial
+
+    asyncio.run(run())
+    assert len(app.state.calls) == 2
+    assert gateway.breaker.state == 'open'
+
+
+def test_half_open_trial_recovers_after_a_retried_429(stub_gateway):
+    # Regression: the retry used to ask the breaker again, was refused as a
+    # second trial and left the circuit half open for good
+    app = scripted_app([429])
+    gateway = stub_gateway(app, max_retries=2)
+    _open_breaker(gateway, reset_timeout=0.05)
+    time.sleep(0.05)
+
+    message = asyncio.run(gateway.create('test', REQUEST))
+
+    assert message.content[0].text == 'Enhanced: Built a cache'
+    assert len(app.state.calls) == 2
+    assert gateway.breaker.state == 'closed'
+
+
+def test_cancelled_trial_lets_another_through(stub_gateway):
+    app = scripted_app([429], retry_after='5')
+    gateway = stub_gateway(app, max_retries=2)
+    _open_breaker(gateway, reset_timeout=0.05)
+    time.sleep(0.05)
+
+    async def run():
+        # Cancelled while backing off after the 429
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(gateway.create('test', REQUEST), timeout=0.2)
+        assert gateway.breaker.state == 'half_open'
+        gateway.request_bucket.paused_until = 0
+        return await gateway.create('test', REQUEST)
+
+    asyncio.run(run())
+    assert gateway.breaker.state == 'closed'
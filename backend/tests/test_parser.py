@@ -0,0 +1,62 @@
+import pytest
+
+from app.services.cache import ContentCache
+from app.services.executors import Executors
+from app.services.parser import ResumeParser
+
+RESUME = """Jane Doe
+jane@example.com
+
+## Technical Skills
+Python, Go, Kubernetes
+
+**Projects**
+- Built a distributed cache in Go
+- Wrote a Python CLI for log search
+
+Work Experience:
+- Scaled the billing service to 10k requests per second
+
+Education
+B.Sc. Computer Science
+"""
+
+
+@pytest.fixture
+def parser():
+    return ResumeParser(ContentCache(redis_url=""), Executors(0, 0))
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_sections(parser, newline):
+    parsed = parser.parse(RESUME.replace('\n', newline))
+
+    assert parsed.skills == ['Python', 'Go', 'Kubernetes']
+    assert [point['description'] for point in parsed.projects] == [
+        'Built a distributed cache in Go',
+        'Wrote a Python CLI for log search'
+    ]
+    assert [point['description'] for point in parsed.experience] == [
+        'Scaled the billing service to 10k requests per second'
+    ]
+
+
+@pytest.mark.parametrize('header', [
+    'Projects', '## Projects', '**Projects**', 'Side Projects:', 'PROJECTS  ', 'Projects\r'
+])
+def test_header_forms(parser, header):
+    assert parser.section_pattern.fullmatch(header).lastgroup == 'projects'
+
+
+@pytest.mark.parametrize('line', ['Built projects in Go', 'Skills matter\r'])
+def test_prose_is_not_a_header(parser, line):
+    assert parser.section_pattern.fullmatch(line) is None
+
+
+def test_chunk_crlf(parser):
+    chunks = parser.chunk('Projects\r\n- Built a cache\r\nSkills: Go, Rust\r\n')
+
+    assert chunks == [
+        {'text': 'Built a cache', 'section': 'projects', 'bullet': True},
+        {'text': 'Go, Rust', 'section': 'skills', 'bullet': False}
+    ]
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from app.models import ParsedJobDescription, ParsedResume
+from app.services import rag_engine
+from app.services.cache import ContentCache
+from app.services.embedder import HashingEmbedder
+from app.services.executors import Executors
+from app.services.index_store import IndexStore
+from app.services.rag_engine import RAGEngine
+
+# Three senior backend resumes, one junior, and two frontend ones
+PROFILES = [
+    ('backend', 'senior'), ('backend', 'senior'), ('backend', 'senior'),
+    ('backend', 'junior'), ('frontend', 'senior'), ('frontend', 'junior')
+]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = RAGEngine(HashingEmbedder(), IndexStore(str(tmp_path)), ContentCache(redis_url=""), Executors(0, 0))
+    metadata = [
+        {
+            'id': f'resume_{i}',
+            'filename': f'{i}.txt',
+            'sha256': '',
+            'profile': {'role_family': role_family, 'seniority': seniority},
+            'chunk_index': engine._build_chunk_index(f'Built {role_family} service {i} in Python\nLed a team of {i}')
+        }
+        for i, (role_family, seniority) in enumerate(PROFILES)
+    ]
+    embeddings = engine._generate_embeddings([text for resume in metadata for text in resume['chunk_index']['texts']])
+    engine.corpus = engine._build_corpus(1, embeddings, metadata)
+    engine._get_text = lambda resume: ''
+    return engine
+
+
+def _similar(engine, role_family, seniority, k, relax_filters=False):
+    parsed_resume = ParsedResume(projects=[{'description': 'Built APIs in Python'}], skills=['python'], experience=[])
+    parsed_jd = ParsedJobDescription(
+        required_skills=['python'],
+        preferred_skills=[],
+        responsibilities=[],
+        keywords=['python'],
+        profile={'role_family': role_family, 'seniority': seniority}
+    )
+    return asyncio.run(engine.find_similar_resumes(parsed_resume, parsed_jd, k, relax_filters=relax_filters))
+
+
+def test_short_filtered_result_is_returned_as_is(engine):
+    similar = _similar(engine, 'backend', 'junior', k=3)
+
+    assert [result['resume']['id'] for result in similar] == ['resume_3']
+    assert similar[0]['relaxed_filters'] == []
+    # No resume matches: nothing, rather than the whole corpus
+    assert _similar(engine, 'data', 'senior', k=3) == []
+
+
+def test_relaxing_is_opt_in_and_reported(engine):
+    similar = _similar(engine, 'backend', 'junior', k=3, relax_filters=True)
+
+    assert len(similar) == 3
+    assert {result['resume']['profile']['role_family'] for result in similar} == {'backend'}
+    assert [result['relaxed_filters'] for result in similar] == [['seniority']] * 3
+
+    similar = _similar(engine, 'data', 'senior', k=3, relax_filters=True)
+    assert len(similar) == 3
+    assert similar[0]['relaxed_filters'] == ['role_family', 'seniority']
+
+
+def test_updates_are_persisted_as_deltas_and_compacted(tmp_path, monkeypatch):
+    resume_dir, index_dir = tmp_path / 'resumes', tmp_path / 'index'
+    resume_dir.mkdir()
+    monkeypatch.setattr(rag_engine, 'RESUME_DIR', str(resume_dir))
+    monkeypatch.setattr(rag_engine, 'INDEX_MAX_DELTAS', 2)
+    monkeypatch.setattr(rag_engine, 'REBUILD_DEAD_FRACTION', 1.0)
+    for i in range(4):
+        (resume_dir / f'{i}.txt').write_text(f'Senior Backend Engineer\nBuilt service {i} in Python\n')
+
+    def new_engine():
+        return RAGEngine(HashingEmbedder(), IndexStore(str(index_dir)), ContentCache(redis_url=""), Executors(0, 0))
+
+    def stored():
+        return sorted(path.name for path in index_dir.iterdir())
+
+    def filenames(engine):
+        return [resume['filename'] for resume in engine.corpus.reference_resumes]
+
+    async def run():
+        engine = new_engine()
+        await engine.initialize()
+        build = {name: (index_dir / name).stat().st_mtime_ns for name in stored()}
+
+        await engine.put_reference('4.txt', 'Senior Backend Engineer\nWrote a Go CLI\n')
+        await engine.delete_reference('1.txt')
+        # Two updates, two small files; the build itself was not rewritten
+        assert stored() == sorted([*build, 'delta-000001.pkl', 'delta-000002.pkl'])
+        assert {name: (index_dir / name).stat().st_mtime_ns for name in build} == build
+
+        restarted = new_engine()
+        await restarted.initialize()
+        assert restarted.corpus.version == engine.corpus.version
+        assert filenames(restarted) == ['0.txt', '2.txt', '3.txt', '4.txt']
+        assert restarted.corpus.index.ntotal == engine.corpus.index.ntotal
+        assert restarted.manifest['files'] == engine.manifest['files']
+
+        # The third update finds two deltas and writes the whole build again
+        update = await restarted.delete_reference('0.txt')
+        assert not update['rebuilt']
+        assert stored() == sorted(build)
+        restarted = new_engine()
+        await restarted.initialize()
+        assert filenames(restarted) == ['2.txt', '3.txt', '4.txt']
+        assert restarted.corpus.dead_vectors == 4
+
+    asyncio.run(run())
@@ -0,0 +1,27 @@
+import random
+
+from app.services import cache as cache_module
+from app.services.embedder import HashingEmbedder
+from app.services.executors import Executors
+from app.services.parser import JobDescriptionParser
+from app.services.ranking import RankingEngine
+from benchmarks.synthetic import generate_corpus, generate_job_description
+
+
+def test_candidates_stay_out_of_the_shared_cache(monkeypatch):
+    shared = cache_module.ContentCache(redis_url="")
+    monkeypatch.setattr(cache_module, '_cache', shared)
+    monkeypatch.setattr('app.services.parser.get_executors', lambda: Executors(0, 0))
+    resumes = generate_corpus(50)
+    job_description = generate_job_description(random.Random(7))
+    # As in app.main: a shared JD parser, everything else the engine's own
+    engine = RankingEngine(jd_parser=JobDescriptionParser(), embedder=HashingEmbedder())
+
+    top = engine.rank(resumes, job_description, top_k=5)
+
+    assert [candidate.score for candidate in top] == sorted((candidate.score for candidate in top), reverse=True)
+    assert len({candidate.index for candidate in top}) == 5
+    # Only the parsed job description reached the shared cache
+    assert len(shared.local) == 1
+    assert engine.cache.redis is None
+    assert len(engine.cache.local) == 3 * len(resumes) + 1
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# One term per line, '#' starts a comment; falls back to the built-in list when absent
+TECH_KEYWORDS_PATH = os.getenv("TECH_KEYWORDS_PATH", "app/data/tech_keywords.txt")
+
+DEFAULT_TECH_KEYWORDS = frozenset({
+    # Languages
+    'python', 'java', 'javascript', 'typescript', 'go', 'rust', 'c++',
+    'ruby', 'scala', 'kotlin', 'swift', 'r', 'sql',
+
+    # Frameworks
+    'react', 'angular', 'vue', 'django', 'flask', 'spring', 'express',
+    'fastapi', 'rails', 'laravel', 'nextjs', 'nodejs',
+
+    # Tools & Platforms
+    'aws', 'gcp', 'azure', 'docker', 'kubernetes', 'jenkins', 'git',
+    'terraform', 'ansible', 'ci/cd', 'microservices', 'rest', 'graphql',
+
+    # Databases
+    'postgresql', 'mysql', 'mongodb', 'redis', 'elasticsearch',
+    'cassandra', 'dynamodb', 'firebase',
+
+    # Concepts
+    'agile', 'scrum', 'devops', 'tdd', 'clean code', 'solid',
+    'design patterns', 'distributed systems', 'scalability'
+})
+
+def load_keywords(path: str = TECH_KEYWORDS_PATH) -> frozenset:
+    """Read the keyword vocabulary from path, or use the built-in list"""
+    if not os.path.exists(path):
+        return DEFAULT_TECH_KEYWORDS
+
+    with open(path, 'r') as f:
+        terms = (line.split('#', 1)[0] for line in f)
+        return frozenset(normalize_keyword(term) for term in terms if term.strip())
+
+def normalize_keyword(term: str) -> str:
+    return ' '.join(term.lower().split())
+
+def _trie_regex(terms: Iterable[str]) -> str:
+    """Alternation of all terms folded into a prefix trie.
+
+    A flat 'a|b|c' alternation makes the regex engine try every term at
+    every position; the trie shares prefixes so each position costs about
+    one branch per character.
+    """
+    trie: Dict = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node: Dict) -> str:
+        branches = [
+            (r'\s+' if char == ' ' else re.escape(char)) + emit(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ''
+        if '' in node:
+            # A term ends here: longer continuations are optional (greedy, so longest wins)
+            return '(?:' + '|'.join(branches) + ')?'
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+
+    return emit(trie)
+
+class KeywordMatcher:
+    """Finds vocabulary terms in text in a single pass of one compiled regex.
+
+    Terms only match as whole words, so 'r', 'go' or 'rest' no longer fire
+    inside 'react', 'google' or 'interest'. Multi-word terms tolerate any
+    whitespace between words, and the longest term at a position wins.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = frozenset(normalize_keyword(k) for k in keywords if k.strip())
+        # Identifies the vocabulary, e.g. in cache keys of results derived from it
+        self.digest = hashlib.sha256('\n'.join(sorted(self.keywords)).encode('utf-8')).hexdigest()[:16]
+        self._pattern = re.compile(
+            r'(?<![\w+#])' + _trie_regex(self.keywords) + r'(?![\w+#])',
+            re.IGNORECASE
+        )
+
+    def finditer(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        """Yield (keyword, start, end) for every match, left to right"""
+        if not self.keywords:
+            return
+        for match in self._pattern.finditer(text):
+            yield normalize_keyword(match.group()), match.start(), match.end()
+
+    def find_all(self, text: str) -> List[Tuple[str, int, int]]:
+        return list(self.finditer(text))
+
+    def find(self, text: str) -> List[str]:
+        """Distinct keywords in order of first appearance"""
+        return list(dict.fromkeys(keyword for keyword, _, _ in self.finditer(text)))
+
+    def find_set(self, text: str) -> set:
+        """Distinct keywords in no particular order; skips building match objects"""
+        if not self.keywords:
+            return set()
+        return {normalize_keyword(match) for match in set(self._pattern.findall(text))}
+
+@lru_cache(maxsize=1)
+def get_tech_keyword_matcher() -> KeywordMatcher:
+    """Process-wide matcher over the configured vocabulary, compiled once"""
+    return KeywordMatcher(load_keywords())
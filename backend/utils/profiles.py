@@ -0,0 +1,120 @@
+from typing import Dict, List, Sequence
+
+from app.utils.text_processing import YEARS_PATTERN, term_set, tokenize
+
+# Value of a profile field the text gives no evidence for
+UNKNOWN = 'unknown'
+PROFILE_FIELDS = ('role_family', 'seniority', 'domain')
+
+# Job titles are a family word followed by one of these ("backend engineer");
+# title lines are also where seniority words are looked for
+TITLE_NOUNS = ('engineer', 'developer', 'scientist', 'architect', 'programmer')
+
+# family -> (title words, indicator terms). A matching title decides the
+# family; indicator terms only break ties or stand in when no title matches.
+ROLE_FAMILIES = {
+    'frontend': (
+        ('frontend', 'front end', 'ui', 'web'),
+        ('react', 'angular', 'vue', 'css', 'html', 'javascript', 'typescript', 'nextjs', 'redux', 'webpack')
+    ),
+    'backend': (
+        ('backend', 'back end', 'server', 'api'),
+        ('django', 'flask', 'spring', 'fastapi', 'express', 'nodejs', 'rails', 'laravel', 'microservices', 'rest')
+    ),
+    'fullstack': (
+        ('full stack', 'fullstack'),
+        ()
+    ),
+    'ml': (
+        ('ml', 'machine learning', 'ai', 'deep learning', 'research'),
+        ('pytorch', 'tensorflow', 'keras', 'scikit learn', 'machine learning', 'deep learning', 'nlp', 'computer vision')
+    ),
+    'data': (
+        ('data', 'analytics', 'etl', 'big data'),
+        ('spark', 'airflow', 'kafka', 'hadoop', 'etl', 'dbt', 'snowflake', 'bigquery', 'redshift', 'data warehouse')
+    ),
+    'devops': (
+        ('devops', 'sre', 'site reliability', 'platform', 'infrastructure', 'cloud'),
+        ('kubernetes', 'docker', 'terraform', 'ansible', 'jenkins', 'ci/cd', 'helm', 'prometheus')
+    ),
+    'mobile': (
+        ('mobile', 'ios', 'android'),
+        ('swift', 'kotlin', 'flutter', 'react native', 'swiftui', 'xcode')
+    ),
+}
+
+# Checked in order on title lines, so "Junior ... then Senior Engineer" is senior
+SENIORITY_TITLES = (
+    ('senior', ('senior', 'sr', 'staff', 'principal', 'lead', 'head')),
+    ('junior', ('junior', 'jr', 'intern', 'internship', 'graduate', 'entry level', 'trainee')),
+)
+# Without a title word, the largest "N years" mentioned decides: below
+# MID_YEARS is junior, from SENIOR_YEARS on senior, mid in between
+MID_YEARS = 3
+SENIOR_YEARS = 6
+# Larger "N years" figures are not experience ("over 100 years of history")
+MAX_YEARS = 40
+
+DOMAINS = {
+    'fintech': ('fintech', 'payments', 'banking', 'trading', 'lending', 'insurance', 'billing'),
+    'ecommerce': ('ecommerce', 'e commerce', 'retail', 'marketplace', 'checkout', 'shopping'),
+    'healthcare': ('healthcare', 'clinical', 'medical', 'patient', 'hospital', 'ehr'),
+    'adtech': ('adtech', 'advertising', 'ad serving', 'programmatic', 'real time bidding'),
+    'gaming': ('gaming', 'game', 'multiplayer', 'unity', 'unreal'),
+    'security': ('cybersecurity', 'security', 'threat', 'siem', 'vulnerability'),
+}
+
+def extract_profile(text: str) -> Dict[str, str]:
+    """Role family, seniority and domain of a resume or job description.
+
+    Each field is UNKNOWN when the text gives no evidence for it. The same
+    function profiles reference resumes at ingest and job descriptions at
+    parse time, so the two are comparable.
+    """
+    terms = term_set(text)
+    title_terms = term_set('\n'.join(_title_lines(text)))
+    return {
+        'role_family': _role_family(terms, title_terms),
+        'seniority': _seniority(text, title_terms),
+        'domain': _best_match(DOMAINS, terms)
+    }
+
+def _title_lines(text: str) -> List[str]:
+    """Lines naming a job title, e.g. "Senior Backend Engineer, Acme (2019-2023)" """
+    return [
+        line for line in text.splitlines()
+        if any(token in TITLE_NOUNS for token in tokenize(line))
+    ]
+
+def _role_family(terms: set, title_terms: set) -> str:
+    titled = [
+        family for family, (titles, _) in ROLE_FAMILIES.items()
+        if any(f"{title} {noun}" in title_terms for title in titles for noun in TITLE_NOUNS)
+    ]
+    if len(titled) == 1:
+        return titled[0]
+    candidates = {family: ROLE_FAMILIES[family][1] for family in titled or ROLE_FAMILIES}
+    best = _best_match(candidates, terms)
+    # Several titles and no indicator terms: the first family listed wins
+    return titled[0] if best == UNKNOWN and titled else best
+
+def _seniority(text: str, title_terms: set) -> str:
+    for level, words in SENIORITY_TITLES:
+        if any(word in title_terms for word in words):
+            return level
+    years = [int(match) for match in YEARS_PATTERN.findall(text.lower())]
+    years = [value for value in years if value <= MAX_YEARS]
+    if not years:
+        return UNKNOWN
+    if max(years) >= SENIOR_YEARS:
+        return 'senior'
+    return 'mid' if max(years) >= MID_YEARS else 'junior'
+
+def _best_match(vocabularies: Dict[str, Sequence[str]], terms: set) -> str:
+    """Key whose vocabulary has the most terms present, first listed on ties"""
+    best, best_count = UNKNOWN, 0
+    for name, vocabulary in vocabularies.items():
+        count = sum(term in terms for term in vocabulary)
+        if count > best_count:
+            best, best_count = name, count
+    return best
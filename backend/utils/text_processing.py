@@ -0,0 +1,26 @@
+import re
+from typing import List
+
+# Keeps technology spellings such as c++, c#, node.js and ci/cd as one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#./]*")
+# "5 years", "3+ years" in lowercased text; the group is the number
+YEARS_PATTERN = re.compile(r'(\d+)\+?\s*years?')
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase text and split it into technology-aware word tokens"""
+    return [
+        token.rstrip('./')
+        for token in TOKEN_PATTERN.findall(text.lower())
+    ]
+
+def normalize_term(term: str) -> str:
+    """Canonical form of a keyword, comparable with the output of term_set"""
+    return ' '.join(tokenize(term))
+
+def term_set(text: str, max_n: int = 3) -> set:
+    """All word n-grams of text up to max_n words, in normalized form"""
+    tokens = tokenize(text)
+    terms = set(tokens)
+    for n in range(2, max_n + 1):
+        terms.update(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return terms
@@ -0,0 +1,100 @@
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from app.utils.keywords import get_tech_keyword_matcher
+
+class SkillVocabulary:
+    """Process-wide term -> integer id map, so skill sets become id arrays.
+
+    Ids are dense and never reassigned, which lets arrays of ids computed
+    once (e.g. for reference resume lines) be reused by every request.
+    Only bounded inputs - the keyword vocabulary and the reference corpus -
+    should be added here; per-request terms go in an overlay.
+    """
+
+    def __init__(self, terms: Iterable[str] = ()):
+        self._ids: Dict[str, int] = {}
+        self._terms: List[str] = []
+        self._lock = threading.Lock()
+        self.encode(terms)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def encode(self, terms: Iterable[str]) -> np.ndarray:
+        """Ids of terms in input order, adding unseen terms"""
+        ids = []
+        with self._lock:
+            for term in terms:
+                term_id = self._ids.get(term)
+                if term_id is None:
+                    term_id = self._ids[term] = len(self._terms)
+                    self._terms.append(term)
+                ids.append(term_id)
+        return np.array(ids, dtype=np.int64)
+
+    def get(self, term: str, default=None):
+        return self._ids.get(term, default)
+
+    def term(self, term_id: int) -> str:
+        return self._terms[term_id]
+
+    def overlay(self) -> 'VocabularyOverlay':
+        return VocabularyOverlay(self)
+
+class VocabularyOverlay:
+    """Request-scoped extension of a SkillVocabulary.
+
+    Terms the shared vocabulary does not know get ids numbered from its size
+    at creation, so they never collide with ids already held by the caller
+    and never grow the shared map. Ids stay below ``size`` for this overlay.
+    """
+
+    def __init__(self, vocabulary: SkillVocabulary):
+        self.vocabulary = vocabulary
+        self.base_size = len(vocabulary)
+        self._ids: Dict[str, int] = {}
+        self._terms: List[str] = []
+
+    @property
+    def size(self) -> int:
+        return self.base_size + len(self._terms)
+
+    def _get(self, term: str):
+        term_id = self.vocabulary.get(term)
+        # Shared ids added after this overlay was created are not visible
+        if term_id is not None and term_id < self.base_size:
+            return term_id
+        return self._ids.get(term)
+
+    def encode(self, terms: Iterable[str]) -> np.ndarray:
+        """Ids of terms in input order, adding unseen terms to the overlay"""
+        ids = []
+        for term in terms:
+            term_id = self._get(term)
+            if term_id is None:
+                term_id = self._ids[term] = self.size
+                self._terms.append(term)
+            ids.append(term_id)
+        return np.array(ids, dtype=np.int64)
+
+    def lookup(self, terms: Iterable[str]) -> np.ndarray:
+        """Ids of the terms that are already known; unknown terms are dropped"""
+        ids = [self._get(term) for term in terms]
+        return np.array([term_id for term_id in ids if term_id is not None], dtype=np.int64)
+
+    def term(self, term_id: int) -> str:
+        if term_id < self.base_size:
+            return self.vocabulary.term(term_id)
+        return self._terms[term_id - self.base_size]
+
+    def decode(self, ids: Iterable[int]) -> List[str]:
+        return [self.term(int(term_id)) for term_id in ids]
+
+@lru_cache(maxsize=1)
+def get_skill_vocabulary() -> SkillVocabulary:
+    """Shared vocabulary, seeded with the tech keywords"""
+    return SkillVocabulary(sorted(get_tech_keyword_matcher().keywords))